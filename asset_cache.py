@@ -0,0 +1,148 @@
+"""
+Cached, pre-decoded media assets.
+
+Resized images and decoded animation frames are written to a cache directory
+as PNG files, keyed by the source file's modification time, and loaded with
+Tk's own PNG support afterwards. Pillow is only needed when the cache is cold.
+Decoded images are also kept in memory, so showing the completion animation
+again costs nothing.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import tkinter as tk
+
+CACHE_DIR = os.path.join("media", "cache")
+
+# Animations are cut off after this many frames
+MAX_FRAMES = 100
+
+
+class AssetCache:
+    """Disk and memory cache of Tk images made from media files"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        # (source, size, mtime) -> PhotoImage or list of PhotoImages
+        self._images = {}
+
+    def _cache_key(self, source, size=None):
+        """Return (file name stem, mtime) identifying a cached version of a source"""
+        mtime = os.stat(source).st_mtime_ns
+        stem = os.path.splitext(os.path.basename(source))[0]
+        if size:
+            stem = f"{stem}_{size[0]}x{size[1]}"
+        return stem, mtime
+
+    def _prune(self, stem, keep):
+        """Remove cached versions of a source other than the current one"""
+        for name in os.listdir(self.cache_dir):
+            # Versions are named <stem>_<mtime>, other sizes of the same source are left alone
+            version = name[len(stem) + 1:].split(".")[0]
+            if name.startswith(stem + "_") and name != keep and version.isdigit():
+                path = os.path.join(self.cache_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+
+    def image(self, source, size=None):
+        """Return a PhotoImage of a source image, resized to (width, height) if given
+
+        Returns None if the source is missing or can't be decoded.
+        """
+        if not os.path.exists(source):
+            return None
+
+        stem, mtime = self._cache_key(source, size)
+        memory_key = (source, size, mtime)
+        if memory_key in self._images:
+            return self._images[memory_key]
+
+        cached_name = f"{stem}_{mtime}.png"
+        cached_path = os.path.join(self.cache_dir, cached_name)
+
+        if not os.path.exists(cached_path):
+            try:
+                from PIL import Image
+            except ImportError:
+                return None
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with Image.open(source) as image:
+                if size:
+                    image = image.resize(size, Image.Resampling.LANCZOS)
+                self._write_png(image, cached_path)
+            self._prune(stem, cached_name)
+
+        photo = tk.PhotoImage(file=cached_path)
+        self._images[memory_key] = photo
+        return photo
+
+    def frames(self, source, max_frames=MAX_FRAMES):
+        """Return the decoded frames of an animation as PhotoImages
+
+        Returns an empty list if the source is missing or can't be decoded.
+        """
+        if not os.path.exists(source):
+            return []
+
+        stem, mtime = self._cache_key(source)
+        memory_key = (source, None, mtime)
+        if memory_key in self._images:
+            return self._images[memory_key]
+
+        cached_name = f"{stem}_{mtime}"
+        cached_dir = os.path.join(self.cache_dir, cached_name)
+
+        if not os.path.isdir(cached_dir):
+            try:
+                from PIL import Image
+            except ImportError:
+                return []
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # Decode into a temporary directory, then move it into place in one step
+            work_dir = tempfile.mkdtemp(prefix=cached_name + ".", dir=self.cache_dir)
+            try:
+                with Image.open(source) as animation:
+                    for index in range(max_frames):
+                        try:
+                            animation.seek(index)
+                        except EOFError:
+                            break
+                        self._write_png(animation.convert("RGBA"), os.path.join(work_dir, f"{index:04d}.png"))
+                os.replace(work_dir, cached_dir)
+            except OSError:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                if not os.path.isdir(cached_dir):
+                    raise
+            self._prune(stem, cached_name)
+
+        frames = [tk.PhotoImage(file=os.path.join(cached_dir, name))
+                  for name in sorted(os.listdir(cached_dir))[:max_frames]]
+        self._images[memory_key] = frames
+        return frames
+
+    @staticmethod
+    def _write_png(image, path):
+        """Write an image as PNG without leaving a partial file behind"""
+        temp_path = path + ".tmp"
+        image.save(temp_path, format="PNG")
+        os.replace(temp_path, path)
+
+
+_asset_cache = None
+_asset_cache_lock = threading.Lock()
+
+
+def get_asset_cache():
+    """Return the shared asset cache"""
+    global _asset_cache
+    with _asset_cache_lock:
+        if _asset_cache is None:
+            _asset_cache = AssetCache()
+        return _asset_cache
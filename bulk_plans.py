@@ -0,0 +1,189 @@
+"""
+Bulk preview generation from spreadsheet (CSV) site data.
+
+Each CSV row describes one switch. Columns are mapped to CONFIG_DATA input names
+and every row is rendered against the same list of preview items, producing one
+compiled command plan per switch without touching the GUI. Templates are parsed
+once up front so rendering a row is just joining strings.
+"""
+
+import argparse
+import csv
+import json
+import os
+import string
+import sys
+
+from cli_modes import plan_mode_transitions
+from port_ranges import find_batch_inputs, is_batch_value, render_commands, validate_batch_value
+
+# Columns used to name the generated plan for a row, in order of preference
+NAME_COLUMNS = ("hostname", "switch_name", "name")
+
+
+def normalize_column(column):
+    """Turn a spreadsheet header such as 'Mgmt IP' into an input name like 'mgmt_ip'"""
+    return column.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+class CompiledTemplate:
+    """A command template split into literal text and input fields once"""
+
+    def __init__(self, template):
+        self.template = template
+        self.parts = []
+        self.fields = set()
+
+        for literal, field, _, _ in string.Formatter().parse(template):
+            if literal:
+                self.parts.append((literal, None))
+            if field is not None:
+                self.parts.append((None, field))
+                self.fields.add(field)
+
+    def render(self, values):
+        """Render the template, raising KeyError for a missing input"""
+        return "".join(literal if field is None else str(values[field]) for literal, field in self.parts)
+
+
+class CompiledItem:
+    """A preview item with its templates and input validation prepared for many rows"""
+
+    def __init__(self, item, defaults=None, prepare=None):
+        self.item = item
+        self.defaults = dict(defaults or {})
+        self.input_fields = item.get("inputs", [])
+
+        commands = item["command"] if isinstance(item["command"], list) else [item["command"]]
+        self.commands = prepare(commands) if prepare else commands
+        self.templates = [CompiledTemplate(cmd) for cmd in self.commands]
+
+    def render(self, row_values):
+        """Render the commands for one row, raising ValueError for bad or missing inputs"""
+        values = dict(self.defaults)
+        for field in self.input_fields:
+            name = field["name"]
+            value = row_values.get(name)
+            if value not in (None, ""):
+                values[name] = value
+
+            if values.get(name) in (None, ""):
+                raise ValueError(f"missing value for '{name}' ({self.item['name']})")
+
+        # Validate ranges and lists against the commands and the rest with the catalog's type field
+        for field in self.input_fields:
+            name = field["name"]
+            value = values[name]
+            if is_batch_value(field, value):
+                try:
+                    validate_batch_value(field, value, self.commands)
+                except ValueError as e:
+                    raise ValueError(f"invalid value for '{name}' ({self.item['name']}): {e}")
+            elif field["type"] == "int":
+                try:
+                    values[name] = int(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"'{value}' is not a number for '{name}' ({self.item['name']})")
+
+        # Ranges and lists take the slower expanding path
+        batch_inputs = find_batch_inputs(self.input_fields, values, self.commands)
+        if batch_inputs:
+            return list(render_commands(self.commands, values, batch_inputs))
+
+        return [template.render(values) for template in self.templates]
+
+
+def compile_plan(preview_items, prepare=plan_mode_transitions):
+    """Compile (item, inputs) pairs into a reusable plan
+
+    prepare(commands) is applied to each item's commands, by default entering
+    configuration mode where needed and returning to EXEC mode, as the GUI
+    does for preview items.
+    """
+    return [CompiledItem(item, inputs, prepare) for item, inputs in preview_items]
+
+
+def iter_row_plans(rows, compiled_plan, column_map=None):
+    """Yield (row_number, name, commands, error) for each row of site data"""
+    column_map = column_map or {}
+
+    for row_number, row in enumerate(rows, start=1):
+        row_values = {}
+        for column, value in row.items():
+            if column is None:
+                continue
+            name = column_map.get(column) or normalize_column(column)
+            row_values[name] = value.strip() if isinstance(value, str) else value
+
+        name = next((row_values[column] for column in NAME_COLUMNS if row_values.get(column)), f"row_{row_number}")
+
+        try:
+            commands = []
+            for compiled_item in compiled_plan:
+                commands.extend(compiled_item.render(row_values))
+            yield row_number, name, commands, None
+        except (KeyError, ValueError) as e:
+            yield row_number, name, None, str(e)
+
+
+def generate_bulk_plans(csv_path, preview_items, output_dir, column_map=None, prepare=plan_mode_transitions):
+    """Render one plan file per CSV row into output_dir
+
+    Returns (written, errors) where errors is a list of (row_number, name, message).
+    """
+    compiled_plan = compile_plan(preview_items, prepare)
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = 0
+    errors = []
+    used_names = set()
+
+    # Stream the rows so large spreadsheets never sit in memory
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for row_number, name, commands, error in iter_row_plans(csv.DictReader(f), compiled_plan, column_map):
+            if error:
+                errors.append((row_number, name, error))
+                continue
+
+            # Create a sanitized, unique filename from the row name
+            safe_name = "".join(c for c in str(name) if c.isalnum() or c in (" ", "-", "_", ".")).strip()
+            safe_name = safe_name.replace(" ", "_") or f"row_{row_number}"
+            if safe_name in used_names:
+                safe_name = f"{safe_name}_row_{row_number}"
+            used_names.add(safe_name)
+
+            with open(os.path.join(output_dir, f"{safe_name}.txt"), "w") as plan_file:
+                plan_file.write("\n".join(commands) + "\n")
+            written += 1
+
+    return written, errors
+
+
+def load_exported_preview(path):
+    """Read (item, inputs) pairs from a file written by Export Preview"""
+    with open(path, "r") as f:
+        export_data = json.load(f)
+    return [(entry["item"], entry.get("inputs")) for entry in export_data if entry.get("selected", True)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one command plan per CSV row from an exported preview")
+    parser.add_argument("csv_file", help="CSV file with one switch per row")
+    parser.add_argument("preview_file", help="Preview exported from the configurator (JSON)")
+    parser.add_argument("output_dir", help="Directory for the generated plans")
+    parser.add_argument("--map", action="append", default=[], metavar="COLUMN=INPUT",
+                        help="Map a CSV column to an input name, e.g. 'Mgmt IP=ip_address'")
+    args = parser.parse_args(argv)
+
+    column_map = dict(mapping.split("=", 1) for mapping in args.map)
+    written, errors = generate_bulk_plans(args.csv_file, load_exported_preview(args.preview_file),
+                                          args.output_dir, column_map)
+
+    for row_number, name, error in errors:
+        print(f"Row {row_number} ({name}): {error}", file=sys.stderr)
+    print(f"Wrote {written} plans to {args.output_dir}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Search over the configuration catalog.
+
+An inverted index over item names, descriptions, command text and categories
+is built once. Each query word matches indexed words exactly, by prefix (for
+search as you type) or with one typo, and items are ranked by where and how
+well every word matched.
+"""
+
+import bisect
+import re
+
+# Score for a word found in an item's name, description, commands or category
+FIELD_WEIGHTS = {"name": 3, "description": 2, "command": 1, "category": 1}
+
+# How well a query word matched an indexed word
+EXACT_MATCH = 3
+PREFIX_MATCH = 2
+FUZZY_MATCH = 1
+
+# Words shorter than this only match exactly or by prefix
+MIN_FUZZY_LENGTH = 4
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+PLACEHOLDER_RE = re.compile(r"\{[^}]*\}")
+
+
+def tokenize(text):
+    """Split text into lowercase words, ignoring input placeholders like {vlan_id}"""
+    return WORD_RE.findall(PLACEHOLDER_RE.sub(" ", text.lower()))
+
+
+def _deletions(word):
+    """Every variant of a word with one character removed"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class CatalogIndex:
+    """In-memory inverted index over a CONFIG_DATA style catalog"""
+
+    def __init__(self, catalog):
+        self.items = []
+        # word -> {item number: best field weight}
+        self.postings = {}
+
+        for category, items in catalog.items():
+            for position, item in enumerate(items):
+                item_number = len(self.items)
+                self.items.append((category, position, item))
+
+                commands = item["command"] if isinstance(item["command"], list) else [item["command"]]
+                fields = (("name", item["name"]), ("description", item.get("description", "")),
+                          ("command", "\n".join(commands)), ("category", category))
+
+                for field, text in fields:
+                    for word in tokenize(text):
+                        postings = self.postings.setdefault(word, {})
+                        postings[item_number] = max(postings.get(item_number, 0), FIELD_WEIGHTS[field])
+
+        # Sorted words for prefix lookups
+        self.words = sorted(self.postings)
+
+        # One-deletion neighbourhoods find words within one edit without scanning them all
+        self.deletion_index = {}
+        for word in self.words:
+            if len(word) >= MIN_FUZZY_LENGTH:
+                for variant in _deletions(word) | {word}:
+                    self.deletion_index.setdefault(variant, set()).add(word)
+
+    def _prefix_words(self, prefix):
+        start = bisect.bisect_left(self.words, prefix)
+        end = bisect.bisect_left(self.words, prefix + "\uffff")
+        return self.words[start:end]
+
+    def _fuzzy_words(self, word):
+        if len(word) < MIN_FUZZY_LENGTH:
+            return set()
+
+        candidates = set()
+        for variant in _deletions(word) | {word}:
+            candidates |= self.deletion_index.get(variant, set())
+        return candidates
+
+    def _match_word(self, word):
+        """Return {item number: score} for one query word"""
+        matches = {}
+
+        def add(indexed_word, quality):
+            for item_number, weight in self.postings[indexed_word].items():
+                score = weight * quality
+                if score > matches.get(item_number, 0):
+                    matches[item_number] = score
+
+        for indexed_word in self._fuzzy_words(word):
+            add(indexed_word, FUZZY_MATCH)
+        for indexed_word in self._prefix_words(word):
+            add(indexed_word, EXACT_MATCH if indexed_word == word else PREFIX_MATCH)
+
+        return matches
+
+    def search(self, query, limit=10):
+        """Return up to limit (category, position, item) tuples matching every query word"""
+        words = tokenize(query)
+        if not words:
+            return []
+
+        scores = None
+        for word in words:
+            matches = self._match_word(word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {item_number: score + matches[item_number]
+                          for item_number, score in scores.items() if item_number in matches}
+            if not scores:
+                return []
+
+        # Best score first, catalog order breaks ties
+        ranked = sorted(scores, key=lambda item_number: (-scores[item_number], item_number))
+        return [self.items[item_number] for item_number in ranked[:limit]]
@@ -4,12 +4,46 @@ import json
 import os
 import threading
 import time
-import serial
-import paramiko
 import logging
-from datetime import datetime
-from serial.tools import list_ports
+import sqlite3
+from datetime import datetime, timedelta
 from config_data import CONFIG_DATA
+from asset_cache import get_asset_cache
+from bulk_plans import generate_bulk_plans
+from catalog_search import CatalogIndex
+from cli_modes import align_sources, plan_mode_transitions
+from command_errors import HALT, POLICIES, RETRY, SKIP, describe_failure, error_action, find_error
+from execution_journal import ExecutionJournal, journal_path, mode_context
+from file_transfer import (DEFAULT_PORTS, REPLACE_CONFIRM_PROMPT, ConfigFileServer, guess_local_address,
+                           render_config_file)
+from fleet_collector import FleetCollector, inventory_facts, is_show_command, table_columns, write_csv
+from inventory import Inventory
+from log_archive import ArchiveIndexer, LogArchive, format_time, parse_time
+from log_rotation import COMPRESSED_SUFFIXES, RotatingLogHandler, get_log_maintainer, open_log
+from metrics import METRICS_PORT, MetricsServer, SnapshotWriter, get_registry
+from plan_scheduler import FINISHED_STATES, PENDING, RUNNING, PlanScheduler
+from port_ranges import find_batch_inputs, is_batch_value, render_commands, validate_batch_value
+from rollback import (INVERSE, REPLACE, REVERT_WINDOW, capture_running_config, complete_rollback_point,
+                      list_rollback_points, new_rollback_point, read_rollback_point, revert_plan, rollback_path,
+                      write_rollback_point)
+from session_recording import RECORDINGS_DIR, ReplayTransport, SessionRecorder, recording_path
+from transport import (SerialTransport, SSHTransport, DEFAULT_RESPONSES, ExpectTimeout,
+                       get_transport_loop, negotiate_console_speed)
+from utilization_poller import get_utilization_poller
+from workspace import (WorkspaceError, catalog_lookup, catalog_references, item_reference,
+                       read_workspace, resolve_item, write_workspace)
+
+_metrics = get_registry()
+QUEUE_DEPTH = _metrics.gauge("execution_queued_commands", "Commands waiting in a switch's queue", ("switch",))
+COMMAND_ERRORS = _metrics.counter("execution_command_errors_total", "Commands a switch rejected, by the action taken",
+                                  ("action",))
+EVENT_LOOP_LAG = _metrics.histogram("ui_event_loop_lag_seconds", "How late the Tk event loop runs a timer",
+                                    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+CONSOLE_RENDER = _metrics.histogram("ui_console_render_seconds", "Seconds to show a chunk of switch output")
+QUEUE_RENDER = _metrics.histogram("ui_queue_render_seconds", "Seconds to redraw a switch's next commands list")
+
+# Milliseconds between event loop lag measurements
+LAG_CHECK_INTERVAL = 500
 
 class CiscoSwitchConfigurator:
     def __init__(self, root):
@@ -24,13 +58,11 @@ class CiscoSwitchConfigurator:
         self.switch_tabs = {}
         self.switch_count = 1
         
-        # Create logging directory if it doesn't exist
-        os.makedirs("logging", exist_ok=True)
+        self.connection = None
         
-        # Initialize logging
-        self.setup_logging()
+        # Shared event loop driving every switch transport
+        self.transport_loop = get_transport_loop()
         
-        self.connection = None
         self.connection_type = tk.StringVar(value="COM")
         self.com_port = tk.StringVar()
         self.ssh_host = tk.StringVar()
@@ -57,8 +89,80 @@ class CiscoSwitchConfigurator:
         # Flag to track command sending
         self.command_sending = False
         
+        # Local server used for file transfer pushes (started on demand)
+        self.file_server = None
+        
+        # Category detail panes, built on first visit and kept so typed inputs survive
+        self.category_panes = {}
+        self.current_category = None
+        
+        # Loaded input values for categories whose panes haven't been built yet
+        self.pending_inputs = {}
+        
+        # Bumped on every workspace load so an unfinished restore stops
+        self.workspace_generation = 0
+        
+        # Catalog search index, built once (takes a few milliseconds)
+        self.catalog_index = CatalogIndex(CONFIG_DATA)
+        
+        # Known switches and recent sessions
+        try:
+            self.inventory = Inventory()
+        except (sqlite3.Error, OSError) as e:
+            self.inventory = None
+            self.program_logger.error(f"Could not open switch inventory: {str(e)}")
+        
+        # Plans scheduled to run unattended in maintenance windows
+        try:
+            self.plan_scheduler = PlanScheduler(
+                on_update=lambda job: self.root.after(0, lambda: self.on_scheduled_job_update(job)))
+        except (sqlite3.Error, OSError) as e:
+            self.plan_scheduler = None
+            self.program_logger.error(f"Could not open plan schedule: {str(e)}")
+        
+        # Searchable index of the session logs, kept up to date in the background
+        try:
+            self.log_archive = LogArchive("logging")
+            self.log_indexer = ArchiveIndexer(
+                self.log_archive,
+                on_error=lambda e: self.program_logger.error(f"Log indexing failed: {str(e)}"))
+        except (sqlite3.Error, OSError) as e:
+            self.log_archive = None
+            self.log_indexer = None
+            self.program_logger.error(f"Could not open log archive: {str(e)}")
+        
         self.setup_ui()
         
+        # Runtime metrics, scraped by Prometheus on localhost and snapshotted to metrics/
+        try:
+            self.metrics_server = MetricsServer().start()
+        except OSError as e:
+            self.metrics_server = None
+            self.program_logger.error(f"Could not serve metrics on port {METRICS_PORT}: {str(e)}")
+        self.metrics_snapshots = SnapshotWriter(
+            on_error=lambda e: self.program_logger.error(f"Could not write metrics snapshot: {str(e)}"))
+        self.metrics_snapshots.start()
+        self.root.after(LAG_CHECK_INTERVAL, self.measure_event_loop_lag, time.perf_counter())
+        
+        # Start indexing once the window is up, it only touches new or changed logs
+        if self.log_indexer:
+            self.root.after_idle(self.log_indexer.start)
+        
+        # Compress logs left over from earlier runs and drop expired ones
+        log_maintainer = get_log_maintainer()
+        log_maintainer.on_error = lambda e: self.program_logger.error(f"Log maintenance failed: {str(e)}")
+        self.root.after_idle(log_maintainer.sweep)
+        
+        # Resume scheduled plans, including ones interrupted by a restart
+        if self.plan_scheduler:
+            self.root.after_idle(self.plan_scheduler.start)
+        
+    def measure_event_loop_lag(self, scheduled_at):
+        """Record how late this timer ran, which is how long the UI was busy"""
+        now = time.perf_counter()
+        EVENT_LOOP_LAG.observe(max(0.0, now - scheduled_at - LAG_CHECK_INTERVAL / 1000))
+        self.root.after(LAG_CHECK_INTERVAL, self.measure_event_loop_lag, now)
+        
     def setup_ui(self):
         # Create a frame for additional controls
         control_frame = ttk.Frame(self.root)
@@ -66,13 +170,8 @@ class CiscoSwitchConfigurator:
         
         # Add logo to top left
         try:
-            from PIL import Image, ImageTk
-            logo_path = "media/logo.png"
-            if os.path.exists(logo_path):
-                logo_image = Image.open(logo_path)
-                # Resize logo to 100x50 pixels
-                logo_image = logo_image.resize((100, 50), Image.Resampling.LANCZOS)
-                logo_photo = ImageTk.PhotoImage(logo_image)
+            logo_photo = get_asset_cache().image("media/logo.png", (100, 50))
+            if logo_photo:
                 logo_label = ttk.Label(control_frame, image=logo_photo)
                 logo_label.image = logo_photo  # Keep a reference
                 logo_label.pack(side=tk.LEFT, padx=5)
@@ -82,6 +181,20 @@ class CiscoSwitchConfigurator:
         # Add New Switch Tab button
         ttk.Button(control_frame, text="New Switch Tab", 
                   command=self.create_new_switch_tab).pack(side=tk.RIGHT)
+        ttk.Button(control_frame, text="Switch Inventory", 
+                  command=self.show_inventory_picker).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Search Logs", 
+                  command=self.show_log_search).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Replay Session", 
+                  command=self.replay_session).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Scheduled Jobs", 
+                  command=self.show_scheduled_jobs).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Rollback Points", 
+                  command=self.show_rollback_points).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Fleet Audit", 
+                  command=self.show_fleet_audit).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Utilization", 
+                  command=self.show_utilization).pack(side=tk.RIGHT, padx=5)
         
         # Create notebook (tabs)
         self.notebook = ttk.Notebook(self.root)
@@ -122,10 +235,13 @@ class CiscoSwitchConfigurator:
         program_logger = logging.getLogger('program')
         program_logger.setLevel(logging.INFO)
         
-        # Create a file handler for program logging
-        program_handler = logging.FileHandler(
-            f"logging/program_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        )
+        # Only attach the file handler once, repeated calls reuse it
+        self.program_logger = program_logger
+        if any(isinstance(handler, logging.FileHandler) for handler in program_logger.handlers):
+            return
+        
+        # Create a file handler for program logging, rotated and compressed as it grows
+        program_handler = RotatingLogHandler("logging/program")
         program_handler.setLevel(logging.INFO)
         
         # Create a formatter
@@ -135,9 +251,6 @@ class CiscoSwitchConfigurator:
         # Add the handler to the logger
         program_logger.addHandler(program_handler)
         
-        # Store the logger
-        self.program_logger = program_logger
-        
         # Log program start
         self.program_logger.info("Cisco Switch Configurator started")
         
@@ -154,8 +267,7 @@ class CiscoSwitchConfigurator:
         safe_name = safe_name.replace(' ', '_')
         
         # Create a file handler for this switch's conversation
-        log_filename = f"logging/{safe_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        conversation_handler = logging.FileHandler(log_filename)
+        conversation_handler = RotatingLogHandler(f"logging/{safe_name}")
         conversation_handler.setLevel(logging.INFO)
         
         # Create a formatter with timestamp
@@ -169,6 +281,7 @@ class CiscoSwitchConfigurator:
         # Remove any existing handlers to avoid duplicates
         for handler in switch_logger.handlers[:]:
             switch_logger.removeHandler(handler)
+            handler.close()
             
         switch_logger.addHandler(conversation_handler)
         
@@ -181,6 +294,13 @@ class CiscoSwitchConfigurator:
         
     def create_new_switch_tab(self):
         """Create a new tab for another switch"""
+        switch_num = self.add_switch_tab()
+        
+        # Show connection dialog for the new switch
+        self.show_connection_dialog(switch_num)
+        
+    def add_switch_tab(self):
+        """Add an unconnected console tab for another switch and return its number"""
         # Increment switch count
         self.switch_count += 1
         switch_num = self.switch_count
@@ -199,7 +319,6 @@ class CiscoSwitchConfigurator:
             'connection_type': switch_connection_type,
             'console_output': None,
             'console_input': None,
-            'ssh_shell': None,
             'queued_commands': [],
             'manual_mode': tk.BooleanVar(value=False),
             'auto_execute': tk.BooleanVar(value=False),
@@ -214,30 +333,45 @@ class CiscoSwitchConfigurator:
         # Select the new tab
         self.notebook.select(new_console_frame)
         
-        # Show connection dialog for the new switch
-        self.show_connection_dialog(switch_num)
+        return switch_num
+        
+    def show_connection_dialog(self, switch_num, defaults=None):
+        """Show a dialog to configure connection for a specific switch
+        
+        defaults is an inventory record used to fill in the fields.
+        """
+        defaults = defaults or {}
         
-    def show_connection_dialog(self, switch_num):
-        """Show a dialog to configure connection for a specific switch"""
         dialog = tk.Toplevel(self.root)
         dialog.title(f"Connect Switch {switch_num}")
-        dialog.geometry("400x400")  # Made taller to accommodate the name field
+        dialog.geometry("400x460")  # Made taller to accommodate the name, site and tags fields
         dialog.transient(self.root)
         dialog.grab_set()
         
         switch_data = self.switch_tabs[switch_num]
+        if defaults.get('connection_type'):
+            switch_data['connection_type'].set(defaults['connection_type'])
         
         # Switch name field
         name_frame = ttk.LabelFrame(dialog, text="Switch Identification")
         name_frame.pack(fill=tk.X, padx=10, pady=10)
         
         ttk.Label(name_frame, text="Switch Name:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        switch_name = tk.StringVar(value=f"Switch {switch_num}")
+        switch_name = tk.StringVar(value=defaults.get('name', f"Switch {switch_num}"))
         name_entry = ttk.Entry(name_frame, textvariable=switch_name, width=30)
         name_entry.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W+tk.E)
         name_entry.select_range(0, tk.END)
         name_entry.focus()
         
+        # Site and tags are kept in the switch inventory
+        ttk.Label(name_frame, text="Site:").grid(row=1, column=0, padx=5, pady=2, sticky=tk.W)
+        site_var = tk.StringVar(value=defaults.get('site', ""))
+        ttk.Entry(name_frame, textvariable=site_var, width=30).grid(row=1, column=1, padx=5, pady=2, sticky=tk.W+tk.E)
+        
+        ttk.Label(name_frame, text="Tags:").grid(row=2, column=0, padx=5, pady=2, sticky=tk.W)
+        tags_var = tk.StringVar(value=defaults.get('tags', ""))
+        ttk.Entry(name_frame, textvariable=tags_var, width=30).grid(row=2, column=1, padx=5, pady=2, sticky=tk.W+tk.E)
+        
         # Connection type
         conn_frame = ttk.LabelFrame(dialog, text="Connection Type")
         conn_frame.pack(fill=tk.X, padx=10, pady=10)
@@ -251,17 +385,18 @@ class CiscoSwitchConfigurator:
         com_frame = ttk.LabelFrame(dialog, text="COM Port Settings")
         com_frame.pack(fill=tk.X, padx=10, pady=10)
         
-        com_port = tk.StringVar()
-        baudrate = tk.IntVar(value=9600)
+        com_port = tk.StringVar(value=defaults.get('com_port', ""))
+        baudrate = tk.IntVar(value=defaults.get('baudrate', 9600))
         
         ttk.Label(com_frame, text="COM Port:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
         com_combo = ttk.Combobox(com_frame, textvariable=com_port)
         com_combo.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
         
         # Get available COM ports
+        from serial.tools import list_ports
         ports = [port.device for port in list_ports.comports()]
         com_combo['values'] = ports
-        if ports:
+        if ports and not com_port.get():
             com_port.set(ports[0])
             
         ttk.Label(com_frame, text="Baudrate:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
@@ -274,8 +409,8 @@ class CiscoSwitchConfigurator:
         ssh_frame.pack(fill=tk.X, padx=10, pady=10)
         
         # Create local variables for SSH settings
-        ssh_host_var = tk.StringVar()
-        ssh_username_var = tk.StringVar()
+        ssh_host_var = tk.StringVar(value=defaults.get('host', ""))
+        ssh_username_var = tk.StringVar(value=defaults.get('username', ""))
         ssh_password_var = tk.StringVar()
         
         ttk.Label(ssh_frame, text="Host:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
@@ -285,22 +420,32 @@ class CiscoSwitchConfigurator:
         ttk.Entry(ssh_frame, textvariable=ssh_username_var).grid(row=1, column=1, padx=5, pady=5, sticky=tk.W+tk.E)
         
         ttk.Label(ssh_frame, text="Password:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
-        ttk.Entry(ssh_frame, textvariable=ssh_password_var, show="*").grid(row=2, column=1, padx=5, pady=5, sticky=tk.W+tk.E)
+        password_entry = ttk.Entry(ssh_frame, textvariable=ssh_password_var, show="*")
+        password_entry.grid(row=2, column=1, padx=5, pady=5, sticky=tk.W+tk.E)
+        
+        # A switch picked from the inventory only needs its password
+        if defaults.get('connection_type') == "SSH":
+            password_entry.focus()
         
         # Buttons
         button_frame = ttk.Frame(dialog)
         button_frame.pack(fill=tk.X, padx=10, pady=10)
         
-        ttk.Button(button_frame, text="Connect", 
-                  command=lambda: self.connect_switch_from_dialog(
-                      switch_num, switch_name.get(), com_port.get(), baudrate.get(), 
-                      ssh_host_var.get(), ssh_username_var.get(), ssh_password_var.get(), dialog
-                  )).pack(side=tk.RIGHT, padx=5)
+        def on_connect():
+            self.connect_switch_from_dialog(
+                switch_num, switch_name.get(), com_port.get(), baudrate.get(), 
+                ssh_host_var.get(), ssh_username_var.get(), ssh_password_var.get(), dialog,
+                site=site_var.get(), tags=tags_var.get()
+            )
+            
+        ttk.Button(button_frame, text="Connect", command=on_connect).pack(side=tk.RIGHT, padx=5)
+        dialog.bind("<Return>", lambda e: on_connect())
         
         ttk.Button(button_frame, text="Cancel", 
                   command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
                   
-    def connect_switch_from_dialog(self, switch_num, switch_name, com_port, baudrate, ssh_host, ssh_username, ssh_password, dialog):
+    def connect_switch_from_dialog(self, switch_num, switch_name, com_port, baudrate, ssh_host, ssh_username, ssh_password, dialog,
+                                   site=None, tags=None):
         """Connect to a switch using the details from the dialog"""
         switch_data = self.switch_tabs[switch_num]
         
@@ -312,58 +457,23 @@ class CiscoSwitchConfigurator:
         
         try:
             if switch_data['connection_type'].get() == "COM":
-                connection = serial.Serial(
-                    port=com_port,
-                    baudrate=baudrate,
-                    timeout=1
-                )
-                connection_info = f"Connected to {switch_name} via {com_port} at {baudrate} baud"
-                
-                # Store the connection
-                switch_data['connection'] = connection
-                
-                # Update console
-                console_output = switch_data['console_output']
-                console_output.config(state=tk.NORMAL)
-                console_output.insert(tk.END, f"{connection_info}\n")
-                console_output.see(tk.END)
-                console_output.config(state=tk.DISABLED)
-                
-                # Setup logging for this switch
-                self.setup_switch_logging(switch_num)
-                
-                # Start a thread to read from serial
-                threading.Thread(target=lambda: self.read_from_serial_for_switch(switch_num), 
-                                daemon=True).start()
+                transport = SerialTransport(com_port, baudrate)
             else:
-                # SSH connection
-                client = paramiko.SSHClient()
-                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                client.connect(
-                    hostname=ssh_host,
-                    username=ssh_username,
-                    password=ssh_password
-                )
-                ssh_shell = client.invoke_shell()
-                connection_info = f"Connected to {switch_name} via SSH ({ssh_host})"
-                
-                # Store the connection
-                switch_data['connection'] = client
-                switch_data['ssh_shell'] = ssh_shell
-                
-                # Update console
-                console_output = switch_data['console_output']
-                console_output.config(state=tk.NORMAL)
-                console_output.insert(tk.END, f"{connection_info}\n")
-                console_output.see(tk.END)
-                console_output.config(state=tk.DISABLED)
-                
-                # Setup logging for this switch
-                self.setup_switch_logging(switch_num)
+                transport = SSHTransport(ssh_host, ssh_username, ssh_password)
                 
-                # Start a thread to read from SSH
-                threading.Thread(target=lambda: self.read_from_ssh_for_switch(switch_num), 
-                                daemon=True).start()
+            # Wait for the connection to open and start reading from it
+            self.open_transport(transport)
+            self.attach_transport_to_switch(switch_num, transport)
+            
+            # Update console
+            self.log_to_console_for_switch(switch_num, f"Connected to {switch_name} via {transport.description}\n")
+            
+            # Setup logging for this switch
+            self.setup_switch_logging(switch_num)
+            
+            # Remember the switch for next time
+            switch_data['connection_details'] = self.connection_details_for(transport)
+            self.remember_switch(switch_name, transport, site, tags)
                 
             # Switch to console tab after connecting
             if 1 in self.switch_tabs:
@@ -372,12 +482,329 @@ class CiscoSwitchConfigurator:
             # Update the switch selector
             self.update_switch_selector()
             
-            dialog.destroy()
+            if dialog:
+                dialog.destroy()
+                
+            # Offer to finish a run that was interrupted on this switch
+            self.root.after_idle(lambda: self.offer_journal_resume(switch_num))
             
         except Exception as e:
             messagebox.showerror("Connection Error", str(e))
             self.program_logger.error(f"Connection error for switch {switch_num}: {str(e)}")
             
+    def connection_details_for(self, transport):
+        """Return the settings needed to open a transport again, without the password"""
+        if isinstance(transport, SSHTransport):
+            return {'connection_type': "SSH", 'host': transport.host, 'username': transport.username,
+                    'ssh_port': transport.ssh_port}
+        return {'connection_type': "COM", 'com_port': transport.port, 'baudrate': transport.baudrate}
+        
+    def remember_switch(self, switch_name, transport, site=None, tags=None):
+        """Record a successful connection in the switch inventory (never the password)"""
+        if not self.inventory:
+            return
+            
+        try:
+            self.inventory.remember(switch_name, site=site, tags=tags, **self.connection_details_for(transport))
+        except sqlite3.Error as e:
+            self.program_logger.error(f"Could not update switch inventory: {str(e)}")
+            
+    def show_inventory_picker(self):
+        """Show the switch inventory and open a tab for the chosen switch"""
+        if not self.inventory:
+            messagebox.showerror("Switch Inventory", "The switch inventory is not available")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Switch Inventory")
+        dialog.geometry("700x450")
+        dialog.transient(self.root)
+        
+        search_var = tk.StringVar()
+        search_frame = ttk.Frame(dialog)
+        search_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(search_frame, text="Search (name, site, IP or tag):").pack(side=tk.LEFT, padx=5)
+        search_entry = ttk.Entry(search_frame, textvariable=search_var)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        search_entry.focus()
+        
+        # Recent sessions are shown until something is typed
+        columns = ("name", "site", "address", "tags", "last_seen")
+        headings = ("Name", "Site", "Host / Port", "Tags", "Last Seen")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings", selectmode="browse")
+        for column, heading in zip(columns, headings):
+            tree.heading(column, text=heading)
+            tree.column(column, width=120 if column != "tags" else 160)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        records = {}
+        
+        def refresh(event=None):
+            tree.delete(*tree.get_children())
+            records.clear()
+            for record in self.inventory.search(search_var.get()):
+                address = record['host'] if record['connection_type'] == "SSH" else record['com_port']
+                last_seen = (datetime.fromtimestamp(record['last_seen']).strftime("%Y-%m-%d %H:%M")
+                             if record['last_seen'] else "")
+                item_id = tree.insert("", tk.END, values=(record['name'], record['site'], address,
+                                                         record['tags'], last_seen))
+                records[item_id] = record
+            children = tree.get_children()
+            if children:
+                tree.selection_set(children[0])
+                
+        def open_selected(event=None):
+            selection = tree.selection()
+            if not selection:
+                return
+            record = records[selection[0]]
+            dialog.destroy()
+            self.open_inventory_switch(record)
+            
+        def forget_selected():
+            selection = tree.selection()
+            if selection and messagebox.askyesno("Switch Inventory",
+                                                 f"Remove {records[selection[0]]['name']} from the inventory?",
+                                                 parent=dialog):
+                self.inventory.forget(records[selection[0]]['name'])
+                refresh()
+                
+        def edit_selected():
+            selection = tree.selection()
+            if not selection:
+                return
+            record = records[selection[0]]
+            
+            edit_dialog = tk.Toplevel(dialog)
+            edit_dialog.title(f"Site and Tags - {record['name']}")
+            edit_dialog.transient(dialog)
+            edit_dialog.grab_set()
+            
+            site_var = tk.StringVar(value=record['site'])
+            tags_var = tk.StringVar(value=record['tags'])
+            fields_frame = ttk.Frame(edit_dialog)
+            fields_frame.pack(fill=tk.X, padx=10, pady=10)
+            ttk.Label(fields_frame, text="Site:").grid(row=0, column=0, padx=5, pady=2, sticky=tk.W)
+            site_entry = ttk.Entry(fields_frame, textvariable=site_var, width=30)
+            site_entry.grid(row=0, column=1, padx=5, pady=2)
+            ttk.Label(fields_frame, text="Tags (comma separated):").grid(row=1, column=0, padx=5, pady=2, sticky=tk.W)
+            ttk.Entry(fields_frame, textvariable=tags_var, width=30).grid(row=1, column=1, padx=5, pady=2)
+            site_entry.focus()
+            
+            def save(event=None):
+                try:
+                    self.inventory.set_site_and_tags(record['name'], site_var.get(), tags_var.get())
+                except sqlite3.Error as e:
+                    messagebox.showerror("Switch Inventory", f"Could not save site and tags: {str(e)}",
+                                         parent=edit_dialog)
+                    self.program_logger.error(f"Could not save site and tags of {record['name']}: {str(e)}")
+                    return
+                edit_dialog.destroy()
+                refresh()
+                # Keep the edited switch selected
+                for item_id, refreshed in records.items():
+                    if refreshed['name'] == record['name']:
+                        tree.selection_set(item_id)
+                        tree.see(item_id)
+                        break
+                        
+            edit_dialog.bind('<Return>', save)
+            edit_dialog.bind('<Escape>', lambda e: edit_dialog.destroy())
+            edit_buttons = ttk.Frame(edit_dialog)
+            edit_buttons.pack(fill=tk.X, padx=10, pady=(0, 10))
+            ttk.Button(edit_buttons, text="Save", command=save).pack(side=tk.RIGHT, padx=5)
+            ttk.Button(edit_buttons, text="Cancel", command=edit_dialog.destroy).pack(side=tk.RIGHT, padx=5)
+                
+        def move_selection(step):
+            children = tree.get_children()
+            if not children:
+                return "break"
+            selection = tree.selection()
+            index = children.index(selection[0]) if selection else -1
+            index = max(0, min(len(children) - 1, index + step))
+            tree.selection_set(children[index])
+            tree.see(children[index])
+            return "break"
+            
+        search_entry.bind('<KeyRelease>', lambda e: refresh() if e.keysym not in ("Up", "Down", "Return") else None)
+        search_entry.bind('<Return>', open_selected)
+        search_entry.bind('<Down>', lambda e: move_selection(1))
+        search_entry.bind('<Up>', lambda e: move_selection(-1))
+        tree.bind('<Double-Button-1>', open_selected)
+        tree.bind('<Return>', open_selected)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Connect", command=open_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Edit Site/Tags", command=edit_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Remove", command=forget_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        refresh()
+        
+    def show_log_search(self):
+        """Search the session logs by switch, time window and text"""
+        if not self.log_archive:
+            messagebox.showerror("Search Logs", "The log archive is not available")
+            return
+            
+        # Pick up logs written since the last background pass
+        self.log_indexer.refresh()
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Search Logs")
+        dialog.geometry("900x500")
+        dialog.transient(self.root)
+        
+        text_var = tk.StringVar()
+        switch_var = tk.StringVar()
+        since_var = tk.StringVar(value="7d")
+        until_var = tk.StringVar()
+        
+        search_frame = ttk.Frame(dialog)
+        search_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(search_frame, text="Text:").pack(side=tk.LEFT, padx=5)
+        text_entry = ttk.Entry(search_frame, textvariable=text_var, width=30)
+        text_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        text_entry.focus()
+        ttk.Label(search_frame, text="Switch:").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(search_frame, textvariable=switch_var, width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Label(search_frame, text="Since:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(search_frame, textvariable=since_var, width=12,
+                     values=("1h", "24h", "7d", "30d", "")).pack(side=tk.LEFT, padx=5)
+        ttk.Label(search_frame, text="Until:").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(search_frame, textvariable=until_var, width=16).pack(side=tk.LEFT, padx=5)
+        
+        columns = ("time", "switch", "line")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings", selectmode="browse")
+        tree.heading("time", text="Time")
+        tree.heading("switch", text="Switch")
+        tree.heading("line", text="Line")
+        tree.column("time", width=140, stretch=False)
+        tree.column("switch", width=120, stretch=False)
+        tree.column("line", width=600)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        status_var = tk.StringVar()
+        ttk.Label(dialog, textvariable=status_var).pack(fill=tk.X, padx=10, pady=(5, 0))
+        
+        matches = {}
+        
+        def search(event=None):
+            try:
+                since = parse_time(since_var.get()) if since_var.get().strip() else None
+                until = parse_time(until_var.get()) if until_var.get().strip() else None
+            except ValueError as e:
+                messagebox.showerror("Search Logs", str(e), parent=dialog)
+                return
+                
+            started = time.perf_counter()
+            try:
+                results = self.log_archive.search(text_var.get(), switch_var.get().strip(), since, until)
+            except sqlite3.Error as e:
+                self.program_logger.error(f"Log search failed: {str(e)}")
+                messagebox.showerror("Search Logs", f"Search failed: {str(e)}", parent=dialog)
+                return
+            elapsed = (time.perf_counter() - started) * 1000
+            
+            tree.delete(*tree.get_children())
+            matches.clear()
+            for record_time, switch, path, line in results:
+                item_id = tree.insert("", tk.END, values=(format_time(record_time), switch, line))
+                matches[item_id] = (path, line)
+            status_var.set(f"{len(results)} lines in {elapsed:.0f} ms")
+            
+        def open_selected(event=None):
+            selection = tree.selection()
+            if selection:
+                self.show_log_file(*matches[selection[0]])
+                
+        text_entry.bind('<Return>', search)
+        tree.bind('<Double-Button-1>', open_selected)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Search", command=search).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Open Log", command=open_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        
+    def show_log_file(self, path, line=None):
+        """Show a log file, scrolled to and highlighting a line if given"""
+        # The segment may have been compressed since it was indexed
+        if not os.path.exists(path):
+            path = next((path + suffix for suffix in COMPRESSED_SUFFIXES if os.path.exists(path + suffix)), path)
+            
+        try:
+            with open_log(path) as f:
+                content = f.read()
+        except OSError as e:
+            messagebox.showerror("Log File", f"Could not open {path}: {str(e)}")
+            return
+            
+        viewer = tk.Toplevel(self.root)
+        viewer.title(os.path.basename(path))
+        viewer.geometry("900x600")
+        
+        text = scrolledtext.ScrolledText(viewer, wrap=tk.NONE, font=("Courier", 10))
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        text.insert(tk.END, content)
+        text.tag_configure("match", background="yellow")
+        
+        if line:
+            position = text.search(line, "1.0", stopindex=tk.END, exact=True)
+            if position:
+                text.tag_add("match", position, f"{position} lineend")
+                text.see(position)
+        text.configure(state=tk.DISABLED)
+        
+    def replay_session(self):
+        """Play a session recording back into a new console tab"""
+        path = filedialog.askopenfilename(
+            initialdir=RECORDINGS_DIR if os.path.isdir(RECORDINGS_DIR) else ".",
+            filetypes=[("Session recordings", "*.rec"), ("All files", "*.*")],
+            title="Replay Session"
+        )
+        if not path:
+            return
+            
+        real_time = messagebox.askyesnocancel(
+            "Replay Session", "Replay at the recorded pace?\n\nChoose No to replay as fast as possible.")
+        if real_time is None:
+            return
+            
+        transport = ReplayTransport(path, speed=1.0 if real_time else None)
+        try:
+            self.open_transport(transport)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Replay Session", f"Could not read {os.path.basename(path)}: {str(e)}")
+            return
+            
+        switch_num = self.add_switch_tab()
+        switch_data = self.switch_tabs[switch_num]
+        switch_data['name'] = f"Replay - {transport.header.get('switch', os.path.basename(path))}"
+        self.notebook.tab(switch_data['frame'], text=switch_data['name'])
+        self.attach_transport_to_switch(switch_num, transport)
+        self.program_logger.info(f"Replaying session recording {path}")
+        
+    def open_inventory_switch(self, record):
+        """Open a console tab for a switch from the inventory"""
+        switch_num = self.add_switch_tab()
+        
+        if record['connection_type'] == "COM":
+            # Serial connections need nothing else, connect straight away
+            switch_data = self.switch_tabs[switch_num]
+            switch_data['connection_type'].set("COM")
+            self.connect_switch_from_dialog(switch_num, record['name'], record['com_port'], record['baudrate'],
+                                            "", "", "", None)
+            if not switch_data['connection']:
+                # Let the user fix the port if it has changed
+                self.show_connection_dialog(switch_num, record)
+        else:
+            # Passwords are never stored, ask for it with everything else filled in
+            self.show_connection_dialog(switch_num, record)
+            
     def setup_console_tab(self, switch_num=1):
         """Set up the console tab for a specific switch"""
         # Get the frame for this switch
@@ -436,6 +863,14 @@ class CiscoSwitchConfigurator:
         )
         test_conn_button.pack(side=tk.LEFT, padx=10)
         
+        # Console speed button (COM connections only)
+        speed_button = ttk.Button(
+            options_frame,
+            text="Speed Up Console",
+            command=lambda: self.raise_console_speed(switch_num)
+        )
+        speed_button.pack(side=tk.LEFT, padx=10)
+        
         # Save Config and Exit button
         save_exit_button = ttk.Button(
             options_frame,
@@ -444,8 +879,15 @@ class CiscoSwitchConfigurator:
         )
         save_exit_button.pack(side=tk.LEFT, padx=10)
         
-        # Close tab button (only for additional tabs, not the first one)
+        # Connect and close tab buttons (only for additional tabs, not the first one)
         if switch_num > 1:
+            connect_button = ttk.Button(
+                options_frame,
+                text="Connect",
+                command=lambda: self.reconnect_switch(switch_num)
+            )
+            connect_button.pack(side=tk.LEFT, padx=10)
+            
             close_button = ttk.Button(
                 options_frame,
                 text="Close Tab",
@@ -623,11 +1065,7 @@ class CiscoSwitchConfigurator:
             self.log_to_console_for_switch(switch_num, "\n> [Sending Enter keypress]\n")
             
             # Send just a carriage return
-            if switch_data['connection_type'].get() == "COM":
-                connection.write(b"\r\n")
-                connection.flush()
-            else:
-                switch_data['ssh_shell'].send("\n")
+            self.write_to_switch(switch_num, "")
                 
         except Exception as e:
             messagebox.showerror("Command Error", str(e))
@@ -659,13 +1097,9 @@ class CiscoSwitchConfigurator:
         
         # Send the command
         try:
-            if switch_data['connection_type'].get() == "COM":
-                # Add proper line endings for Cisco devices
-                command_bytes = (command + "\r\n").encode()
-                connection.write(command_bytes)
-                connection.flush()
-            else:
-                switch_data['ssh_shell'].send(command + "\n")
+            # Journal first, so the answer can't arrive before the journal expects it
+            run_index = self.journal_command_sent(switch_num, command)
+            self.write_to_switch(switch_num, command)
                 
             # Clear the input field
             console_input.delete(0, tk.END)
@@ -682,15 +1116,18 @@ class CiscoSwitchConfigurator:
                     # Update the Next Commands display
                     self.update_next_commands_display(switch_num)
                 
-                # If auto-execute, queue the next one
+                # If auto-execute, check the result and carry on with the next one
                 if switch_data['auto_execute'].get() and switch_data['queued_commands']:
-                    delay_ms = int(switch_data['command_delay'].get() * 1000)
-                    self.root.after(delay_ms, lambda: self.execute_next_command_for_switch(switch_num))
+                    self.watch_command_result(switch_num, command, run_index)
                 # Otherwise load the next one for manual execution
                 elif switch_data['queued_commands']:
                     console_input.delete(0, tk.END)
                     console_input.insert(0, switch_data['queued_commands'][0])
                     self.log_to_console_for_switch(switch_num, "Ready for next command. Press Enter or click Send to continue.\n")
+                # That was the last command of the run, finish it once its output is in, as the auto path does,
+                # so the rollback point's after config includes what it changed
+                else:
+                    self.watch_command_result(switch_num, command, run_index)
                 
         except Exception as e:
             messagebox.showerror("Command Error", str(e))
@@ -717,11 +1154,7 @@ class CiscoSwitchConfigurator:
         
         # Send the password
         try:
-            if switch_data['connection_type'].get() == "COM":
-                switch_data['connection'].write((password + "\r\n").encode())
-                switch_data['connection'].flush()
-            else:
-                switch_data['ssh_shell'].send(password + "\n")
+            self.write_to_switch(switch_num, password, error_title="Login Error", secret=True)
                 
             # Clear the password field
             switch_data['password_var'].set("")
@@ -740,14 +1173,20 @@ class CiscoSwitchConfigurator:
         # Log the closure
         if 'logger' in switch_data:
             switch_data['logger'].info("=== Session ended - Tab closed ===")
-        
+            
+            # Close the session log so it gets compressed
+            for handler in switch_data['logger'].handlers[:]:
+                switch_data['logger'].removeHandler(handler)
+                handler.close()
+        
+        # Stop journaling, an unfinished run can be resumed after reconnecting
+        if switch_data.get('journal'):
+            switch_data['journal'].close()
+            
         # Disconnect if connected
         if switch_data['connection']:
             try:
-                if switch_data['connection_type'].get() == "COM":
-                    switch_data['connection'].close()
-                else:
-                    switch_data['connection'].close()
+                self.close_transport(switch_data['connection'])
             except:
                 pass
         
@@ -763,46 +1202,93 @@ class CiscoSwitchConfigurator:
         # Log the closure in program log
         self.program_logger.info(f"Closed switch tab {switch_num}")
         
-    def read_from_serial_for_switch(self, switch_num):
-        """Read data from serial port for a specific switch"""
+    def open_transport(self, transport):
+        """Open a transport on the shared transport loop and wait until it is connected"""
+        return self.transport_loop.submit(transport.open()).result()
+        
+    def close_transport(self, transport):
+        """Close a transport on the shared transport loop"""
+        return self.transport_loop.submit(transport.close()).result(timeout=5)
+        
+    def attach_transport_to_switch(self, switch_num, transport):
+        """Store an open transport for a switch and route its output to the console
+        
+        Live sessions are recorded byte for byte to the recordings folder.
+        """
         switch_data = self.switch_tabs[switch_num]
-        connection = switch_data['connection']
+        switch_data['connection'] = transport
         
-        while connection and hasattr(connection, 'is_open') and connection.is_open:
+        if not isinstance(transport, ReplayTransport) and not transport.recorder:
             try:
-                # Wait a bit for data to arrive
-                time.sleep(0.1)
-                
-                if connection.in_waiting:
-                    data = connection.read(connection.in_waiting).decode('utf-8', errors='replace')
-                    if data:
-                        # Use after() to update UI in the main thread
-                        self.root.after(0, lambda: self.log_to_console_for_switch(switch_num, data, from_device=True))
-            except (serial.SerialException, IOError):
-                error_msg = "Error reading from serial port"
+                transport.recorder = SessionRecorder(recording_path(switch_data['name']),
+                                                     switch=switch_data['name'], transport=transport.description)
+            except OSError as e:
+                self.program_logger.error(f"Could not record session for switch {switch_num}: {str(e)}")
+        
+        def on_data(text):
+            # Use after() to update UI in the main thread
+            self.root.after(0, lambda: self.on_switch_output(switch_num, text))
+            
+        def on_close(error):
+            if error:
+                error_msg = f"Error reading from {transport.kind} connection: {error}"
                 self.root.after(0, lambda: self.log_to_console_for_switch(switch_num, error_msg + "\n"))
-                break
-
-    def read_from_ssh_for_switch(self, switch_num):
-        """Read data from SSH connection for a specific switch"""
+                
+        transport.add_listener(on_data, on_close)
+        
+    def on_switch_output(self, switch_num, text):
+        """Show output from a switch and keep it for checking the running command"""
+        if switch_num not in self.switch_tabs:
+            return
         switch_data = self.switch_tabs[switch_num]
-        connection = switch_data['connection']
-        ssh_shell = switch_data['ssh_shell']
+        # Only the tail matters, errors are printed right after the command
+        switch_data['command_output'] = (switch_data.get('command_output', "") + text)[-64 * 1024:]
+        with CONSOLE_RENDER.time():
+            self.log_to_console_for_switch(switch_num, text, from_device=True)
+        
+    def write_to_switch(self, switch_num, text, newline=True, error_title="Command Error", secret=False):
+        """Send text to a switch over its transport without blocking the UI
+        
+        Secret text such as passwords is left out of the session recording.
+        """
+        transport = self.switch_tabs[switch_num]['connection']
+        future = self.transport_loop.submit(transport.send(text, newline, secret))
+        
+        def on_done(done):
+            error = done.exception()
+            if error:
+                self.program_logger.error(f"Error sending to switch {switch_num}: {str(error)}")
+                self.root.after(0, lambda: self.log_to_console_for_switch(switch_num, f"Error sending command: {error}\n"))
+                if error_title:
+                    self.root.after(0, lambda: messagebox.showerror(error_title, str(error)))
+                    
+        future.add_done_callback(on_done)
+        return future
         
-        while connection and ssh_shell:
-            try:
-                # Wait a bit for data to arrive
-                time.sleep(0.1)
-                
-                if ssh_shell.recv_ready():
-                    data = ssh_shell.recv(4096).decode('utf-8', errors='replace')
-                    if data:
-                        # Use after() to update UI in the main thread
-                        self.root.after(0, lambda: self.log_to_console_for_switch(switch_num, data, from_device=True))
-            except (paramiko.SSHException, IOError):
-                error_msg = "Error reading from SSH connection"
-                self.root.after(0, lambda: self.log_to_console_for_switch(switch_num, error_msg + "\n"))
-                break
+    def expect_for_switch(self, switch_num, patterns, callback, timeout=10.0, command=None, responses=None):
+        """Wait for switch output matching one of the patterns without blocking the UI
+        
+        If command is given it is sent first. callback(result, error) runs on the UI
+        thread with the ExpectResult, or with the error if nothing matched in time.
+        """
+        transport = self.switch_tabs[switch_num]['connection']
+        
+        if command is not None:
+            if command:
+                self.log_to_console_for_switch(switch_num, f"\n> {command}\n")
+            coro = transport.send_and_expect(command, patterns, timeout, responses)
+        else:
+            coro = transport.expect(patterns, timeout, responses)
+            
+        future = self.transport_loop.submit(coro)
+        
+        def on_done(done):
+            error = done.exception()
+            result = None if error else done.result()
+            self.root.after(0, lambda: callback(result, error))
+            
+        future.add_done_callback(on_done)
+        return future
 
     def log_to_console_for_switch(self, switch_num, text, from_device=False):
         """Log text to the console for a specific switch"""
@@ -887,53 +1373,74 @@ class CiscoSwitchConfigurator:
             
         self.log_to_console_for_switch(switch_num, "\n--- Testing connection ---\n")
         
-        try:
-            # Send a test command based on connection type
-            if switch_data['connection_type'].get() == "COM":
-                # Reset buffers
-                connection.reset_input_buffer()
-                connection.reset_output_buffer()
-                
-                # Send a return
-                connection.write("\r\n".encode())
-                connection.flush()
-                time.sleep(0.5)
-                
-                # Check for response
-                if connection.in_waiting:
-                    data = connection.read(connection.in_waiting).decode('utf-8', errors='replace')
-                    if data:
-                        self.log_to_console_for_switch(switch_num, data, from_device=True)
-                        self.log_to_console_for_switch(switch_num, "\n--- Connection test successful! ---\n")
-                        return
+        def on_explicit_response(result, error):
+            if error:
+                self.log_to_console_for_switch(switch_num, f"\n--- Connection test failed: {error} ---\n")
             else:
-                # Send a return via SSH
-                ssh_shell = switch_data['ssh_shell']
-                ssh_shell.send("\n")
-                time.sleep(0.5)
-                
-                # Check for response
-                if ssh_shell.recv_ready():
-                    data = ssh_shell.recv(4096).decode('utf-8', errors='replace')
-                    if data:
-                        self.log_to_console_for_switch(switch_num, data, from_device=True)
-                        self.log_to_console_for_switch(switch_num, "\n--- Connection test successful! ---\n")
-                        return
-            
+                self.log_to_console_for_switch(switch_num, "\n--- Connection test successful! ---\n")
+                
+        def on_response(result, error):
+            if not error:
+                self.log_to_console_for_switch(switch_num, "\n--- Connection test successful! ---\n")
+                return
+                
+            if not isinstance(error, ExpectTimeout):
+                self.log_to_console_for_switch(switch_num, f"\n--- Connection test failed: {error} ---\n")
+                return
+                
             # If we get here, no response was received
             self.log_to_console_for_switch(switch_num, "\n--- No response from device. Trying more explicit command... ---\n")
             
             # Try a more explicit command
-            if switch_data['connection_type'].get() == "COM":
-                connection.write("show version\r\n".encode())
-                connection.flush()
+            self.expect_for_switch(switch_num, r"\S", on_explicit_response, timeout=5, command="show version")
+            
+        # Send a return - any visible output means the switch is there. The output itself
+        # reaches the console through the transport listener.
+        self.expect_for_switch(switch_num, r"\S", on_response, timeout=2, command="")
+            
+    def raise_console_speed(self, switch_num, target_baudrate=115200):
+        """Raise the console line speed on the switch and follow it with the local port"""
+        if switch_num not in self.switch_tabs:
+            return
+            
+        switch_data = self.switch_tabs[switch_num]
+        transport = switch_data['connection']
+        
+        if not transport:
+            messagebox.showwarning("Not Connected", "Please connect to a switch first")
+            return
+            
+        if switch_data['connection_type'].get() != "COM":
+            messagebox.showinfo("Console Speed", "Console speed can only be changed on COM connections")
+            return
+            
+        if transport.baudrate >= target_baudrate:
+            self.log_to_console_for_switch(switch_num, f"\n--- Console already runs at {transport.baudrate} baud ---\n")
+            return
+            
+        self.log_to_console_for_switch(
+            switch_num, f"\n--- Raising console speed from {transport.baudrate} to {target_baudrate} baud ---\n")
+        
+        # The negotiation runs on the transport loop and reports back when done
+        future = self.transport_loop.submit(negotiate_console_speed(transport, target_baudrate))
+        
+        def on_done(done):
+            try:
+                success, message = done.result()
+            except Exception as e:
+                success, message = False, f"console speed change failed: {e}"
+                
+            if success:
+                self.program_logger.info(f"Switch {switch_num} console speed raised to {target_baudrate} baud")
+                message += ". Save the configuration to keep this speed for the next session"
             else:
-                ssh_shell = switch_data['ssh_shell']
-                ssh_shell.send("show version\n")
+                self.program_logger.error(f"Console speed negotiation failed for switch {switch_num}: {message}")
                 
-        except Exception as e:
-            self.log_to_console_for_switch(switch_num, f"\n--- Connection test failed: {e} ---\n")
-            
+            self.root.after(0, lambda: self.log_to_console_for_switch(
+                switch_num, f"\n--- {message[0].upper() + message[1:]} ---\n"))
+                
+        future.add_done_callback(on_done)
+
     def show_cat_gif(self):
         """Show a cat GIF animation when all commands complete"""
         try:
@@ -950,10 +1457,14 @@ class CiscoSwitchConfigurator:
             gif_window.geometry("400x350")
             gif_window.transient(self.root)
             
-            # Try to load the GIF with PIL
+            # Frames are decoded once and then reused from the asset cache
             try:
-                from PIL import Image, ImageTk
+                frames = get_asset_cache().frames(self.cat_gif_path)
+            except Exception as e:
+                frames = []
+                self.program_logger.error(f"Error loading animation: {e}")
                 
+            if frames:
                 # Create frames to hold the image and message
                 img_frame = ttk.Frame(gif_window)
                 img_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -968,26 +1479,12 @@ class CiscoSwitchConfigurator:
                 gif_label.pack(pady=10)
                 
                 # Function to animate the GIF
-                frames = []
-                
                 def animate_gif(index=0):
-                    try:
-                        if not frames:  # Load all frames first time
-                            gif = Image.open(self.cat_gif_path)
-                            for i in range(100):  # Limit to 100 frames max
-                                try:
-                                    gif.seek(i)
-                                    frames.append(ImageTk.PhotoImage(gif.copy()))
-                                except EOFError:
-                                    break
-                                    
-                        if frames:
-                            frame_index = index % len(frames)
-                            gif_label.configure(image=frames[frame_index])
-                            gif_window.after(100, animate_gif, frame_index + 1)
-                            
-                    except Exception as e:
-                        ttk.Label(img_frame, text=f"Error loading animation: {e}").pack()
+                    if not gif_label.winfo_exists():
+                        return
+                    frame_index = index % len(frames)
+                    gif_label.configure(image=frames[frame_index])
+                    gif_window.after(100, animate_gif, frame_index + 1)
                 
                 # Start animation
                 animate_gif()
@@ -995,8 +1492,8 @@ class CiscoSwitchConfigurator:
                 # Add a close button
                 ttk.Button(gif_window, text="Close", command=gif_window.destroy).pack(pady=10)
                 
-            except ImportError:
-                # If PIL is not available
+            else:
+                # If the animation can't be decoded (Pillow is needed the first time)
                 ttk.Label(gif_window, text="All commands have been executed successfully!", 
                          font=("Arial", 14, "bold")).pack(pady=20)
                 ttk.Label(gif_window, text="(PIL/Pillow library is required to display the cat animation)").pack()
@@ -1049,8 +1546,8 @@ class CiscoSwitchConfigurator:
         ttk.Button(button_frame, text="Connect", command=self.connect).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Disconnect", command=self.disconnect).pack(side=tk.LEFT, padx=5)
         
-        # Initialize
-        self.refresh_com_ports()
+        # Initialize once the window is up, enumerating ports can be slow
+        self.root.after_idle(self.refresh_com_ports)
         self.toggle_connection_fields()
         
     def toggle_connection_fields(self):
@@ -1064,6 +1561,8 @@ class CiscoSwitchConfigurator:
             
     def refresh_com_ports(self):
         """Refresh the available COM ports"""
+        # pyserial is only loaded once ports are needed
+        from serial.tools import list_ports
         ports = [port.device for port in list_ports.comports()]
         self.com_port_combo['values'] = ports
         if ports and not self.com_port.get():
@@ -1078,109 +1577,61 @@ class CiscoSwitchConfigurator:
                 return
                 
             if self.connection_type.get() == "COM":
-                connection = serial.Serial(
-                    port=self.com_port.get(),
-                    baudrate=self.baudrate.get(),
-                    timeout=1
-                )
-                connection_info = f"Connected to {switch_name} via {self.com_port.get()} at {self.baudrate.get()} baud"
-                
-                # Create the first switch tab if it doesn't exist
-                if 1 not in self.switch_tabs:
-                    # Create console tab
-                    console_frame = ttk.Frame(self.notebook)
-                    self.notebook.add(console_frame, text=f"Console - {switch_name}")
-                    
-                    # Store the first switch tab information
-                    self.switch_tabs[1] = {
-                        'frame': console_frame,
-                        'connection': connection,
-                        'connection_type': self.connection_type,
-                        'console_output': None,
-                        'console_input': None,
-                        'ssh_shell': None,
-                        'queued_commands': [],
-                        'manual_mode': self.manual_mode,
-                        'auto_execute': self.auto_execute,
-                        'command_delay': self.command_delay,
-                        'name': switch_name,
-                        'password_var': tk.StringVar()
-                    }
-                    
-                    # Setup Console Tab for the first switch
-                    self.setup_console_tab(1)
-                else:
-                    # Update existing switch tab
-                    self.switch_tabs[1]['connection'] = connection
-                    self.switch_tabs[1]['name'] = switch_name
-                    self.notebook.tab(self.switch_tabs[1]['frame'], text=f"Console - {switch_name}")
-                
-                # Store the main connection (ensure synchronized state)
-                self.connection = connection
-                
-                # Log connection info
-                self.log_to_console(f"{connection_info}\n")
-                
-                # Update connection status
-                self.update_connection_status(True, f"COM: {self.com_port.get()} @ {self.baudrate.get()} baud")
-                
-                # Start a thread to read from the serial port
-                threading.Thread(target=self.read_from_serial, daemon=True).start()
+                transport = SerialTransport(self.com_port.get(), self.baudrate.get())
+                connection_details = f"COM: {self.com_port.get()} @ {self.baudrate.get()} baud"
             else:
-                # SSH connection
-                client = paramiko.SSHClient()
-                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                client.connect(
-                    hostname=self.ssh_host.get(),
-                    username=self.ssh_username.get(),
-                    password=self.ssh_password.get()
-                )
-                ssh_shell = client.invoke_shell()
-                connection_info = f"Connected to {switch_name} via SSH ({self.ssh_host.get()})"
-                
-                # Create the first switch tab if it doesn't exist
-                if 1 not in self.switch_tabs:
-                    # Create console tab
-                    console_frame = ttk.Frame(self.notebook)
-                    self.notebook.add(console_frame, text=f"Console - {switch_name}")
-                    
-                    # Store the first switch tab information
-                    self.switch_tabs[1] = {
-                        'frame': console_frame,
-                        'connection': client,
-                        'connection_type': self.connection_type,
-                        'console_output': None,
-                        'console_input': None,
-                        'ssh_shell': ssh_shell,
-                        'queued_commands': [],
-                        'manual_mode': self.manual_mode,
-                        'auto_execute': self.auto_execute,
-                        'command_delay': self.command_delay,
-                        'name': switch_name,
-                        'password_var': tk.StringVar()
-                    }
-                    
-                    # Setup Console Tab for the first switch
-                    self.setup_console_tab(1)
-                else:
-                    # Update existing switch tab
-                    self.switch_tabs[1]['connection'] = client
-                    self.switch_tabs[1]['ssh_shell'] = ssh_shell
-                    self.switch_tabs[1]['name'] = switch_name
-                    self.notebook.tab(self.switch_tabs[1]['frame'], text=f"Console - {switch_name}")
-                
-                # Store the main connection (ensure synchronized state)
-                self.connection = client
-                self.ssh_shell = ssh_shell
+                transport = SSHTransport(self.ssh_host.get(), self.ssh_username.get(), self.ssh_password.get())
+                connection_details = f"SSH: {self.ssh_username.get()}@{self.ssh_host.get()}"
+            connection_info = f"Connected to {switch_name} via {transport.description}"
+            
+            # Wait for the connection to open and start reading from it
+            self.open_transport(transport)
+            
+            # Create the first switch tab if it doesn't exist
+            if 1 not in self.switch_tabs:
+                # Create console tab
+                console_frame = ttk.Frame(self.notebook)
+                self.notebook.add(console_frame, text=f"Console - {switch_name}")
                 
-                # Log connection info
-                self.log_to_console(f"{connection_info}\n")
+                # Store the first switch tab information
+                self.switch_tabs[1] = {
+                    'frame': console_frame,
+                    'connection': transport,
+                    'connection_type': self.connection_type,
+                    'console_output': None,
+                    'console_input': None,
+                    'queued_commands': [],
+                    'manual_mode': self.manual_mode,
+                    'auto_execute': self.auto_execute,
+                    'command_delay': self.command_delay,
+                    'name': switch_name,
+                    'password_var': tk.StringVar()
+                }
                 
-                # Update connection status
-                self.update_connection_status(True, f"SSH: {self.ssh_username.get()}@{self.ssh_host.get()}")
+                # Setup Console Tab for the first switch
+                self.setup_console_tab(1)
+            else:
+                # Close the previous connection and update the existing switch tab
+                if self.switch_tabs[1]['connection']:
+                    self.close_transport(self.switch_tabs[1]['connection'])
+                self.switch_tabs[1]['name'] = switch_name
+                self.notebook.tab(self.switch_tabs[1]['frame'], text=f"Console - {switch_name}")
                 
-                # Start a thread to read from SSH
-                threading.Thread(target=self.read_from_ssh, daemon=True).start()
+            # Route the output to the first switch console
+            self.attach_transport_to_switch(1, transport)
+            
+            # Store the main connection (ensure synchronized state)
+            self.connection = transport
+            
+            # Remember the switch for next time, also for reconnecting and saving the workspace
+            self.switch_tabs[1]['connection_details'] = self.connection_details_for(transport)
+            self.remember_switch(switch_name, transport)
+            
+            # Log connection info
+            self.log_to_console(f"{connection_info}\n")
+            
+            # Update connection status
+            self.update_connection_status(True, connection_details)
                 
             # Switch to console tab after connecting
             if 1 in self.switch_tabs:
@@ -1188,6 +1639,9 @@ class CiscoSwitchConfigurator:
                 
             # Update the switch selector
             self.update_switch_selector()
+            
+            # Offer to finish a run that was interrupted on this switch
+            self.root.after_idle(lambda: self.offer_journal_resume(1))
                 
         except Exception as e:
             messagebox.showerror("Connection Error", str(e))
@@ -1237,16 +1691,11 @@ class CiscoSwitchConfigurator:
         """Disconnect from the switch"""
         if self.connection:
             try:
-                if self.connection_type.get() == "COM":
-                    self.connection.close()
-                else:
-                    self.connection.close()
+                self.close_transport(self.connection)
                     
                 # Also update the switch_tabs connection
                 if 1 in self.switch_tabs:
                     self.switch_tabs[1]['connection'] = None
-                    if self.connection_type.get() == "SSH":
-                        self.switch_tabs[1]['ssh_shell'] = None
                 
                 self.connection = None
                 self.log_to_console("Disconnected from switch\n")
@@ -1260,38 +1709,6 @@ class CiscoSwitchConfigurator:
             except Exception as e:
                 messagebox.showerror("Disconnection Error", str(e))
                 
-    def read_from_serial(self):
-        """Read data from the serial port"""
-        while self.connection and self.connection.is_open:
-            try:
-                # Wait a bit for data to arrive (especially after sending command)
-                time.sleep(0.2)
-                
-                if self.connection.in_waiting:
-                    data = self.connection.read(self.connection.in_waiting).decode('utf-8', errors='replace')
-                    if data:
-                        self.log_to_console(data, from_device=True)
-            except Exception as e:
-                self.log_to_console(f"Error reading from serial: {e}\n")
-                break
-            time.sleep(0.1)
-            
-    def read_from_ssh(self):
-        """Read data from the SSH connection"""
-        while self.connection:
-            try:
-                # Wait a bit for data to arrive (especially after sending command)
-                time.sleep(0.2)
-                
-                if self.ssh_shell.recv_ready():
-                    data = self.ssh_shell.recv(4096).decode('utf-8', errors='replace')
-                    if data:
-                        self.log_to_console(data, from_device=True)
-            except Exception as e:
-                self.log_to_console(f"Error reading from SSH: {e}\n")
-                break
-            time.sleep(0.1)
-            
     def update_connection_status(self, is_connected, connection_details=None):
         """Update the connection status displayed in the Preview tab"""
         if hasattr(self, 'connection_status_label'):
@@ -1322,6 +1739,21 @@ class CiscoSwitchConfigurator:
         config_paned.add(left_frame, weight=1)
         config_paned.add(right_frame, weight=3)
         
+        # Search box, results update as you type
+        ttk.Label(left_frame, text="Search").pack(pady=(0, 5))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(left_frame, textvariable=self.search_var)
+        search_entry.pack(fill=tk.X)
+        search_entry.bind('<KeyRelease>', self.on_search_changed)
+        search_entry.bind('<Return>', lambda e: self.open_search_result(0))
+        search_entry.bind('<Down>', lambda e: self.search_results_listbox.focus_set())
+        
+        self.search_results_listbox = tk.Listbox(left_frame, height=6)
+        self.search_results_listbox.pack(fill=tk.X, pady=(2, 10))
+        self.search_results_listbox.bind('<Double-Button-1>', lambda e: self.open_search_result())
+        self.search_results_listbox.bind('<Return>', lambda e: self.open_search_result())
+        self.search_results = []
+        
         # Category listbox
         ttk.Label(left_frame, text="Configuration Categories").pack(pady=(0, 5))
         self.category_listbox = tk.Listbox(left_frame)
@@ -1386,6 +1818,29 @@ class CiscoSwitchConfigurator:
                   command=self.export_preview).pack(side=tk.LEFT, padx=10, pady=5)
         ttk.Button(import_export_frame, text="Import Preview", 
                   command=self.import_preview).pack(side=tk.LEFT, padx=10, pady=5)
+        ttk.Button(import_export_frame, text="Bulk Generate from CSV", 
+                  command=self.bulk_generate_from_csv).pack(side=tk.LEFT, padx=10, pady=5)
+        
+        # File transfer push section
+        transfer_frame = ttk.LabelFrame(preview_container, text="File Transfer Push")
+        transfer_frame.pack(fill=tk.X, pady=5)
+        
+        self.transfer_protocol = tk.StringVar(value="HTTP")
+        self.transfer_address = tk.StringVar()
+        self.transfer_port = tk.StringVar()
+        self.transfer_mode = tk.StringVar(value="copy")
+        
+        ttk.Label(transfer_frame, text="Protocol:").pack(side=tk.LEFT, padx=(10, 5), pady=5)
+        ttk.Combobox(transfer_frame, textvariable=self.transfer_protocol, values=["HTTP", "TFTP"],
+                     width=6, state="readonly").pack(side=tk.LEFT, padx=5)
+        ttk.Label(transfer_frame, text="Server IP:").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(transfer_frame, textvariable=self.transfer_address, width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Label(transfer_frame, text="Port:").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(transfer_frame, textvariable=self.transfer_port, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(transfer_frame, text="Merge", variable=self.transfer_mode, value="copy").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(transfer_frame, text="Replace", variable=self.transfer_mode, value="replace").pack(side=tk.LEFT, padx=5)
+        ttk.Button(transfer_frame, text="Push via File Transfer",
+                  command=self.push_preview_via_file_transfer).pack(side=tk.RIGHT, padx=10, pady=5)
         
         # Custom command entry section
         custom_cmd_frame = ttk.LabelFrame(preview_container, text="Add Custom Command")
@@ -1433,9 +1888,22 @@ class CiscoSwitchConfigurator:
         # Buttons
         ttk.Button(top_frame, text="Execute Selected", 
                   command=self.execute_selected_preview_items).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(top_frame, text="Schedule Selected", 
+                  command=self.schedule_selected_preview_items).pack(side=tk.RIGHT, padx=5)
         ttk.Button(top_frame, text="Clear All", 
                   command=self.clear_preview_items).pack(side=tk.RIGHT, padx=5)
         
+        # What auto-execution and scheduled runs do when the switch rejects a command
+        self.error_policy = tk.StringVar(value=HALT)
+        ttk.Combobox(top_frame, textvariable=self.error_policy, values=POLICIES,
+                     state="readonly", width=6).pack(side=tk.RIGHT, padx=(0, 10))
+        ttk.Label(top_frame, text="On error:").pack(side=tk.RIGHT)
+        
+        # Save the running-config before a run so it can be reverted
+        self.take_rollback_point = tk.BooleanVar(value=True)
+        ttk.Checkbutton(top_frame, text="Rollback point",
+                        variable=self.take_rollback_point).pack(side=tk.RIGHT, padx=(0, 10))
+        
         # Create a canvas with scrollbar for preview items
         canvas_frame = ttk.Frame(preview_container)
         canvas_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -1657,20 +2125,13 @@ class CiscoSwitchConfigurator:
         
         label_text = f"{category_name} > {item['name']}"
         if inputs:
-            # Format command with inputs
-            if isinstance(item['command'], list):
-                commands = []
-                for cmd in item['command']:
-                    try:
-                        commands.append(cmd.format(**inputs))
-                    except KeyError:
-                        commands.append(cmd)  # Keep original if format fails
-                command_text = "\n".join(commands)
-            else:
-                try:
-                    command_text = item['command'].format(**inputs)
-                except KeyError:
-                    command_text = item['command']  # Keep original if format fails
+            # Format command with inputs, expanding any ranges or lists
+            commands = item['command'] if isinstance(item['command'], list) else [item['command']]
+            try:
+                batch_inputs = find_batch_inputs(item.get('inputs', []), inputs, commands)
+                command_text = "\n".join(render_commands(commands, inputs, batch_inputs))
+            except KeyError:
+                command_text = "\n".join(commands)  # Keep original if format fails
             
             # Add input information to label
             input_text = ", ".join([f"{k}={v}" for k, v in inputs.items()])
@@ -1772,7 +2233,9 @@ class CiscoSwitchConfigurator:
         self.preview_items = []
         self.preview_vars = {}
         
-        # Show empty label
+        # Show empty label, replacing the one an already empty preview shows
+        if hasattr(self, 'empty_preview_label') and self.empty_preview_label.winfo_exists():
+            self.empty_preview_label.destroy()
         self.empty_preview_label = ttk.Label(self.preview_scrollable_frame, 
                                           text="No configurations added to preview.\nAdd configurations from the Configuration tab.")
         self.empty_preview_label.pack(pady=20)
@@ -1792,16 +2255,7 @@ class CiscoSwitchConfigurator:
             # Log the command to console
             self.log_to_console_for_switch(switch_num, f"\n> {command}\n")
             
-            # Format the command properly
-            formatted_command = command.strip() + "\r\n"
-            
-            if switch_data['connection_type'].get() == "COM":
-                # Send command via serial
-                switch_data['connection'].write(formatted_command.encode())
-                switch_data['connection'].flush()
-            else:
-                # Send command via SSH
-                switch_data['ssh_shell'].send(formatted_command)
+            self.write_to_switch(switch_num, command.strip())
                 
         except Exception as e:
             messagebox.showerror("Command Error", f"Error sending command: {e}")
@@ -1812,100 +2266,325 @@ class CiscoSwitchConfigurator:
         for category in CONFIG_DATA.keys():
             self.category_listbox.insert(tk.END, category)
             
+    def on_search_changed(self, event=None):
+        """Show the catalog items matching the search box"""
+        self.search_results = self.catalog_index.search(self.search_var.get())
+        
+        self.search_results_listbox.delete(0, tk.END)
+        for category, position, item in self.search_results:
+            self.search_results_listbox.insert(tk.END, f"{item['name']} ({category})")
+            
+    def open_search_result(self, index=None):
+        """Jump to a search result's input form"""
+        if index is None:
+            selection = self.search_results_listbox.curselection()
+            if not selection:
+                return
+            index = selection[0]
+            
+        if index >= len(self.search_results):
+            return
+            
+        category, position, item = self.search_results[index]
+        
+        # Select the category so the pane is shown
+        category_index = list(CONFIG_DATA.keys()).index(category)
+        self.category_listbox.selection_clear(0, tk.END)
+        self.category_listbox.selection_set(category_index)
+        self.category_listbox.see(category_index)
+        self.on_category_select(None)
+        
+        # Scroll the item into view and focus its first input
+        pane = self.category_panes[category]
+        frame = pane['item_frames'][position]
+        canvas = pane['canvas']
+        canvas.update_idletasks()
+        
+        scroll_height = canvas.bbox("all")[3] or 1
+        canvas.yview_moveto(frame.winfo_y() / scroll_height)
+        
+        entries = [widget for widget in self.iter_widgets(frame) if isinstance(widget, ttk.Entry)]
+        if entries:
+            entries[0].focus_set()
+            
+    def iter_widgets(self, widget):
+        """Yield every descendant of a widget"""
+        for child in widget.winfo_children():
+            yield child
+            yield from self.iter_widgets(child)
+            
     def on_category_select(self, event):
         """Handle category selection"""
         selection = self.category_listbox.curselection()
         if not selection:
             return
             
-        # Clear the current detail frame
-        for widget in self.config_detail_frame.winfo_children():
-            widget.destroy()
-            
         # Get selected category
         category = self.category_listbox.get(selection[0])
-        
-        # Display config items for the selected category
-        if category in CONFIG_DATA:
-            # Create a canvas with scrollbar for many config items
-            canvas = tk.Canvas(self.config_detail_frame)
-            scrollbar = ttk.Scrollbar(self.config_detail_frame, orient="vertical", command=canvas.yview)
-            scrollable_frame = ttk.Frame(canvas)
+        if category not in CONFIG_DATA or category == self.current_category:
+            return
             
-            scrollable_frame.bind(
-                "<Configure>",
-                lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-            )
+        # Hide the current pane instead of destroying it
+        if self.current_category in self.category_panes:
+            self.category_panes[self.current_category]['frame'].pack_forget()
             
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
+        if category not in self.category_panes:
+            self.category_panes[category] = self.build_category_pane(category)
             
-            canvas.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
+        self.category_panes[category]['frame'].pack(fill=tk.BOTH, expand=True)
+        self.current_category = category
+        
+    def build_category_pane(self, category):
+        """Build the scrollable detail pane with the config items of a category"""
+        pane = ttk.Frame(self.config_detail_frame)
+        
+        # Values loaded from a workspace before this pane existed
+        pending_values = self.pending_inputs.pop(category, {})
+        
+        # Create a canvas with scrollbar for many config items
+        canvas = tk.Canvas(pane)
+        scrollbar = ttk.Scrollbar(pane, orient="vertical", command=canvas.yview)
+        scrollable_frame = ttk.Frame(canvas)
+        
+        scrollable_frame.bind(
+            "<Configure>",
+            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+        )
+        
+        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        
+        item_frames = []
+        for i, item in enumerate(CONFIG_DATA[category]):
+            frame = ttk.LabelFrame(scrollable_frame, text=item["name"])
+            frame.pack(fill=tk.X, expand=True, padx=5, pady=5)
             
-            for i, item in enumerate(CONFIG_DATA[category]):
-                frame = ttk.LabelFrame(scrollable_frame, text=item["name"])
-                frame.pack(fill=tk.X, expand=True, padx=5, pady=5)
-                
-                ttk.Label(frame, text=item["description"], wraplength=500).pack(padx=5, pady=5)
+            ttk.Label(frame, text=item["description"], wraplength=500).pack(padx=5, pady=5)
+            
+            # Show the command(s) that will be executed
+            command_frame = ttk.LabelFrame(frame, text="Command(s)")
+            command_frame.pack(fill=tk.X, padx=5, pady=5)
+            
+            if isinstance(item["command"], list):
+                command_text = "\n".join(item["command"])
+            else:
+                command_text = item["command"]
                 
-                # Show the command(s) that will be executed
-                command_frame = ttk.LabelFrame(frame, text="Command(s)")
-                command_frame.pack(fill=tk.X, padx=5, pady=5)
+            ttk.Label(command_frame, text=command_text, wraplength=500, justify=tk.LEFT).pack(padx=5, pady=5, anchor=tk.W)
+            
+            # Create input fields for this config item
+            if item.get("inputs"):
+                inputs_frame = ttk.LabelFrame(frame, text="Inputs")
+                inputs_frame.pack(fill=tk.X, padx=5, pady=5)
                 
-                if isinstance(item["command"], list):
-                    command_text = "\n".join(item["command"])
-                else:
-                    command_text = item["command"]
+                item_vars = {}
+                for input_field in item.get("inputs", []):
+                    input_frame = ttk.Frame(inputs_frame)
+                    input_frame.pack(fill=tk.X, padx=5, pady=2)
                     
-                ttk.Label(command_frame, text=command_text, wraplength=500, justify=tk.LEFT).pack(padx=5, pady=5, anchor=tk.W)
-                
-                # Create input fields for this config item
-                if item.get("inputs"):
-                    inputs_frame = ttk.LabelFrame(frame, text="Inputs")
-                    inputs_frame.pack(fill=tk.X, padx=5, pady=5)
+                    ttk.Label(input_frame, text=f"{input_field['description']}:").pack(side=tk.LEFT, padx=5)
                     
-                    item_vars = {}
-                    for input_field in item.get("inputs", []):
-                        input_frame = ttk.Frame(inputs_frame)
-                        input_frame.pack(fill=tk.X, padx=5, pady=2)
-                        
-                        ttk.Label(input_frame, text=f"{input_field['description']}:").pack(side=tk.LEFT, padx=5)
+                    initial_value = pending_values.get(item["name"], {}).get(input_field['name'], "")
+                    if input_field['type'] == 'int':
+                        var = tk.StringVar(value=initial_value)  # Use StringVar for validation
+                    else:
+                        var = tk.StringVar(value=initial_value)
                         
-                        if input_field['type'] == 'int':
-                            var = tk.StringVar()  # Use StringVar for validation
-                        else:
-                            var = tk.StringVar()
-                            
-                        ttk.Entry(input_frame, textvariable=var).pack(side=tk.RIGHT, expand=True, fill=tk.X, padx=5)
-                        item_vars[input_field['name']] = var
-                
-                    # Store the variables with the frame for later access
-                    frame.item = item
-                    frame.vars = item_vars
-                else:
-                    # No inputs needed
-                    frame.item = item
-                    frame.vars = {}
-                
-                # Add buttons for this item
-                button_frame = ttk.Frame(frame)
-                button_frame.pack(fill=tk.X, padx=5, pady=5)
-                
-                ttk.Button(button_frame, text="Add to Preview",
-                          command=lambda f=frame: self.add_config_to_preview(f.item, f.vars)).pack(side=tk.RIGHT, padx=5)
-                ttk.Button(button_frame, text="Run", 
-                          command=lambda f=frame: self.run_config_item(f.item, f.vars)).pack(side=tk.RIGHT, padx=5)
+                    ttk.Entry(input_frame, textvariable=var).pack(side=tk.RIGHT, expand=True, fill=tk.X, padx=5)
+                    item_vars[input_field['name']] = var
+            
+                # Store the variables with the frame for later access
+                frame.item = item
+                frame.vars = item_vars
+            else:
+                # No inputs needed
+                frame.item = item
+                frame.vars = {}
+            
+            # Add buttons for this item
+            button_frame = ttk.Frame(frame)
+            button_frame.pack(fill=tk.X, padx=5, pady=5)
+            
+            ttk.Button(button_frame, text="Add to Preview",
+                      command=lambda f=frame: self.add_config_to_preview(f.item, f.vars)).pack(side=tk.RIGHT, padx=5)
+            ttk.Button(button_frame, text="Run", 
+                      command=lambda f=frame: self.run_config_item(f.item, f.vars)).pack(side=tk.RIGHT, padx=5)
+            
+            item_frames.append(frame)
+            
+        return {'frame': pane, 'canvas': canvas, 'item_frames': item_frames}
         
     def save_configuration(self):
-        """Save the current configuration values to a file"""
-        # This is a stub - you need to implement this from the original code
-        pass
+        """Save the input values, preview plan and switch tabs as a workspace snapshot"""
+        os.makedirs("saved_configurations", exist_ok=True)
+        
+        filename = filedialog.asksaveasfilename(
+            initialdir="saved_configurations",
+            title="Save Configuration",
+            filetypes=(("JSON files", "*.json"), ("All files", "*.*")),
+            defaultextension=".json"
+        )
+        
+        if not filename:
+            return  # User canceled
+            
+        try:
+            write_workspace(filename, self.collect_workspace_inputs(), self.collect_workspace_preview(),
+                            self.collect_workspace_switches())
+            self.show_notification("Configuration saved to " + os.path.basename(filename))
+            self.program_logger.info("Saved workspace to " + filename)
+        except Exception as e:
+            messagebox.showerror("Save Error", "Error saving configuration: " + str(e))
+            self.program_logger.error("Error saving workspace: " + str(e))
+            
+    def collect_workspace_inputs(self):
+        """Return the non-empty input values of every category, built or not"""
+        inputs = {category: dict(values) for category, values in self.pending_inputs.items()}
+        
+        for category, pane in self.category_panes.items():
+            for frame in pane['item_frames']:
+                values = {name: var.get() for name, var in frame.vars.items() if var.get()}
+                if values:
+                    inputs.setdefault(category, {})[frame.item['name']] = values
+                    
+        return inputs
+        
+    def collect_workspace_preview(self):
+        """Return the preview plan in workspace form"""
+        references = catalog_references(CONFIG_DATA)
+        return [{
+            'ref': item_reference(preview_item['item'], references),
+            'inputs': preview_item['inputs'],
+            'selected': self.preview_vars[preview_item['id']].get(),
+            'executed': preview_item.get('executed', False)
+        } for preview_item in self.preview_items]
+        
+    def collect_workspace_switches(self):
+        """Return the open switch tabs with their connection settings (no passwords)"""
+        switches = []
+        for switch_num, switch_data in sorted(self.switch_tabs.items()):
+            # Replays aren't switches
+            if isinstance(switch_data['connection'], ReplayTransport):
+                continue
+            if switch_data['connection']:
+                details = self.connection_details_for(switch_data['connection'])
+            else:
+                details = switch_data.get('connection_details')
+            switches.append({'num': switch_num, 'name': switch_data['name'], 'connection': details})
+        return switches
         
     def load_configuration(self):
-        """Load configuration values from a file"""
-        # This is a stub - you need to implement this from the original code
-        pass
+        """Restore a workspace snapshot saved with Save Configuration"""
+        filename = filedialog.askopenfilename(
+            initialdir="saved_configurations",
+            title="Load Configuration",
+            filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
+        )
+        
+        if not filename:
+            return  # User canceled
+            
+        try:
+            snapshot = read_workspace(filename)
+        except (OSError, WorkspaceError) as e:
+            messagebox.showerror("Load Error", "Error loading configuration: " + str(e))
+            self.program_logger.error("Error loading workspace: " + str(e))
+            return
+            
+        self.workspace_generation += 1
+        self.apply_workspace_inputs(snapshot['inputs'])
+        self.restore_workspace_switches(snapshot['switches'])
+        self.restore_workspace_preview(snapshot['preview'])
+        
+        self.show_notification("Configuration loaded from " + os.path.basename(filename))
+        self.program_logger.info("Loaded workspace from " + filename)
+        
+    def apply_workspace_inputs(self, inputs):
+        """Replace the input values, only touching the widgets of panes already built"""
+        # Categories not visited yet pick their values up when first shown
+        self.pending_inputs = {category: values for category, values in inputs.items()
+                               if category not in self.category_panes}
+        
+        for category, pane in self.category_panes.items():
+            category_values = inputs.get(category, {})
+            for frame in pane['item_frames']:
+                item_values = category_values.get(frame.item['name'], {})
+                for name, var in frame.vars.items():
+                    var.set(item_values.get(name, ""))
+                    
+    def restore_workspace_preview(self, entries, chunk_size=50):
+        """Rebuild the preview plan a chunk at a time so the window stays responsive"""
+        self.clear_preview_items()
+        
+        lookup = catalog_lookup(CONFIG_DATA)
+        generation = self.workspace_generation
+        
+        def add_chunk(start=0):
+            # Stop if another workspace was loaded meanwhile
+            if generation != self.workspace_generation:
+                return
+                
+            for entry in entries[start:start + chunk_size]:
+                item = resolve_item(entry['ref'], lookup)
+                if item is None:
+                    self.program_logger.warning(f"Workspace item no longer in the catalog: {entry['ref']}")
+                    continue
+                    
+                item_id = self.add_to_preview(item, entry['inputs'])
+                if item_id in self.preview_vars:
+                    self.preview_vars[item_id].set(entry.get('selected', True))
+                if entry.get('executed', False):
+                    self.mark_item_executed(item_id)
+                    
+            if start + chunk_size < len(entries):
+                self.root.after(1, add_chunk, start + chunk_size)
+                
+        add_chunk()
+        
+    def restore_workspace_switches(self, switches):
+        """Recreate the switch tabs of a workspace, unconnected and ready to reconnect"""
+        open_names = {switch_data['name'] for switch_data in self.switch_tabs.values()}
+        
+        for entry in switches:
+            details = entry.get('connection') or {}
+            
+            # The first switch is connected from the Connection tab, so fill that in
+            if entry['num'] == 1:
+                if not self.connection and details:
+                    self.connection_type.set(details.get('connection_type', "COM"))
+                    self.com_port.set(details.get('com_port', ""))
+                    self.baudrate.set(details.get('baudrate', 9600))
+                    self.ssh_host.set(details.get('host', ""))
+                    self.ssh_username.set(details.get('username', ""))
+                    self.toggle_connection_fields()
+                continue
+                
+            if entry['name'] in open_names:
+                continue
+                
+            switch_num = self.add_switch_tab()
+            switch_data = self.switch_tabs[switch_num]
+            switch_data['name'] = entry['name']
+            switch_data['connection_details'] = details
+            self.notebook.tab(switch_data['frame'], text=f"Console - {entry['name']}")
+            self.log_to_console_for_switch(switch_num, "Restored from saved configuration. Click Connect to reconnect.\n")
+            
+        self.update_switch_selector()
+        
+    def reconnect_switch(self, switch_num):
+        """Open the connection dialog for a tab, filled in with its last settings"""
+        switch_data = self.switch_tabs[switch_num]
+        if switch_data['connection']:
+            messagebox.showinfo("Connect", f"{switch_data['name']} is already connected")
+            return
+            
+        defaults = switch_data.get('connection_details')
+        if not defaults and self.inventory:
+            defaults = self.inventory.get(switch_data['name'])
+        self.show_connection_dialog(switch_num, dict(defaults or {}, name=switch_data['name']))
         
     def execute_selected_preview_items(self):
         """Execute all selected preview items"""
@@ -1925,51 +2604,111 @@ class CiscoSwitchConfigurator:
         # Switch to console tab for the selected switch
         self.notebook.select(switch_data['frame'])
         
-        # Clear the existing command queue
-        switch_data['queued_commands'] = []
-        
-        # Keep track of selected items for marking as executed
-        switch_data['executed_preview_items'] = []
-        
         # Get the selected items
-        selected_items = []
-        for preview_item in self.preview_items:
-            # Use preview_vars to check if item is selected
-            if self.preview_vars[preview_item['id']].get():
-                selected_items.append(preview_item)
-                switch_data['executed_preview_items'].append(preview_item['id'])
-                
-        # If no items selected, just execute all
-        if not selected_items:
-            selected_items = self.preview_items
-            for item in selected_items:
-                switch_data['executed_preview_items'].append(item['id'])
+        selected_items = self.get_selected_preview_items()
                 
         if not selected_items:
             messagebox.showinfo("No Commands", "No commands in preview. Add some commands first.")
             return
             
-        # Build a flat list of all commands to execute
-        for preview_item in selected_items:
-            item = preview_item['item']
-            inputs = preview_item['inputs'] or {}
+        # Keep track of selected items for marking as executed
+        switch_data['executed_preview_items'] = [item['id'] for item in selected_items]
+        
+        # Build a flat list of all commands to execute, without the round trips
+        # out of and back into config mode between items
+        sources = []
+        queued_commands = self.build_preview_commands(selected_items, switch_num, sources)
+        switch_data['queued_commands'] = plan_mode_transitions(queued_commands)
+        
+        # Remember which item and line each command came from, for error reports
+        switch_data['run_sources'] = align_sources(queued_commands, sources, switch_data['queued_commands'])
+        switch_data['error_policy'] = self.error_policy.get()
+        
+        saved = len(queued_commands) - len(switch_data['queued_commands'])
+        if saved:
+            self.log_to_console_for_switch(switch_num, f"Skipping {saved} redundant config mode changes between items.\n")
+        
+        def start_run():
+            # Checkpoint the run so it can be resumed if it gets interrupted
+            self.start_journal(switch_num, list(enumerate(switch_data['queued_commands'])))
+            self.start_queued_commands(switch_num)
             
-            commands = item["command"]
-            if not isinstance(commands, list):
-                commands = [commands]
+        switch_data['rollback_point'] = None
+        if self.take_rollback_point.get():
+            item_names = list(dict.fromkeys(source[0] for source in sources))
+            self.save_rollback_point_for_switch(switch_num, item_names, switch_data['queued_commands'], start_run)
+        else:
+            start_run()
+        
+    def save_rollback_point_for_switch(self, switch_num, item_names, commands, callback):
+        """Save the running-config of a switch as a rollback point, then call callback
+        
+        If the config can't be read the user decides whether to run without one.
+        """
+        switch_data = self.switch_tabs[switch_num]
+        transport = switch_data['connection']
+        self.log_to_console_for_switch(switch_num, "Reading the running-config for the rollback point...\n")
+        future = self.transport_loop.submit(capture_running_config(transport, archive=True))
+        
+        def on_captured(error, result):
+            if switch_num not in self.switch_tabs or switch_data['connection'] is not transport:
+                return
+                
+            if error:
+                self.program_logger.error(f"Could not read the running-config of switch {switch_num}: {str(error)}")
+                if not messagebox.askyesno("Rollback Point", f"Could not read the running-config: {error}\n\n"
+                                                             "Run the plan without a rollback point?"):
+                    return
+            else:
+                config, archive = result
+                point = new_rollback_point(switch_data['name'], config, archive,
+                                           self.connection_details_for(transport), item_names, commands)
+                path = rollback_path(switch_data['name'])
+                try:
+                    write_rollback_point(path, point)
+                    switch_data['rollback_point'] = path
+                    archived = f", archived as {archive}" if archive else ""
+                    self.log_to_console_for_switch(switch_num, f"\nRollback point saved{archived}.\n")
+                except OSError as e:
+                    self.program_logger.error(f"Could not save rollback point for switch {switch_num}: {str(e)}")
+                    
+            callback()
             
-            # Process the commands to add configuration mode if needed
-            commands = self.prepare_commands_with_config_mode(commands)
+        future.add_done_callback(lambda done: self.root.after(
+            0, lambda: on_captured(done.exception(), None if done.exception() else done.result())))
+        
+    def complete_rollback_point_for_switch(self, switch_num):
+        """Read the running-config after a run and add the inverse plan to its rollback point
+        
+        The point stays open, so a halted run that is continued later gets
+        completed again when it ends.
+        """
+        switch_data = self.switch_tabs.get(switch_num)
+        if not switch_data or not switch_data.get('rollback_point') or not switch_data['connection']:
+            return
             
-            for cmd in commands:
-                try:
-                    # Format command with inputs
-                    formatted_cmd = cmd.format(**inputs)
-                    switch_data['queued_commands'].append(formatted_cmd)
-                except KeyError as e:
-                    self.log_to_console_for_switch(switch_num, f"Error: Missing input value {e} for command: {cmd}\n")
-                except Exception as e:
-                    self.log_to_console_for_switch(switch_num, f"Error formatting command: {e}\n")
+        path = switch_data['rollback_point']
+        future = self.transport_loop.submit(capture_running_config(switch_data['connection']))
+        
+        def on_captured(error, result):
+            try:
+                if error:
+                    raise error
+                point = complete_rollback_point(read_rollback_point(path), result[0])
+                write_rollback_point(path, point)
+            except Exception as e:
+                self.program_logger.error(f"Could not complete rollback point {path}: {str(e)}")
+                return
+            self.log_to_console_for_switch(switch_num, f"\nRollback point updated, {len(point['inverse'])} "
+                                                       "commands revert this run.\n")
+            self.program_logger.info(f"Rollback point {path} completed with {len(point['inverse'])} commands")
+            
+        future.add_done_callback(lambda done: self.root.after(
+            0, lambda: on_captured(done.exception(), None if done.exception() else done.result())))
+        
+    def start_queued_commands(self, switch_num):
+        """Run the queued commands of a switch, or load the first one for manual execution"""
+        switch_data = self.switch_tabs[switch_num]
         
         # Update the Next Commands display
         self.update_next_commands_display(switch_num)
@@ -1986,6 +2725,949 @@ class CiscoSwitchConfigurator:
                 console_input.delete(0, tk.END)
                 console_input.insert(0, switch_data['queued_commands'][0])
                 self.log_to_console_for_switch(switch_num, "Ready to execute command. Press Enter or click Send to continue.\n")
+                
+    def start_journal(self, switch_num, entries, journal=None):
+        """Journal the queued commands of a switch
+        
+        entries lists (journal index, command) for the queue, with index None for
+        commands that aren't part of the journaled run. A new journal is started
+        unless one is given.
+        """
+        switch_data = self.switch_tabs[switch_num]
+        if switch_data.get('journal'):
+            switch_data['journal'].close()
+        switch_data['journal'] = None
+        
+        try:
+            if journal is None:
+                journal = ExecutionJournal.create(journal_path(switch_data['name']), switch_data['name'],
+                                                  [command for _, command in entries])
+        except OSError as e:
+            self.program_logger.error(f"Could not start execution journal for switch {switch_num}: {str(e)}")
+            return
+            
+        journal.watch(switch_data['connection'])
+        switch_data['journal'] = journal
+        switch_data['journal_pending'] = list(entries)
+        
+    def journal_command_sent(self, switch_num, command):
+        """Record in the journal that a command was sent to a switch
+        
+        Returns the command's index in the journaled run, or None.
+        """
+        journal = self.switch_tabs[switch_num].get('journal')
+        if not journal or journal.state['done']:
+            return None
+            
+        pending = self.switch_tabs[switch_num]['journal_pending']
+        for position, (index, queued_command) in enumerate(pending):
+            if queued_command == command:
+                del pending[position]
+                journal.dispatched(index)
+                return index
+                
+        # Not part of the run, but its prompt must not acknowledge a run command
+        journal.dispatched(None)
+        return None
+        
+    def offer_journal_resume(self, switch_num):
+        """Offer to resume an interrupted run from its first unacknowledged command"""
+        if switch_num not in self.switch_tabs or not self.switch_tabs[switch_num]['connection']:
+            return
+            
+        switch_data = self.switch_tabs[switch_num]
+        if switch_data.get('journal'):
+            # A run from this tab was cut off by the reconnect, pick it up from disk
+            switch_data['journal'].close()
+            switch_data['journal'] = None
+            
+        try:
+            journal = ExecutionJournal.resume(journal_path(switch_data['name']))
+        except (OSError, ValueError, KeyError) as e:
+            self.program_logger.error(f"Could not read execution journal for {switch_data['name']}: {str(e)}")
+            return
+        if not journal:
+            return
+            
+        remaining = journal.remaining
+        if not remaining:
+            journal.finish()
+            return
+            
+        total = len(journal.state['commands'])
+        start, first_command = remaining[0]
+        message = f"A run of {total} commands on {switch_data['name']} stopped after {start} acknowledged commands."
+        if start in journal.state['dispatched']:
+            message += (f"\n\nCommand {start + 1} ({first_command}) was sent but never acknowledged "
+                        "and will be sent again.")
+        message += "\n\nResume the run? Choose No to discard it."
+        
+        if not messagebox.askyesno("Resume Run", message):
+            journal.finish()
+            return
+            
+        # Re-enter the configuration mode the run was in before continuing
+        entries = [(None, command) for command in mode_context(journal.state['commands'][:start])] + remaining
+        switch_data['queued_commands'] = [command for _, command in entries]
+        switch_data['run_sources'] = None
+        switch_data['executed_preview_items'] = []
+        switch_data['rollback_point'] = None
+        switch_data['error_policy'] = self.error_policy.get()
+        self.start_journal(switch_num, entries, journal)
+        self.notebook.select(switch_data['frame'])
+        self.log_to_console_for_switch(switch_num, f"Resuming interrupted run at command {start + 1} of {total}.\n")
+        self.program_logger.info(f"Resuming run on {switch_data['name']} at command {start + 1} of {total}")
+        self.start_queued_commands(switch_num)
+
+    def schedule_selected_preview_items(self):
+        """Schedule the selected preview items to run on inventory switches in a maintenance window"""
+        if not self.plan_scheduler or not self.inventory:
+            messagebox.showerror("Schedule", "Scheduling needs the switch inventory and the plan schedule")
+            return
+        if not self.preview_items:
+            messagebox.showinfo("No Commands", "No commands in preview. Add some commands first.")
+            return
+            
+        sources = []
+        flat_commands = self.build_preview_commands(self.get_selected_preview_items(), sources=sources)
+        commands = plan_mode_transitions(flat_commands)
+        sources = align_sources(flat_commands, sources, commands)
+        on_error = self.error_policy.get()
+        if not commands:
+            messagebox.showinfo("No Commands", "The selected items produce no commands.")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Schedule Selected")
+        dialog.geometry("520x560")
+        dialog.transient(self.root)
+        
+        ttk.Label(dialog, text=f"Run {len(commands)} commands on the selected switches:").pack(
+            anchor=tk.W, padx=10, pady=(10, 5))
+        selected_switches = self.add_inventory_switch_list(dialog)
+        
+        start = datetime.now().replace(second=0, microsecond=0)
+        start_var = tk.StringVar(value=start.strftime("%Y-%m-%d %H:%M"))
+        end_var = tk.StringVar(value=(start + timedelta(hours=4)).strftime("%Y-%m-%d %H:%M"))
+        concurrency_var = tk.IntVar(value=self.plan_scheduler.concurrency)
+        password_var = tk.StringVar()
+        
+        form = ttk.Frame(dialog)
+        form.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(form, text="Window start (YYYY-MM-DD HH:MM):").grid(row=0, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form, textvariable=start_var).grid(row=0, column=1, sticky=tk.W+tk.E, pady=2)
+        ttk.Label(form, text="Window end (YYYY-MM-DD HH:MM):").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form, textvariable=end_var).grid(row=1, column=1, sticky=tk.W+tk.E, pady=2)
+        ttk.Label(form, text="Switches at a time:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        ttk.Spinbox(form, from_=1, to=200, textvariable=concurrency_var, width=6).grid(row=2, column=1, sticky=tk.W, pady=2)
+        ttk.Label(form, text="SSH password (kept in memory only):").grid(row=3, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form, textvariable=password_var, show="*").grid(row=3, column=1, sticky=tk.W+tk.E, pady=2)
+        form.columnconfigure(1, weight=1)
+        
+        def on_schedule():
+            selected = selected_switches()
+            if not selected:
+                messagebox.showwarning("Schedule", "Select at least one switch", parent=dialog)
+                return
+            try:
+                start_at = datetime.strptime(start_var.get().strip(), "%Y-%m-%d %H:%M").timestamp()
+                window_end = datetime.strptime(end_var.get().strip(), "%Y-%m-%d %H:%M").timestamp()
+                self.plan_scheduler.concurrency = concurrency_var.get()
+            except (ValueError, tk.TclError) as e:
+                messagebox.showerror("Schedule", f"Invalid value: {str(e)}", parent=dialog)
+                return
+            if any(record['connection_type'] == "SSH" for record in selected) and not password_var.get():
+                messagebox.showwarning("Schedule", "Enter the SSH password for the SSH switches", parent=dialog)
+                return
+                
+            try:
+                for record in selected:
+                    connection = {key: record[key] for key in
+                                  ('connection_type', 'host', 'username', 'ssh_port', 'com_port', 'baudrate')}
+                    password = password_var.get() if record['connection_type'] == "SSH" else None
+                    self.plan_scheduler.schedule(record['name'], connection, commands, start_at, window_end, password,
+                                                 on_error, sources, self.take_rollback_point.get())
+            except (ValueError, sqlite3.Error) as e:
+                messagebox.showerror("Schedule", str(e), parent=dialog)
+                return
+                
+            self.program_logger.info(f"Scheduled {len(commands)} commands on {len(selected)} switches "
+                                     f"for {start_var.get()} - {end_var.get()}")
+            dialog.destroy()
+            self.show_scheduled_jobs()
+            
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Schedule", command=on_schedule).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+        
+    def add_inventory_switch_list(self, parent, height=12):
+        """Add a filterable multi-select list of inventory switches to a dialog
+        
+        Returns a function giving the selected inventory records. The selection
+        is kept while the filter changes.
+        """
+        filter_var = tk.StringVar()
+        filter_entry = ttk.Entry(parent, textvariable=filter_var)
+        filter_entry.pack(fill=tk.X, padx=10)
+        filter_entry.focus()
+        
+        switch_list = tk.Listbox(parent, selectmode=tk.EXTENDED, height=height, exportselection=False)
+        switch_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        records = []
+        chosen = set()
+        
+        def refresh(event=None):
+            chosen.difference_update(records[index]['name'] for index in range(len(records)))
+            chosen.update(records[index]['name'] for index in switch_list.curselection())
+            records[:] = self.inventory.search(filter_var.get(), limit=1000)
+            switch_list.delete(0, tk.END)
+            for index, record in enumerate(records):
+                site = f" ({record['site']})" if record['site'] else ""
+                switch_list.insert(tk.END, f"{record['name']}{site} - {record['connection_type']}")
+                if record['name'] in chosen:
+                    switch_list.selection_set(index)
+                    
+        filter_entry.bind('<KeyRelease>', refresh)
+        # Ctrl+A selects every switch the filter shows
+        switch_list.bind('<Control-a>', lambda e: switch_list.selection_set(0, tk.END))
+        refresh()
+        
+        return lambda: [records[index] for index in switch_list.curselection()]
+        
+    def on_scheduled_job_update(self, job):
+        """Log scheduled jobs as they start and finish"""
+        if not job:
+            return
+        if job['state'] in FINISHED_STATES:
+            details = f": {job['error']}" if job['error'] else ""
+            self.program_logger.info(f"Scheduled job {job['id']} on {job['switch']} {job['state']} after "
+                                     f"{job['next_command']} of {len(job['commands'])} commands{details}")
+        elif job['state'] == RUNNING and job['next_command'] == 0:
+            self.program_logger.info(f"Scheduled job {job['id']} on {job['switch']} started")
+            
+    def show_scheduled_jobs(self):
+        """List scheduled jobs with their progress"""
+        if not self.plan_scheduler:
+            messagebox.showerror("Scheduled Jobs", "The plan schedule is not available")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Scheduled Jobs")
+        dialog.geometry("850x450")
+        dialog.transient(self.root)
+        
+        columns = ("switch", "window", "state", "progress", "note")
+        headings = ("Switch", "Window", "State", "Progress", "Note")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            tree.heading(column, text=heading)
+            tree.column(column, width=260 if column in ("window", "note") else 90)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        jobs = {}
+        
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            selection = {jobs[item_id]['id'] for item_id in tree.selection() if item_id in jobs}
+            tree.delete(*tree.get_children())
+            jobs.clear()
+            for job in self.plan_scheduler.jobs():
+                window = (f"{datetime.fromtimestamp(job['start_at']).strftime('%Y-%m-%d %H:%M')} - "
+                          f"{datetime.fromtimestamp(job['window_end']).strftime('%Y-%m-%d %H:%M')}")
+                note = job['error']
+                if job['state'] == PENDING and self.plan_scheduler.needs_password(job):
+                    note = "Waiting for the SSH password"
+                item_id = tree.insert("", tk.END, values=(job['switch'], window, job['state'],
+                                                         f"{job['next_command']}/{len(job['commands'])}", note))
+                jobs[item_id] = job
+                if job['id'] in selection:
+                    tree.selection_add(item_id)
+            dialog.after(2000, refresh)
+            
+        def cancel_selected():
+            for item_id in tree.selection():
+                self.plan_scheduler.cancel(jobs[item_id]['id'])
+                
+        def enter_password():
+            waiting = [jobs[item_id] for item_id in tree.selection()
+                       if self.plan_scheduler.needs_password(jobs[item_id])]
+            if not waiting:
+                messagebox.showinfo("Scheduled Jobs", "Select SSH jobs waiting for their password", parent=dialog)
+                return
+            password = self.ask_password(dialog, f"SSH password for {len(waiting)} job(s):")
+            if password:
+                for job in waiting:
+                    self.plan_scheduler.set_password(job['id'], password)
+                    
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Remove Finished",
+                   command=self.plan_scheduler.remove_finished).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Cancel Selected", command=cancel_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Enter Password", command=enter_password).pack(side=tk.RIGHT, padx=5)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+        
+        refresh()
+        
+    def show_rollback_points(self):
+        """List rollback points and revert the selected ones on all their switches at once"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Rollback Points")
+        dialog.geometry("900x450")
+        dialog.transient(self.root)
+        
+        columns = ("switch", "created", "items", "revert", "state")
+        headings = ("Switch", "Taken", "Items", "Revert", "State")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            tree.heading(column, text=heading)
+            tree.column(column, width=260 if column == "items" else 130)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        points = {}
+        use_replace = tk.BooleanVar(value=False)
+        
+        def refresh():
+            tree.delete(*tree.get_children())
+            points.clear()
+            for path, point in list_rollback_points():
+                method, commands = revert_plan(point)
+                if method == REPLACE:
+                    revert = "configure replace"
+                elif method == INVERSE:
+                    revert = f"{len(commands)} commands" if commands else "No changes"
+                else:
+                    revert = "Incomplete"
+                state = ""
+                if point.get('reverted'):
+                    state = f"Reverted {datetime.fromtimestamp(point['reverted']).strftime('%Y-%m-%d %H:%M')}"
+                item_id = tree.insert("", tk.END, values=(
+                    point['switch'], datetime.fromtimestamp(point['created']).strftime('%Y-%m-%d %H:%M:%S'),
+                    ", ".join(point['items']), revert, state))
+                points[item_id] = (path, point)
+                
+        def view_selected(event=None):
+            selection = tree.selection()
+            if not selection:
+                return
+            path, point = points[selection[0]]
+            method, commands = revert_plan(point, REPLACE if use_replace.get() else None)
+            
+            viewer = tk.Toplevel(dialog)
+            viewer.title(f"Rollback Point - {point['switch']}")
+            viewer.geometry("700x550")
+            text = scrolledtext.ScrolledText(viewer, wrap=tk.NONE, font=("Courier", 10))
+            text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+            text.insert(tk.END, "! Revert plan\n" + ("\n".join(commands) if commands else
+                                                       "! Not available, the run was never completed") + "\n")
+            text.insert(tk.END, "\n! Running-config before the run\n" + point['before'])
+            text.config(state=tk.DISABLED)
+            viewer.bind('<Escape>', lambda e: viewer.destroy())
+            
+        def revert_selected():
+            if not self.plan_scheduler:
+                messagebox.showerror("Rollback Points", "Reverting needs the plan schedule", parent=dialog)
+                return
+                
+            plans = []
+            skipped = []
+            for item_id in tree.selection():
+                path, point = points[item_id]
+                _, commands = revert_plan(point, REPLACE if use_replace.get() else None)
+                connection = point.get('connection')
+                if not connection and self.inventory:
+                    record = self.inventory.get(point['switch'])
+                    connection = record and {key: record[key] for key in
+                                             ('connection_type', 'host', 'username', 'ssh_port', 'com_port',
+                                              'baudrate')}
+                if commands and connection:
+                    plans.append((path, point, connection, commands))
+                else:
+                    skipped.append(point['switch'])
+                    
+            if not plans:
+                messagebox.showinfo("Rollback Points", "Select completed rollback points with changes to revert",
+                                    parent=dialog)
+                return
+            message = f"Revert {len(plans)} switch(es) now?"
+            if skipped:
+                message += f"\n\nNothing to revert, or no connection details, for: {', '.join(skipped)}"
+            if not messagebox.askyesno("Revert", message, parent=dialog):
+                return
+                
+            password = None
+            if any(connection.get('connection_type') == "SSH" for _, _, connection, _ in plans):
+                password = self.ask_password(dialog, "SSH password for the SSH switches:")
+                if password is None:
+                    return
+                    
+            # Reverts go through the scheduler so they run in parallel, up to its concurrency.
+            # A rejected "no" form shouldn't stop the rest of the revert.
+            now = time.time()
+            try:
+                for path, point, connection, commands in plans:
+                    job_id = self.plan_scheduler.schedule(point['switch'], connection, commands, now,
+                                                          now + REVERT_WINDOW, password, SKIP)
+                    point['reverted'] = now
+                    point['revert_job'] = job_id
+                    write_rollback_point(path, point)
+            except (ValueError, OSError, sqlite3.Error) as e:
+                messagebox.showerror("Revert", str(e), parent=dialog)
+                
+            self.program_logger.info(f"Reverting {len(plans)} rollback points")
+            refresh()
+            self.show_scheduled_jobs()
+            
+        def delete_selected():
+            selection = tree.selection()
+            if not selection or not messagebox.askyesno(
+                    "Rollback Points", f"Delete {len(selection)} rollback point(s)?", parent=dialog):
+                return
+            for item_id in selection:
+                try:
+                    os.remove(points[item_id][0])
+                except OSError as e:
+                    self.program_logger.error(f"Could not delete rollback point: {str(e)}")
+            refresh()
+            
+        tree.bind('<Double-1>', view_selected)
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Checkbutton(button_frame, text="Use configure replace where archived",
+                        variable=use_replace).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Delete", command=delete_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Revert Selected", command=revert_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="View", command=view_selected).pack(side=tk.RIGHT, padx=5)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+        
+        refresh()
+        
+    def show_fleet_audit(self):
+        """Run show commands on many inventory switches at once and tabulate the results"""
+        if not self.inventory:
+            messagebox.showerror("Fleet Audit", "The fleet audit needs the switch inventory")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Fleet Audit")
+        dialog.geometry("1000x700")
+        dialog.transient(self.root)
+        
+        ttk.Label(dialog, text="Switches:").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        selected_switches = self.add_inventory_switch_list(dialog, height=8)
+        
+        # Show commands from the troubleshooting catalog that need no inputs
+        command_frame = ttk.LabelFrame(dialog, text="Commands")
+        command_frame.pack(fill=tk.X, padx=10, pady=5)
+        defaults = ("show version", "show license", "show env", "show interface transceiver detail")
+        command_vars = []
+        catalog_commands = [item['command'] for item in CONFIG_DATA.get("Troubleshooting Commands", [])
+                            if isinstance(item['command'], str) and not item.get('inputs')
+                            and is_show_command(item['command'])]
+        for index, command in enumerate(catalog_commands):
+            var = tk.BooleanVar(value=command in defaults)
+            ttk.Checkbutton(command_frame, text=command, variable=var).grid(
+                row=index // 4, column=index % 4, sticky=tk.W, padx=5)
+            command_vars.append((command, var))
+        extra_var = tk.StringVar()
+        ttk.Label(command_frame, text="Other show commands (separated by ;):").grid(
+            row=len(catalog_commands) // 4 + 1, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(command_frame, textvariable=extra_var).grid(
+            row=len(catalog_commands) // 4 + 1, column=1, columnspan=3, sticky=tk.W+tk.E, padx=5, pady=5)
+        
+        form = ttk.Frame(dialog)
+        form.pack(fill=tk.X, padx=10, pady=5)
+        concurrency_var = tk.IntVar(value=10)
+        password_var = tk.StringVar()
+        ttk.Label(form, text="Switches at a time:").pack(side=tk.LEFT)
+        ttk.Spinbox(form, from_=1, to=200, textvariable=concurrency_var, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Label(form, text="SSH password:").pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Entry(form, textvariable=password_var, show="*").pack(side=tk.LEFT, padx=5)
+        progress_var = tk.StringVar()
+        ttk.Label(form, textvariable=progress_var).pack(side=tk.RIGHT)
+        
+        tree = ttk.Treeview(dialog, show="headings", height=10)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        rows = []
+        state = {'collector': None, 'total': 0, 'started': 0}
+        
+        def show_row(row):
+            rows.append(row)
+            columns = table_columns(rows)
+            if list(tree['columns']) != columns:
+                tree['columns'] = columns
+                for column in columns:
+                    tree.heading(column, text=column)
+                    tree.column(column, width=120, stretch=False)
+                for item_id, existing in zip(tree.get_children(), rows):
+                    tree.item(item_id, values=[existing.get(column, "") for column in columns])
+            tree.insert("", tk.END, values=[row.get(column, "") for column in columns])
+            progress_var.set(f"{len(rows)} of {state['total']} switches, "
+                             f"{time.monotonic() - state['started']:.0f}s")
+            
+            if row['status'] == "ok" and inventory_facts(row):
+                try:
+                    self.inventory.update_facts(row['switch'], **inventory_facts(row))
+                except sqlite3.Error as e:
+                    self.program_logger.error(f"Could not update facts for {row['switch']}: {str(e)}")
+                    
+        def on_row(row):
+            self.root.after(0, lambda: show_row(row) if dialog.winfo_exists() else None)
+            
+        def run():
+            switches = selected_switches()
+            commands = [command for command, var in command_vars if var.get()]
+            commands += [command.strip() for command in extra_var.get().split(";") if command.strip()]
+            if not switches or not commands:
+                messagebox.showwarning("Fleet Audit", "Select switches and at least one command", parent=dialog)
+                return
+            rejected = [command for command in commands if not is_show_command(command)]
+            if rejected:
+                messagebox.showerror("Fleet Audit", "Only show commands can be run across the fleet, not:\n"
+                                     + "\n".join(rejected), parent=dialog)
+                return
+            if state['collector'] and len(rows) < state['total']:
+                messagebox.showinfo("Fleet Audit", "An audit is still running", parent=dialog)
+                return
+            if any(switch['connection_type'] == "SSH" for switch in switches) and not password_var.get():
+                messagebox.showwarning("Fleet Audit", "Enter the SSH password for the SSH switches", parent=dialog)
+                return
+            try:
+                concurrency = concurrency_var.get()
+            except tk.TclError:
+                concurrency = 10
+                
+            rows.clear()
+            tree.delete(*tree.get_children())
+            state.update(total=len(switches), started=time.monotonic())
+            state['collector'] = FleetCollector(switches, commands, concurrency, password_var.get() or None, on_row)
+            future = state['collector'].start()
+            self.program_logger.info(f"Fleet audit of {len(switches)} switches started: {', '.join(commands)}")
+            
+            def on_done(done):
+                error = done.exception()
+                if error:
+                    self.program_logger.error(f"Fleet audit failed: {str(error)}")
+                else:
+                    ok = sum(row['status'] == "ok" for row in done.result())
+                    self.program_logger.info(f"Fleet audit finished, {ok} of {len(switches)} switches answered")
+                    
+            future.add_done_callback(on_done)
+            
+        def cancel():
+            if state['collector']:
+                state['collector'].cancel()
+                
+        def save_csv():
+            if not rows:
+                messagebox.showinfo("Fleet Audit", "There are no results to save yet", parent=dialog)
+                return
+            path = filedialog.asksaveasfilename(parent=dialog, defaultextension=".csv",
+                                                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+                                                initialfile=f"audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            if not path:
+                return
+            try:
+                write_csv(path, rows)
+            except OSError as e:
+                messagebox.showerror("Fleet Audit", f"Could not save the results: {str(e)}", parent=dialog)
+                return
+            self.show_notification(f"Saved {len(rows)} switches to {os.path.basename(path)}")
+            
+        def on_close():
+            cancel()
+            dialog.destroy()
+            
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(button_frame, text="Close", command=on_close).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Save CSV", command=save_csv).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=cancel).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Run", command=run).pack(side=tk.RIGHT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", on_close)
+        dialog.bind('<Escape>', lambda e: on_close())
+        
+    def show_utilization(self):
+        """Plot the interface utilization of the switches being polled in the background"""
+        poller = get_utilization_poller()
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Interface Utilization")
+        dialog.geometry("1100x550")
+        dialog.transient(self.root)
+        
+        left_frame = ttk.Frame(dialog)
+        left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=10, pady=10)
+        ttk.Label(left_frame, text="Switches:").pack(anchor=tk.W)
+        switch_list = tk.Listbox(left_frame, width=38, height=10, exportselection=False)
+        switch_list.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(left_frame, text="Ports:").pack(anchor=tk.W, pady=(10, 0))
+        port_list = tk.Listbox(left_frame, width=38, height=14, exportselection=False, font=("Courier", 9))
+        port_list.pack(fill=tk.BOTH, expand=True)
+        
+        right_frame = ttk.Frame(dialog)
+        right_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10), pady=10)
+        options = ttk.Frame(right_frame)
+        options.pack(fill=tk.X)
+        metric_var = tk.StringVar(value="Percent")
+        ttk.Label(options, text="Show:").pack(side=tk.LEFT)
+        ttk.Combobox(options, textvariable=metric_var, values=("Percent", "Bits/s"),
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Label(options, text="RX", foreground="#1f77b4").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Label(options, text="TX", foreground="#2ca02c").pack(side=tk.LEFT)
+        canvas = tk.Canvas(right_frame, background="white", highlightthickness=0)
+        canvas.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        names = []
+        ports = []
+        
+        def selected(listbox, values):
+            selection = listbox.curselection()
+            return values[selection[0]] if selection and selection[0] < len(values) else None
+            
+        def format_rate(value):
+            if value != value:
+                return "-"
+            for unit, size in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+                if value >= size:
+                    return f"{value / size:.1f}{unit}"
+            return f"{value:.0f}"
+            
+        def set_rows(listbox, rows, selected_index, top=None):
+            """Update a list in place so its scroll position and selection survive a refresh"""
+            if top is None:
+                top = listbox.yview()[0]
+            current = listbox.get(0, tk.END)
+            for index, text in enumerate(rows):
+                if index >= len(current):
+                    listbox.insert(tk.END, text)
+                elif current[index] != text:
+                    listbox.delete(index)
+                    listbox.insert(index, text)
+            if len(current) > len(rows):
+                listbox.delete(len(rows), tk.END)
+            listbox.selection_clear(0, tk.END)
+            if selected_index is not None:
+                listbox.selection_set(selected_index)
+            listbox.yview_moveto(top)
+            
+        shown = {'switch': None}
+        
+        def refresh_lists():
+            switch = selected(switch_list, names)
+            names[:] = poller.switch_names()
+            rows = []
+            for name in names:
+                status, _, seconds = poller.status(name)
+                took = f" ({seconds:.1f}s)" if seconds is not None and status == "polling" else ""
+                rows.append(f"{name} - {status}{took}")
+            set_rows(switch_list, rows, names.index(switch) if switch in names else None)
+            
+            port = selected(port_list, ports)
+            latest = poller.latest(switch) if switch else {}
+            ports[:] = list(latest)
+            rows = []
+            for name in ports:
+                values = latest[name]
+                if values['rx_percent'] == values['rx_percent']:
+                    summary = f"{values['rx_percent']:3.0f}% / {values['tx_percent']:3.0f}%"
+                else:
+                    summary = f"{format_rate(values['rx_bps'])} / {format_rate(values['tx_bps'])}"
+                rows.append(f"{name:<14}{summary}")
+            # Another switch's ports start from the top
+            set_rows(port_list, rows, ports.index(port) if port in ports else None,
+                     top=0.0 if switch != shown['switch'] else None)
+            shown['switch'] = switch
+                    
+        def draw():
+            canvas.delete("all")
+            switch = selected(switch_list, names)
+            port = selected(port_list, ports)
+            width, height = canvas.winfo_width(), canvas.winfo_height()
+            if not switch or not port or width < 100 or height < 100:
+                canvas.create_text(width // 2, height // 2, text="Select a switch and a port", fill="gray")
+                return
+                
+            fields = ("rx_percent", "tx_percent") if metric_var.get() == "Percent" else ("rx_bps", "tx_bps")
+            series = [poller.series(switch, port, field) for field in fields]
+            samples = [(t, v) for times, values in series for t, v in zip(times, values) if v == v]
+            if not samples:
+                canvas.create_text(width // 2, height // 2, text="No samples yet", fill="gray")
+                return
+                
+            left, top, right, bottom = 60, 20, width - 20, height - 30
+            start = min(t for t, _ in samples)
+            end = max(t for t, _ in samples)
+            span = max(end - start, 1.0)
+            top_value = 100.0 if fields[0] == "rx_percent" else max(max(v for _, v in samples), 1.0)
+            
+            canvas.create_rectangle(left, top, right, bottom, outline="#cccccc")
+            for step in range(5):
+                y = bottom - (bottom - top) * step / 4
+                label = top_value * step / 4
+                canvas.create_line(left, y, right, y, fill="#eeeeee")
+                canvas.create_text(left - 5, y, anchor=tk.E, font=("Arial", 8),
+                                   text=f"{label:.0f}%" if fields[0] == "rx_percent" else format_rate(label))
+            canvas.create_text(left, bottom + 15, anchor=tk.W, font=("Arial", 8),
+                               text=datetime.fromtimestamp(start).strftime('%H:%M:%S'))
+            canvas.create_text(right, bottom + 15, anchor=tk.E, font=("Arial", 8),
+                               text=datetime.fromtimestamp(end).strftime('%H:%M:%S'))
+            
+            for (times, values), color in zip(series, ("#1f77b4", "#2ca02c")):
+                points = []
+                for t, v in zip(times, values):
+                    # Gaps in the series break the line
+                    if v != v:
+                        if len(points) >= 4:
+                            canvas.create_line(*points, fill=color, width=2)
+                        points = []
+                        continue
+                    points.extend((left + (right - left) * (t - start) / span,
+                                   bottom - (bottom - top) * min(v / top_value, 1.0)))
+                if len(points) >= 4:
+                    canvas.create_line(*points, fill=color, width=2)
+                elif len(points) == 2:
+                    x, y = points
+                    canvas.create_oval(x - 2, y - 2, x + 2, y + 2, fill=color, outline=color)
+                    
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            refresh_lists()
+            draw()
+            dialog.after(2000, refresh)
+            
+        def add_switches():
+            if not self.inventory:
+                messagebox.showerror("Utilization", "Adding switches needs the switch inventory", parent=dialog)
+                return
+            picker = tk.Toplevel(dialog)
+            picker.title("Poll Switches")
+            picker.geometry("420x420")
+            picker.transient(dialog)
+            ttk.Label(picker, text="Switches to poll:").pack(anchor=tk.W, padx=10, pady=(10, 5))
+            selected_switches = self.add_inventory_switch_list(picker)
+            
+            def on_add():
+                records = selected_switches()
+                password = None
+                if any(record['connection_type'] == "SSH" for record in records):
+                    password = self.ask_password(picker, "SSH password for the SSH switches:")
+                    if password is None:
+                        return
+                for record in records:
+                    connection = {key: record[key] for key in
+                                  ('connection_type', 'host', 'username', 'ssh_port', 'com_port', 'baudrate')}
+                    poller.add(record['name'], connection, password)
+                self.program_logger.info(f"Polling utilization of {len(records)} switches")
+                picker.destroy()
+                refresh_lists()
+                
+            button_frame = ttk.Frame(picker)
+            button_frame.pack(fill=tk.X, padx=10, pady=10)
+            ttk.Button(button_frame, text="Poll", command=on_add).pack(side=tk.RIGHT, padx=5)
+            ttk.Button(button_frame, text="Cancel", command=picker.destroy).pack(side=tk.RIGHT, padx=5)
+            
+        def stop_selected():
+            switch = selected(switch_list, names)
+            if switch:
+                poller.remove(switch)
+                refresh_lists()
+                draw()
+                
+        switch_list.bind('<<ListboxSelect>>', lambda e: (refresh_lists(), draw()))
+        port_list.bind('<<ListboxSelect>>', lambda e: draw())
+        metric_var.trace_add("write", lambda *args: draw())
+        canvas.bind('<Configure>', lambda e: draw())
+        
+        button_frame = ttk.Frame(left_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(button_frame, text="Add Switches", command=add_switches).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Stop Polling", command=stop_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+        
+        refresh()
+        
+    def ask_password(self, parent, prompt):
+        """Ask for a password in a small modal dialog, returning it or None"""
+        dialog = tk.Toplevel(parent)
+        dialog.title("Password")
+        dialog.transient(parent)
+        dialog.grab_set()
+        
+        password_var = tk.StringVar()
+        result = {'password': None}
+        ttk.Label(dialog, text=prompt).pack(padx=10, pady=(10, 5))
+        entry = ttk.Entry(dialog, textvariable=password_var, show="*", width=30)
+        entry.pack(padx=10, pady=5)
+        entry.focus()
+        
+        def on_ok(event=None):
+            result['password'] = password_var.get()
+            dialog.destroy()
+            
+        entry.bind('<Return>', on_ok)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="OK", command=on_ok).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        dialog.wait_window()
+        return result['password']
+        
+    def get_selected_preview_items(self):
+        """Return the selected preview items, or all items if none are selected"""
+        selected_items = [preview_item for preview_item in self.preview_items
+                          if self.preview_vars[preview_item['id']].get()]
+        
+        # If no items selected, just use all of them
+        return selected_items or list(self.preview_items)
+        
+    def build_preview_commands(self, preview_items, switch_num=None, sources=None):
+        """Build a flat list of formatted commands for the given preview items
+        
+        If sources is a list, (item name, line number) is appended to it for every command.
+        """
+        queued_commands = []
+        
+        for preview_item in preview_items:
+            item = preview_item['item']
+            inputs = preview_item['inputs'] or {}
+            
+            commands = item["command"]
+            if not isinstance(commands, list):
+                commands = [commands]
+            
+            # Process the commands to add configuration mode if needed
+            commands = self.prepare_commands_with_config_mode(commands)
+            
+            try:
+                # Format commands with inputs, expanding any ranges or lists
+                batch_inputs = find_batch_inputs(item.get("inputs", []), inputs, commands)
+                rendered = list(render_commands(commands, inputs, batch_inputs))
+                queued_commands.extend(rendered)
+                if sources is not None:
+                    sources.extend((item['name'], line) for line in range(1, len(rendered) + 1))
+            except KeyError as e:
+                if switch_num is not None:
+                    self.log_to_console_for_switch(switch_num, f"Error: Missing input value {e} for item: {item['name']}\n")
+            except Exception as e:
+                if switch_num is not None:
+                    self.log_to_console_for_switch(switch_num, f"Error formatting command: {e}\n")
+                        
+        return queued_commands
+
+    def push_preview_via_file_transfer(self):
+        """Serve the rendered preview from a local server and let the switch copy it"""
+        if not self.preview_items:
+            messagebox.showinfo("No Commands", "No commands in preview. Add some commands first.")
+            return
+            
+        # Check if connected
+        switch_num = self.selected_switch.get()
+        if switch_num not in self.switch_tabs or not self.switch_tabs[switch_num]['connection']:
+            messagebox.showwarning("Not Connected", "Selected switch is not connected")
+            return
+            
+        switch_data = self.switch_tabs[switch_num]
+        protocol = self.transfer_protocol.get().lower()
+        
+        try:
+            port = int(self.transfer_port.get()) if self.transfer_port.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Input Error", "Invalid port. Must be a number.")
+            return
+        if protocol == "tftp" and port not in (None, DEFAULT_PORTS["tftp"]):
+            messagebox.showerror("Input Error",
+                                 f"Switches can only fetch TFTP files from port {DEFAULT_PORTS['tftp']}.")
+            return
+            
+        # Restart the server if the protocol or port changed
+        if self.file_server and (self.file_server.protocol != protocol or
+                                 (port is not None and self.file_server.port != port)):
+            self.file_server.stop()
+            self.file_server = None
+            
+        try:
+            if not self.file_server:
+                self.file_server = ConfigFileServer(protocol, port=port)
+            self.file_server.start()
+        except OSError as e:
+            self.file_server = None
+            messagebox.showerror("Transfer Error", f"Could not start {protocol.upper()} server: {e}")
+            self.program_logger.error(f"Could not start {protocol.upper()} server: {str(e)}")
+            return
+            
+        # Fill in the server address and port so the user can see what the switch will use
+        address = self.transfer_address.get().strip() or guess_local_address()
+        self.transfer_address.set(address)
+        self.transfer_port.set(str(self.file_server.port))
+        
+        # Render the selected items as a configuration file
+        commands = self.build_preview_commands(self.get_selected_preview_items(), switch_num)
+        config_text = render_config_file(commands)
+        
+        # Create a sanitized filename from the switch name
+        safe_name = "".join(c for c in switch_data['name'] if c.isalnum() or c in (' ', '-', '_')).strip()
+        safe_name = safe_name.replace(' ', '_') or "switch"
+        filename = self.file_server.publish(f"{safe_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.cfg",
+                                            config_text)
+        url = self.file_server.url_for(filename, address)
+        line_count = config_text.count("\n") + 1
+        
+        responses = DEFAULT_RESPONSES
+        if self.transfer_mode.get() == "replace":
+            # The file only holds the selected items, anything else on the switch goes
+            if not messagebox.askyesno(
+                    "Replace Running Configuration",
+                    f"Replace the whole running-config of {switch_data['name']} with the {line_count} "
+                    f"lines of the selected preview items?\n\n"
+                    f"Everything not in those lines is removed, including the management IP, "
+                    f"users and VTY access, unless the selected items configure them.",
+                    icon=messagebox.WARNING, default=messagebox.NO):
+                return
+            # Without "force" the switch asks again, answer it now the user has confirmed
+            command = f"configure replace {url}"
+            responses = DEFAULT_RESPONSES + [(REPLACE_CONFIRM_PROMPT, "Y")]
+        else:
+            command = f"copy {url} running-config"
+            
+        # Switch to console tab for the selected switch
+        self.notebook.select(switch_data['frame'])
+        
+        def on_transfer_done(result, error):
+            if error:
+                self.log_to_console_for_switch(switch_num, f"\n--- File transfer did not finish: {error} ---\n")
+                self.program_logger.error(f"File transfer to switch {switch_num} did not finish: {str(error)}")
+            elif result.index == 0:
+                self.log_to_console_for_switch(switch_num, f"\n--- Applied {line_count} lines via {protocol.upper()} ---\n")
+                self.show_notification(f"Applied {line_count} lines to {switch_data['name']}")
+                self.program_logger.info(f"Pushed {line_count} lines to switch {switch_num} from {url}")
+            else:
+                failure = result.match.group(0).strip()
+                self.log_to_console_for_switch(switch_num, f"\n--- File transfer failed: {failure} ---\n")
+                self.program_logger.error(f"File transfer to switch {switch_num} failed: {failure}")
+                
+        # Wait for the copy to finish, accepting the default destination filename
+        self.expect_for_switch(
+            switch_num,
+            [r"bytes copied|Rollback Done", r"%\s?Error[^\r\n]*|%[^\r\n]*[Ff]ailed[^\r\n]*"],
+            on_transfer_done,
+            timeout=600,
+            command=command,
+            responses=responses
+        )
+        self.show_notification(f"Serving {line_count} lines to {switch_data['name']} via {protocol.upper()}")
 
     def execute_next_command_for_switch(self, switch_num):
         """Execute the next command in the queue for a specific switch"""
@@ -2004,6 +3686,7 @@ class CiscoSwitchConfigurator:
         # No more commands to execute
         if not switch_data['queued_commands']:
             self.log_to_console_for_switch(switch_num, "All commands executed.\n")
+            self.complete_rollback_point_for_switch(switch_num)
             
             # Mark executed items
             if 'executed_preview_items' in switch_data and switch_data['executed_preview_items']:
@@ -2022,83 +3705,92 @@ class CiscoSwitchConfigurator:
             # Log the command to the console
             self.log_to_console_for_switch(switch_num, f"\n> {cmd}\n")
             
-            # Send the command based on connection type
-            if switch_data['connection_type'].get() == "COM":
-                # Add proper line endings for Cisco devices
-                switch_data['connection'].write((cmd + "\r\n").encode())
-                switch_data['connection'].flush()
-            else:
-                switch_data['ssh_shell'].send(cmd + "\n")
-                
-            # If auto-execute, wait and run the next one
-            if switch_data['auto_execute'].get() and len(switch_data['queued_commands']) > 1:
-                # Remove the command we just executed
-                switch_data['queued_commands'].pop(0)
-                # Update the display
-                self.update_next_commands_display(switch_num)
-                # Ensure delay is at least 2 seconds
-                delay_value = max(2.0, switch_data['command_delay'].get())
-                delay_ms = int(delay_value * 1000)
-                self.root.after(delay_ms, lambda: self.execute_next_command_for_switch(switch_num))
-            elif len(switch_data['queued_commands']) > 1:
+            # Send errors are reported in the console
+            run_index = self.journal_command_sent(switch_num, cmd)
+            self.write_to_switch(switch_num, cmd, error_title=None)
+            
+            # Remove the command we just executed
+            switch_data['queued_commands'].pop(0)
+            # Update the display
+            self.update_next_commands_display(switch_num)
+                
+            if switch_data['auto_execute'].get():
+                # Check the output before running the next one
+                self.watch_command_result(switch_num, cmd, run_index)
+            elif switch_data['queued_commands']:
                 # Manual mode but more commands - load the next one
                 console_input = switch_data['console_input']
-                
-                # Remove the command we just executed
-                switch_data['queued_commands'].pop(0)
-                # Update the display
-                self.update_next_commands_display(switch_num)
-                
-                # Load the next command
                 console_input.delete(0, tk.END)
                 console_input.insert(0, switch_data['queued_commands'][0])
                 self.log_to_console_for_switch(switch_num, "Ready for next command. Press Enter or click Send to continue.\n")
-            else:
-                # Only one command left, remove it after execution
-                switch_data['queued_commands'].pop(0)
-                # Update the display
-                self.update_next_commands_display(switch_num)
                 
         except Exception as e:
             self.log_to_console_for_switch(switch_num, f"Error sending command: {e}\n")
             
+    def watch_command_result(self, switch_num, command, run_index=None, attempts=1):
+        """Check a sent command's output for IOS errors once the command delay has passed"""
+        switch_data = self.switch_tabs[switch_num]
+        switch_data['command_output'] = ""
+        
+        # Ensure delay is at least 2 seconds
+        delay_value = max(2.0, switch_data['command_delay'].get())
+        self.root.after(int(delay_value * 1000),
+                        lambda: self.check_command_result(switch_num, command, run_index, attempts))
+        
+    def check_command_result(self, switch_num, command, run_index, attempts):
+        """Apply the run's error policy to a command's output, then carry on with the queue"""
+        if switch_num not in self.switch_tabs:
+            return
+            
+        switch_data = self.switch_tabs[switch_num]
+        error = find_error(switch_data.get('command_output', ""))
+        if not error:
+            self.execute_next_command_for_switch(switch_num)
+            return
+            
+        sources = switch_data.get('run_sources') or []
+        source = sources[run_index] if run_index is not None and run_index < len(sources) else None
+        description = describe_failure(command, error, *(source or ()))
+        action = error_action(switch_data.get('error_policy', HALT), attempts)
+        COMMAND_ERRORS.labels(action).inc()
+        
+        if action == RETRY:
+            self.log_to_console_for_switch(switch_num, f"\n{description} - retrying (attempt {attempts + 1})\n")
+            self.program_logger.warning(f"Switch {switch_num}: {description}, retrying")
+            
+            # Journal the retry as the same command of the run
+            if run_index is not None and switch_data.get('journal_pending') is not None:
+                switch_data['journal_pending'].insert(0, (run_index, command))
+            self.log_to_console_for_switch(switch_num, f"\n> {command}\n")
+            self.journal_command_sent(switch_num, command)
+            self.write_to_switch(switch_num, command, error_title=None)
+            self.watch_command_result(switch_num, command, run_index, attempts + 1)
+            
+        elif action == SKIP:
+            self.log_to_console_for_switch(switch_num, f"\n{description} - skipped\n")
+            self.program_logger.warning(f"Switch {switch_num}: {description}, skipped")
+            if switch_data.get('journal'):
+                switch_data['journal'].skipped(run_index)
+            self.execute_next_command_for_switch(switch_num)
+            
+        else:
+            # Leave the rest of the plan queued so it can be fixed and continued by hand
+            remaining = len(switch_data['queued_commands'])
+            self.log_to_console_for_switch(switch_num, f"\nRun halted. {description}\n"
+                                                       f"{remaining} commands were not run.\n")
+            self.program_logger.error(f"Switch {switch_num}: run halted, {description}")
+            if switch_data['queued_commands']:
+                console_input = switch_data['console_input']
+                console_input.delete(0, tk.END)
+                console_input.insert(0, switch_data['queued_commands'][0])
+            # Record what the partial run changed, in case it should be reverted
+            self.complete_rollback_point_for_switch(switch_num)
+            messagebox.showerror("Run Halted", f"{description}\n\n{remaining} commands were not run.")
+            
     def prepare_commands_with_config_mode(self, commands):
         """Prepare commands with proper configuration mode handling"""
-        # Check if these commands need configuration mode
-        needs_config_mode = False
-        needs_context_exit = False
-        context_commands = ["interface", "vlan", "line", "router", "dhcp pool", "access-list"]
-        
-        for cmd in commands:
-            # These commands typically require config mode
-            config_indicators = ["interface", "vlan", "ip route", "hostname", "username", 
-                               "line", "router", "access-list", "enable secret", "banner",
-                               "logging", "snmp-server", "service", "aaa", "errdisable",
-                               "spanning-tree", "monitor", "archive", "stack-mac"]
-                               
-            # If the command starts with any of the indicators, it needs config mode
-            if any(cmd.lower().startswith(indicator.lower()) for indicator in config_indicators):
-                needs_config_mode = True
-                
-            # If it's a context command, we need to exit the context
-            if any(cmd.lower().startswith(indicator.lower()) for indicator in context_commands):
-                needs_context_exit = True
-                
-        # If this sequence needs config mode, add the necessary commands
-        if needs_config_mode:
-            # Only add configure terminal if it's not already the first command
-            if not any(cmd.lower() == "configure terminal" for cmd in commands):
-                commands = ["configure terminal"] + commands
-            
-            # Add exit command if needed and not already present
-            if needs_context_exit and not any(cmd.lower() == "exit" for cmd in commands):
-                commands.append("exit")
-                
-            # Add end command at the end if not already there
-            if not any(cmd.lower() == "end" for cmd in commands):
-                commands.append("end")
-                
-        return commands
+        # Enters configuration mode where needed and always returns to EXEC mode
+        return plan_mode_transitions(commands)
             
     def mark_item_executed(self, item_id):
         """Mark a preview item as executed with a checkmark"""
@@ -2112,11 +3804,13 @@ class CiscoSwitchConfigurator:
                     item['executed'] = True
                 break
                 
-    def add_config_to_preview(self, item, vars_dict):
-        """Add a configuration item to the preview tab"""
+    def collect_input_values(self, item, vars_dict):
+        """Read and validate the input values for a configuration item, or return None"""
         # Get the values from the input fields
         input_values = {name: var.get() for name, var in vars_dict.items()}
         
+        commands = item["command"] if isinstance(item["command"], list) else [item["command"]]
+        
         # Validate inputs
         for input_field in item.get("inputs", []):
             name = input_field["name"]
@@ -2124,7 +3818,16 @@ class CiscoSwitchConfigurator:
                 value = input_values[name]
                 if not value:
                     messagebox.showerror("Input Error", f"Please enter a value for {input_field['description']}")
-                    return
+                    return None
+                
+                # Interface ranges and number lists are expanded when the commands are built
+                if is_batch_value(input_field, value):
+                    try:
+                        validate_batch_value(input_field, value, commands)
+                    except ValueError as e:
+                        messagebox.showerror("Input Error", f"Invalid value for {input_field['description']}: {e}")
+                        return None
+                    continue
                 
                 # Convert to int if needed
                 if input_field["type"] == "int":
@@ -2133,7 +3836,16 @@ class CiscoSwitchConfigurator:
                     except ValueError:
                         messagebox.showerror("Input Error", 
                                             f"Invalid value for {input_field['description']}. Must be a number.")
-                        return
+                        return None
+                        
+        return input_values
+        
+    def add_config_to_preview(self, item, vars_dict):
+        """Add a configuration item to the preview tab"""
+        # Get and validate the values from the input fields
+        input_values = self.collect_input_values(item, vars_dict)
+        if input_values is None:
+            return
         
         # Add to preview
         self.add_to_preview(item, input_values if input_values else None)
@@ -2155,26 +3867,10 @@ class CiscoSwitchConfigurator:
             messagebox.showwarning("Not Connected", f"Selected switch is not connected")
             return
         
-        # Get the values from the input fields
-        input_values = {name: var.get() for name, var in vars_dict.items()}
-        
-        # Validate inputs
-        for input_field in item.get("inputs", []):
-            name = input_field["name"]
-            if name in input_values:
-                value = input_values[name]
-                if not value:
-                    messagebox.showerror("Input Error", f"Please enter a value for {input_field['description']}")
-                    return
-                
-                # Convert to int if needed
-                if input_field["type"] == "int":
-                    try:
-                        input_values[name] = int(value)
-                    except ValueError:
-                        messagebox.showerror("Input Error", 
-                                            f"Invalid value for {input_field['description']}. Must be a number.")
-                        return
+        # Get and validate the values from the input fields
+        input_values = self.collect_input_values(item, vars_dict)
+        if input_values is None:
+            return
         
         # Format the command with the input values
         commands = item["command"]
@@ -2184,14 +3880,21 @@ class CiscoSwitchConfigurator:
         # Process the commands to add configuration mode if needed
         commands = self.prepare_commands_with_config_mode(commands)
             
+        # Format the commands, expanding any ranges or lists
+        try:
+            batch_inputs = find_batch_inputs(item.get("inputs", []), input_values, commands)
+            formatted_commands = list(render_commands(commands, input_values, batch_inputs))
+        except KeyError as e:
+            messagebox.showerror("Input Error", f"Missing input value: {e}")
+            return
+            
         # Switch to console tab for the selected switch
         self.notebook.select(self.switch_tabs[switch_num]['frame'])
         
         # Process each command
         def run_commands():
-            for cmd in commands:
+            for formatted_cmd in formatted_commands:
                 try:
-                    formatted_cmd = cmd.format(**input_values)
                     # If auto-execute is enabled, send directly
                     if self.switch_tabs[switch_num]['auto_execute'].get():
                         self.send_command_to_switch(formatted_cmd, switch_num)
@@ -2235,14 +3938,9 @@ class CiscoSwitchConfigurator:
         # Log the command
         self.log_to_console_for_switch(switch_num, f"\n> {command}\n")
         
-        # Send the command
+        # Send the command and wait for it to be written (this runs in a worker thread)
         try:
-            if switch_data['connection_type'].get() == "COM":
-                switch_data['connection'].write((command + "\r\n").encode())
-                # Flush the buffer
-                switch_data['connection'].flush()
-            else:
-                switch_data['ssh_shell'].send(command + "\n")
+            self.write_to_switch(switch_num, command, error_title=None).result()
                 
         except Exception as e:
             raise Exception(f"Error sending command: {e}")
@@ -2288,7 +3986,9 @@ class CiscoSwitchConfigurator:
         self.preview_items = []
         self.preview_vars = {}
         
-        # Show empty label
+        # Show empty label, replacing the one an already empty preview shows
+        if hasattr(self, 'empty_preview_label') and self.empty_preview_label.winfo_exists():
+            self.empty_preview_label.destroy()
         self.empty_preview_label = ttk.Label(self.preview_scrollable_frame, 
                                           text="No configurations added to preview.\nAdd configurations from the Configuration tab.")
         self.empty_preview_label.pack(pady=20)
@@ -2450,6 +4150,51 @@ class CiscoSwitchConfigurator:
             messagebox.showerror("Import Error", "Error importing preview: " + str(e))
             self.program_logger.error("Error importing preview: " + str(e))
 
+    def bulk_generate_from_csv(self):
+        """Render the selected preview items once per CSV row into plan files"""
+        if not self.preview_items:
+            messagebox.showinfo("Bulk Generate", "Add the items to use as a template to the preview first")
+            return
+            
+        csv_filename = filedialog.askopenfilename(
+            initialdir="saved_previews",
+            title="Select Site Data CSV",
+            filetypes=(("CSV files", "*.csv"), ("All files", "*.*"))
+        )
+        
+        if not csv_filename:
+            return  # User canceled
+            
+        default_dir = os.path.join("saved_previews", "bulk_" + datetime.now().strftime("%Y%m%d_%H%M%S"))
+        output_dir = filedialog.askdirectory(
+            initialdir="saved_previews",
+            title="Select Output Folder (Cancel = " + default_dir + ")"
+        ) or default_dir
+        
+        # The preview inputs act as defaults for columns missing from the CSV
+        template = [(preview_item['item'], preview_item['inputs'])
+                    for preview_item in self.get_selected_preview_items()]
+        
+        try:
+            written, errors = generate_bulk_plans(csv_filename, template, output_dir)
+        except Exception as e:
+            messagebox.showerror("Bulk Generate Error", "Error generating plans: " + str(e))
+            self.program_logger.error("Error generating bulk plans: " + str(e))
+            return
+            
+        self.program_logger.info(f"Generated {written} plans from {csv_filename} into {output_dir}")
+        for row_number, name, error in errors:
+            self.program_logger.warning(f"Bulk plan row {row_number} ({name}) skipped: {error}")
+            
+        if errors:
+            details = "\n".join(f"Row {row_number} ({name}): {error}" for row_number, name, error in errors[:10])
+            if len(errors) > 10:
+                details += f"\n... and {len(errors) - 10} more (see the program log)"
+            messagebox.showwarning("Bulk Generate",
+                                   f"Wrote {written} plans to {output_dir}\n\n{len(errors)} rows skipped:\n{details}")
+        else:
+            self.show_notification(f"Wrote {written} plans to {output_dir}")
+
     def update_next_commands_display(self, switch_num):
         """Update the display of next commands for a specific switch"""
         if switch_num not in self.switch_tabs:
@@ -2461,12 +4206,15 @@ class CiscoSwitchConfigurator:
         if not next_commands_frame:
             return
             
+        started = time.perf_counter()
+        
         # Clear existing labels
         for widget in next_commands_frame.winfo_children():
             widget.destroy()
             
         # Get queued commands
         queued_commands = switch_data.get('queued_commands', [])
+        QUEUE_DEPTH.labels(switch_data['name']).set(len(queued_commands))
         
         # Create labels for each command
         for i, cmd in enumerate(queued_commands):
@@ -2484,6 +4232,8 @@ class CiscoSwitchConfigurator:
             ttk.Button(cmd_frame, text="Use", width=5,
                       command=lambda c=cmd, sn=switch_num: self.use_next_command(c, sn)).pack(side=tk.RIGHT, padx=5)
             
+        QUEUE_RENDER.observe(time.perf_counter() - started)
+            
     def use_next_command(self, command, switch_num):
         """Use a command from the next commands list"""
         if switch_num not in self.switch_tabs:
@@ -2517,19 +4267,23 @@ class CiscoSwitchConfigurator:
             messagebox.showwarning("Not Connected", "Please connect to a switch first")
             return
             
-        try:
-            # Send the save command
-            self.log_to_console_for_switch(switch_num, "\n> copy running-config startup-config\n")
+        # Ignore repeated clicks while a save is in progress
+        if switch_data.get('saving'):
+            return
+        switch_data['saving'] = True
+        
+        def on_saved(result, error):
+            if switch_num not in self.switch_tabs:
+                return
+            switch_data['saving'] = False
             
-            if switch_data['connection_type'].get() == "COM":
-                switch_data['connection'].write(b"copy running-config startup-config\r\n")
-                switch_data['connection'].flush()
-            else:
-                switch_data['ssh_shell'].send("copy running-config startup-config\n")
+            if error or result.index != 0:
+                reason = str(error) if error else result.match.group(0).strip()
+                self.log_to_console_for_switch(switch_num, f"\n--- Configuration was not saved: {reason} ---\n")
+                messagebox.showerror("Save Error", f"Error saving configuration: {reason}")
+                self.program_logger.error(f"Error saving configuration for switch {switch_num}: {reason}")
+                return
                 
-            # Wait a moment for the command to complete
-            time.sleep(2)
-            
             # Show success message
             self.log_to_console_for_switch(switch_num, "Configuration saved successfully!\n")
             
@@ -2547,9 +4301,15 @@ class CiscoSwitchConfigurator:
                 # For the first switch, just disconnect but keep the tab
                 self.disconnect()
                 
-        except Exception as e:
-            messagebox.showerror("Save Error", f"Error saving configuration: {e}")
-            self.program_logger.error(f"Error saving configuration for switch {switch_num}: {str(e)}")
+        # Send the save command and wait for the switch to confirm it with [OK]
+        self.expect_for_switch(
+            switch_num,
+            [r"\[OK\]", r"%[^\r\n]+"],
+            on_saved,
+            timeout=60,
+            command="write memory",
+            responses=DEFAULT_RESPONSES
+        )
             
 
 if __name__ == "__main__":
@@ -2574,19 +4334,17 @@ if __name__ == "__main__":
     main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
     
     # Add logo
+    logo_photo = None
     try:
-        from PIL import Image, ImageTk
-        logo_path = "media/logo.png"
-        if os.path.exists(logo_path):
-            logo_image = Image.open(logo_path)
-            # Resize logo to 300x150 pixels
-            logo_image = logo_image.resize((300, 150), Image.Resampling.LANCZOS)
-            logo_photo = ImageTk.PhotoImage(logo_image)
-            logo_label = ttk.Label(main_frame, image=logo_photo)
-            logo_label.image = logo_photo  # Keep a reference
-            logo_label.pack(pady=(20, 10))
+        logo_photo = get_asset_cache().image("media/logo.png", (300, 150))
     except Exception as e:
         print(f"Error loading logo: {e}")
+        
+    if logo_photo:
+        logo_label = ttk.Label(main_frame, image=logo_photo)
+        logo_label.image = logo_photo  # Keep a reference
+        logo_label.pack(pady=(20, 10))
+    else:
         ttk.Label(main_frame, text="Cisco Switch Configurator", 
                  font=("Arial", 24, "bold")).pack(pady=(20, 10))
     
@@ -2598,13 +4356,8 @@ if __name__ == "__main__":
     ttk.Label(main_frame, text="Loading...", 
              font=("Arial", 10)).pack(pady=10)
     
-    # Function to close splash and show main window
-    def close_splash():
-        splash.destroy()
-        root.deiconify()  # Show the main window
-        
-    # Schedule closing after 3 seconds
-    root.after(3000, close_splash)
+    # Draw the splash before the main window is built
+    splash.update()
     
     # Create custom styles
     style = ttk.Style()
@@ -2612,4 +4365,8 @@ if __name__ == "__main__":
     style.configure("Selected.TLabel", background="#e6ffe6")  # Light green
     
     app = CiscoSwitchConfigurator(root)
+    
+    # Close the splash and show the main window as soon as it is ready
+    splash.destroy()
+    root.deiconify()
     root.mainloop() 
\ No newline at end of file
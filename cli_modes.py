@@ -0,0 +1,217 @@
+"""
+IOS CLI mode tracking for command plans.
+
+Commands are classified with a single precompiled regex and a small state
+machine follows the CLI through EXEC mode, global configuration and nested
+configuration sub-modes. One linear pass over a plan inserts the mode changes
+the commands need and drops the ones that cancel out, such as the "end" /
+"configure terminal" pairs catalog items wrap themselves in.
+"""
+
+import re
+
+# Command kinds returned by classify()
+ENTER_CONFIG = "enter_config"
+LEAVE_CONFIG = "leave_config"
+EXIT = "exit"
+ENABLE = "enable"
+DO_COMMAND = "do"
+EXEC_COMMAND = "exec"
+NO_COMMAND = "no"
+SUBMODE_COMMAND = "submode"
+NESTED_SUBMODE_COMMAND = "nested_submode"
+CONFIG_COMMAND = "config"
+UNKNOWN_COMMAND = "unknown"
+
+# Mode levels, anything above SUBMODE is a nested sub-mode
+EXEC = 0
+CONFIG = 1
+SUBMODE = 2
+
+# Privileged EXEC commands
+EXEC_KEYWORDS = ("show", "copy", "write", "reload", "ping", "traceroute", "clear", "debug",
+                 "undebug", "disable", "terminal", "dir", "more", "verify", "delete", "erase",
+                 "clock set", "test", "undelete", "squeeze", "format", "mkdir", "rmdir",
+                 "configure replace", "configure confirm", "license smart", "install")
+
+# Global configuration commands that enter a sub-mode
+SUBMODE_KEYWORDS = ("interface", "vlan", "line", "router", "ip dhcp pool", "ip access-list",
+                    "ipv6 access-list", "stackwise-virtual", "policy-map", "class-map",
+                    "spanning-tree mst configuration", "archive", "key chain", "ip sla",
+                    "monitor session", "aaa group server", "ip vrf", "vrf definition", "track")
+
+# Sub-mode commands that open a further nested mode
+NESTED_SUBMODE_KEYWORDS = ("address-family", "class", "log config")
+
+# Configuration commands that don't change the mode
+CONFIG_KEYWORDS = ("hostname", "username", "enable secret", "enable password", "banner", "logging",
+                   "snmp-server", "service", "aaa", "errdisable", "spanning-tree", "monitor", "stack-mac",
+                   "ip", "ipv6", "ntp", "clock timezone", "clock summer-time", "crypto", "vtp", "udld",
+                   "lldp", "cdp", "lacp", "port-channel", "system mtu", "boot", "default",
+                   "config-register", "license boot", "mac address-table", "access-list")
+
+
+def _alternation(keywords):
+    # Longest first so "ip dhcp pool" wins over "ip"
+    ordered = sorted(keywords, key=len, reverse=True)
+    return "|".join(r"\s+".join(re.escape(word) for word in keyword.split()) for keyword in ordered)
+
+
+# A single classifier for every command, the group order decides precedence.
+# Keywords must be followed by whitespace or the end of the line, so
+# "write-memory" in archive mode is not the EXEC "write".
+COMMAND_RE = re.compile(
+    r"^\s*(?:"
+    rf"(?P<{ENTER_CONFIG}>conf(?:ig(?:ure)?)?\s+t(?:erminal)?)\s*$"
+    rf"|(?P<{LEAVE_CONFIG}>end)\s*$"
+    rf"|(?P<{EXIT}>exit)\s*$"
+    rf"|(?P<{ENABLE}>enable)\s*$"
+    rf"|(?P<{DO_COMMAND}>do)\s"
+    rf"|(?P<{EXEC_COMMAND}>{_alternation(EXEC_KEYWORDS)})(?=\s|$)"
+    rf"|(?P<{NO_COMMAND}>no)\s+\S"
+    rf"|(?P<{SUBMODE_COMMAND}>{_alternation(SUBMODE_KEYWORDS)})(?=\s|$)"
+    rf"|(?P<{NESTED_SUBMODE_COMMAND}>{_alternation(NESTED_SUBMODE_KEYWORDS)})(?=\s|$)"
+    rf"|(?P<{CONFIG_COMMAND}>{_alternation(CONFIG_KEYWORDS)})(?=\s|$)"
+    r")",
+    re.IGNORECASE,
+)
+
+
+def classify(line):
+    """Return the kind of a single command line"""
+    match = COMMAND_RE.match(line)
+    if not match:
+        return UNKNOWN_COMMAND
+
+    # "no interface ..." removes a sub-mode instead of entering it
+    if match.lastgroup == NO_COMMAND:
+        return CONFIG_COMMAND
+    return match.lastgroup
+
+
+def is_exec_command(line):
+    """Tell whether a command line only makes sense in EXEC mode"""
+    return classify(line) in (EXEC_COMMAND, ENABLE)
+
+
+def next_level(level, kind):
+    """Return the mode level after running a command of the given kind"""
+    if kind in (ENTER_CONFIG, CONFIG_COMMAND):
+        return max(level, CONFIG)
+    if kind in (LEAVE_CONFIG, EXEC_COMMAND, ENABLE):
+        return EXEC
+    if kind == EXIT:
+        return max(level - 1, EXEC)
+    if kind == SUBMODE_COMMAND:
+        return SUBMODE
+    if kind == NESTED_SUBMODE_COMMAND and level >= SUBMODE:
+        return level + 1
+    return level
+
+
+def plan_mode_transitions(commands, level=EXEC):
+    """Return the commands with the minimal mode changes they need
+
+    One pass over the plan adds "configure terminal" before configuration
+    commands run from EXEC mode and "end" before EXEC commands run from
+    configuration mode, and drops redundant "configure terminal" and "end"
+    commands. An "end" followed by "configure terminal" is dropped when it
+    would only leave and re-enter global configuration, or when the next
+    command enters a sub-mode, which IOS resolves from any configuration mode.
+    The plan ends in EXEC mode unless it explicitly leaves configuration mode
+    open with a final "configure terminal".
+
+    The line after a bare "enable" answers its password prompt and is passed
+    through untouched, as are multi-line entries.
+    """
+    planned = []
+    # An "end" not sent yet, and whether a "configure terminal" then cancelled it
+    pending_end = False
+    back_to_config = False
+    password_next = False
+    # Whether configuration mode was entered for commands rather than asked for
+    implicit_config = False
+
+    for command in commands:
+        if password_next or "\n" in command:
+            if back_to_config and level > CONFIG:
+                planned.extend(["end", "configure terminal"])
+                level = CONFIG
+            elif pending_end:
+                planned.append("end")
+                level = EXEC
+            pending_end = back_to_config = False
+            planned.append(command)
+            if not password_next:
+                for line in command.split("\n"):
+                    level = next_level(level, classify(line))
+            password_next = False
+            continue
+
+        kind = classify(command)
+
+        if kind == LEAVE_CONFIG:
+            if level > EXEC:
+                pending_end, back_to_config = True, False
+            continue
+
+        if kind == ENTER_CONFIG:
+            if pending_end:
+                pending_end, back_to_config = False, True
+            elif level == EXEC:
+                planned.append(command)
+                level, implicit_config = CONFIG, False
+            continue
+
+        if back_to_config:
+            back_to_config = False
+            if level > CONFIG and kind != SUBMODE_COMMAND:
+                # We can't be sure how deep we are, so take the long way round
+                planned.extend(["end", "configure terminal"])
+                level = CONFIG
+
+        if pending_end:
+            planned.append("end")
+            level, pending_end = EXEC, False
+
+        if kind in (EXEC_COMMAND, ENABLE) and level > EXEC:
+            planned.append("end")
+        elif kind in (CONFIG_COMMAND, SUBMODE_COMMAND) and level == EXEC:
+            planned.append("configure terminal")
+            implicit_config = True
+
+        planned.append(command)
+        level = next_level(level, kind)
+        password_next = kind == ENABLE
+
+    if back_to_config and level > CONFIG:
+        planned.extend(["end", "configure terminal"])
+    elif pending_end or (level > EXEC and implicit_config):
+        planned.append("end")
+
+    return planned
+
+
+def align_sources(commands, sources, planned):
+    """Return the source of every planned command
+
+    commands and sources are the plan before plan_mode_transitions() and
+    where each of its commands came from. A mode change the planner added
+    is attributed to the command it was added for.
+    """
+    aligned = []
+    position = 0
+    for command in planned:
+        # Skip the mode changes the planner dropped
+        while (position < len(commands) and commands[position] != command
+               and classify(commands[position]) in (ENTER_CONFIG, LEAVE_CONFIG)):
+            position += 1
+
+        if position < len(commands) and commands[position] == command:
+            aligned.append(sources[position])
+            position += 1
+        elif position < len(commands):
+            aligned.append(sources[position])
+        else:
+            aligned.append(sources[-1] if sources else None)
+    return aligned
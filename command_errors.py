@@ -0,0 +1,60 @@
+"""
+Detection of IOS command errors in switch output.
+
+IOS reports a rejected command with a line starting with "%", such as
+"% Invalid input detected at '^' marker." A single precompiled expression
+finds the first such line in the output of a command. Syslog messages
+("%LINK-3-UPDOWN: ...") are not errors and don't match.
+
+What happens after an error is decided by the plan's policy: halt the run,
+skip the failed line, or retry it a few times before halting.
+"""
+
+import re
+
+# Error lines IOS prints after a command it didn't accept
+ERROR_MARKERS = (
+    r"Invalid input detected",
+    r"Incomplete command",
+    r"Ambiguous command",
+    r"Unknown command",
+    r"Unrecognized command",
+    r"Invalid",
+    r"Bad",
+    r"Error",
+)
+
+ERROR_RE = re.compile(r"^[ \t]*%[ \t]?(?:" + "|".join(ERROR_MARKERS) + r")\b.*$", re.MULTILINE)
+
+HALT = "halt"
+SKIP = "skip"
+RETRY = "retry"
+
+POLICIES = (HALT, SKIP, RETRY)
+
+# Attempts after the first before a retried command halts the run
+MAX_RETRIES = 2
+
+
+def find_error(output):
+    """Return the first IOS error line in the output of a command, or None"""
+    match = ERROR_RE.search(output)
+    return match.group(0).strip() if match else None
+
+
+def error_action(policy, attempts):
+    """Return what to do about a failed command: HALT, SKIP or RETRY
+
+    attempts counts the times the command has been sent so far.
+    """
+    if policy == SKIP:
+        return SKIP
+    if policy == RETRY and attempts <= MAX_RETRIES:
+        return RETRY
+    return HALT
+
+
+def describe_failure(command, error, source=None, line=None):
+    """Describe a failed command for the console and the logs"""
+    where = f"{source}, line {line}" if source and line else source or (f"line {line}" if line else "")
+    return f"{where + ': ' if where else ''}'{command}' failed: {error}"
@@ -0,0 +1,290 @@
+"""
+Checkpointed execution of command queues.
+
+A journal file per switch records a run's commands, then every command's
+dispatch and acknowledgement, as JSON lines. A command counts as acknowledged
+once the switch prints its prompt, or a password question, after it without
+reporting an error. Rejected commands get a failure record instead. Records
+are flushed to the OS as they are written, so an app crash loses nothing.
+They are fsynced in batches, at most SYNC_INTERVAL seconds apart, which bounds
+what a power loss can take. After a crash, a dropped link or a closed tab the
+run resumes from the first command that was never acknowledged.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+from cli_modes import (ENABLE, ENTER_CONFIG, EXEC, EXIT, LEAVE_CONFIG, NESTED_SUBMODE_COMMAND, SUBMODE,
+                       SUBMODE_COMMAND, classify, next_level)
+from command_errors import find_error
+from metrics import get_registry
+from transport import PASSWORD_PROMPT, PROMPT_PATTERN
+
+JOURNAL_DIR = "journal"
+
+# fsync after this many records or this many seconds, whichever comes first
+SYNC_BATCH = 32
+SYNC_INTERVAL = 1.0
+
+# Output kept to look for the prompt that acknowledges a command, and for errors
+TAIL_SIZE = 4096
+
+RUN = "run"
+DISPATCH = "dispatch"
+ACK = "ack"
+FAIL = "fail"
+SKIP = "skip"
+DONE = "done"
+
+JOURNAL_SYNC_SECONDS = get_registry().histogram("journal_sync_seconds", "Seconds an execution journal fsync takes")
+
+
+def journal_path(switch_name, directory=JOURNAL_DIR):
+    safe_name = "".join(c for c in switch_name if c.isalnum() or c in (' ', '-', '_')).strip().replace(' ', '_')
+    return os.path.join(directory, f"{safe_name or 'switch'}.jnl")
+
+
+def read_journal(path):
+    """Return the state of the run in a journal, or None if there is none
+
+    The state is a dict with the switch, commands, the acknowledged and the
+    dispatched command indexes, the errors of failed commands and whether the
+    run finished. A record torn by
+    a crash at the end of the file is ignored.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+
+    state = None
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+
+        kind = record.get("type")
+        if kind == RUN:
+            state = {"switch": record["switch"], "commands": record["commands"], "started": record["time"],
+                     "dispatched": set(), "acknowledged": set(), "failed": {}, "done": False}
+        elif state is None:
+            continue
+        elif kind == DISPATCH:
+            state["dispatched"].add(record["index"])
+        elif kind in (ACK, SKIP):
+            # A skipped command is settled just like an acknowledged one
+            state["acknowledged"].add(record["index"])
+            state["failed"].pop(record["index"], None)
+        elif kind == FAIL:
+            state["failed"][record["index"]] = record["error"]
+        elif kind == DONE:
+            state["done"] = True
+
+    return state
+
+
+def first_unacknowledged(state):
+    """Return the index of the first command the switch never acknowledged"""
+    index = 0
+    while index in state["acknowledged"]:
+        index += 1
+    return index
+
+
+def mode_context(commands):
+    """Return the commands that bring the CLI back to the mode the given commands end in
+
+    For example ["configure terminal", "interface Gi1/0/1"] after a plan
+    stopped inside that interface.
+    """
+    stack = []
+    level = EXEC
+    password_next = False
+
+    for command in commands:
+        if password_next:
+            password_next = False
+            continue
+        for line in command.split("\n"):
+            kind = classify(line)
+            if kind == ENTER_CONFIG and level == EXEC:
+                stack = [line.strip()]
+            elif kind == SUBMODE_COMMAND:
+                stack = (stack[:1] or ["configure terminal"]) + [line.strip()]
+            elif kind == NESTED_SUBMODE_COMMAND and level >= SUBMODE:
+                stack.append(line.strip())
+            elif kind == EXIT:
+                stack = stack[:-1]
+            elif kind == LEAVE_CONFIG or next_level(level, kind) == EXEC:
+                stack = []
+            elif not stack and next_level(level, kind) > EXEC:
+                stack = ["configure terminal"]
+            level = next_level(level, kind)
+        password_next = classify(command) == ENABLE
+
+    return stack
+
+
+class ExecutionJournal:
+    """Append-only journal of one queued run on one switch
+
+    Commands are dispatched from the UI thread and acknowledged from the
+    transport loop, so both go through the journal's lock.
+    """
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self.state = state
+        # Reentrant, as an acknowledgement can finish and close the journal
+        self._lock = threading.RLock()
+        self._file = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._timer = None
+
+        # Dispatched commands waiting for their prompt, None for untracked ones
+        self._awaiting = collections.deque()
+        self._tail = ""
+        self._transport = None
+
+    @classmethod
+    def create(cls, path, switch, commands):
+        """Start a new run, replacing any earlier journal for the switch"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8"):
+            pass
+
+        journal = cls(path, {"switch": switch, "commands": list(commands), "started": time.time(),
+                             "dispatched": set(), "acknowledged": set(), "failed": {}, "done": False})
+        journal._append({"type": RUN, "switch": switch, "commands": list(commands), "time": time.time()},
+                        sync=True)
+        return journal
+
+    @classmethod
+    def resume(cls, path):
+        """Continue the unfinished run in a journal, or return None if there is none"""
+        state = read_journal(path)
+        if not state or state["done"]:
+            return None
+        return cls(path, state)
+
+    @property
+    def remaining(self):
+        """Return the commands from the first unacknowledged one on, with their indexes"""
+        start = first_unacknowledged(self.state)
+        return list(enumerate(self.state["commands"]))[start:]
+
+    def _append(self, record, sync=False):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+
+            if sync or self._unsynced >= SYNC_BATCH or time.monotonic() - self._last_sync >= SYNC_INTERVAL:
+                self._sync_locked()
+            elif not self._timer:
+                # Make sure a quiet period still gets synced
+                self._timer = threading.Timer(SYNC_INTERVAL, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync_locked(self):
+        with JOURNAL_SYNC_SECONDS.time():
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def sync(self):
+        with self._lock:
+            if not self._file.closed and self._unsynced:
+                self._sync_locked()
+            self._timer = None
+
+    def watch(self, transport):
+        """Acknowledge dispatched commands from a transport's output"""
+        with self._lock:
+            if self._transport:
+                self._transport.remove_listener(self._on_data)
+            self._transport = transport
+            self._awaiting.clear()
+            self._tail = ""
+        transport.add_listener(self._on_data)
+
+    def dispatched(self, index):
+        """Record that a command is being sent; index None for commands outside the run
+
+        Call it before sending, so the answer can't arrive first.
+        """
+        with self._lock:
+            # Output of an earlier command still waiting for its prompt belongs to that command
+            if not self._awaiting:
+                self._tail = ""
+            self._awaiting.append(index)
+            if index is not None:
+                self.state["dispatched"].add(index)
+                self._append({"type": DISPATCH, "index": index, "time": time.time()})
+
+    def _on_data(self, text):
+        with self._lock:
+            if not self._awaiting:
+                return
+            self._tail = (self._tail + text)[-TAIL_SIZE:]
+            if not (PROMPT_PATTERN.search(self._tail) or PASSWORD_PROMPT.search(self._tail)):
+                return
+
+            error = find_error(self._tail)
+            self._tail = ""
+            index = self._awaiting.popleft()
+            if index is None:
+                return
+
+            if error:
+                # Not acknowledged, so a resumed run sends it again
+                self.state["failed"][index] = error
+                self._append({"type": FAIL, "index": index, "error": error, "time": time.time()})
+                return
+
+            self._settle(index, ACK)
+
+    def skipped(self, index):
+        """Record that a failed command was skipped, so a resumed run doesn't send it again"""
+        with self._lock:
+            if index is not None and not self.state["done"]:
+                self._settle(index, SKIP)
+
+    def _settle(self, index, kind):
+        self.state["acknowledged"].add(index)
+        self.state["failed"].pop(index, None)
+        self._append({"type": kind, "index": index, "time": time.time()})
+        if len(self.state["acknowledged"]) == len(self.state["commands"]):
+            self.finish()
+
+    def finish(self):
+        """Mark the run complete"""
+        if not self.state["done"]:
+            self.state["done"] = True
+            self._append({"type": DONE, "time": time.time()}, sync=True)
+        self.close()
+
+    def close(self):
+        """Stop journaling, leaving an unfinished run resumable"""
+        if self._transport:
+            self._transport.remove_listener(self._on_data)
+            self._transport = None
+        self.sync()
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._file.close()
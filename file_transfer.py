@@ -0,0 +1,237 @@
+"""
+Local file transfer servers for pushing large configurations to a switch.
+
+Instead of typing thousands of lines over the console, the rendered preview is
+published on a small built-in HTTP or TFTP server and the switch pulls it with
+a single copy command over its management port.
+"""
+
+import http.server
+import re
+import socket
+import struct
+import threading
+
+from cli_modes import ENABLE, ENTER_CONFIG, LEAVE_CONFIG, classify, is_exec_command
+
+# TFTP opcodes and defaults (RFC 1350)
+TFTP_RRQ = 1
+TFTP_WRQ = 2
+TFTP_DATA = 3
+TFTP_ACK = 4
+TFTP_ERROR = 5
+TFTP_BLOCK_SIZE = 512
+TFTP_TIMEOUT = 2.0
+TFTP_RETRIES = 5
+
+DEFAULT_PORTS = {"http": 8080, "tftp": 69}
+
+# "configure replace" without "force" asks before it removes anything
+REPLACE_CONFIRM_PROMPT = re.compile(r"want to proceed\.?\s*\?\s*\[no\]:\s*$")
+
+
+def guess_local_address(remote_host=None):
+    """Guess the local IP address the switch can reach us on"""
+    # Connecting a UDP socket sends nothing but picks the outgoing interface
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect((remote_host or "192.0.2.1", 9))
+        return probe.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        probe.close()
+
+
+class _HTTPFileHandler(http.server.BaseHTTPRequestHandler):
+    """Serve published files from memory"""
+
+    def do_GET(self):
+        data = self.server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404, "File not found")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet, transfers are reported by the GUI
+        pass
+
+
+class _TFTPServer(threading.Thread):
+    """Minimal read-only TFTP server serving published files from memory"""
+
+    def __init__(self, files, host, port):
+        super().__init__(daemon=True)
+        self.files = files
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.5)
+        self.running = True
+
+    @property
+    def server_address(self):
+        return self.sock.getsockname()
+
+    def run(self):
+        while self.running:
+            try:
+                packet, client = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            if len(packet) < 4:
+                continue
+
+            opcode = struct.unpack("!H", packet[:2])[0]
+            if opcode == TFTP_RRQ:
+                filename = packet[2:].split(b"\0")[0].decode("ascii", errors="replace")
+                threading.Thread(target=self._send_file, args=(client, filename), daemon=True).start()
+            elif opcode == TFTP_WRQ:
+                self.sock.sendto(self._error_packet(2, "Access violation"), client)
+
+    def _send_file(self, client, filename):
+        """Send one file to a client from a dedicated transfer socket"""
+        transfer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        transfer.bind((self.sock.getsockname()[0], 0))
+        transfer.settimeout(TFTP_TIMEOUT)
+
+        try:
+            data = self.files.get(filename.lstrip("/"))
+            if data is None:
+                transfer.sendto(self._error_packet(1, "File not found"), client)
+                return
+
+            # A final block shorter than the block size (possibly empty) ends the transfer
+            block_count = len(data) // TFTP_BLOCK_SIZE + 1
+            for index in range(block_count):
+                block_num = (index + 1) & 0xFFFF
+                chunk = data[index * TFTP_BLOCK_SIZE:(index + 1) * TFTP_BLOCK_SIZE]
+                packet = struct.pack("!HH", TFTP_DATA, block_num) + chunk
+
+                if not self._send_block(transfer, client, packet, block_num):
+                    return
+        finally:
+            transfer.close()
+
+    def _send_block(self, transfer, client, packet, block_num):
+        """Send a data block and wait for its acknowledgement"""
+        for _ in range(TFTP_RETRIES):
+            transfer.sendto(packet, client)
+            try:
+                while True:
+                    reply, address = transfer.recvfrom(1024)
+                    if address != client or len(reply) < 4:
+                        continue
+                    opcode, acked = struct.unpack("!HH", reply[:4])
+                    if opcode == TFTP_ERROR:
+                        return False
+                    if opcode == TFTP_ACK and acked == block_num:
+                        return True
+            except socket.timeout:
+                continue
+        return False
+
+    @staticmethod
+    def _error_packet(code, message):
+        return struct.pack("!HH", TFTP_ERROR, code) + message.encode() + b"\0"
+
+    def shutdown(self):
+        self.running = False
+        self.sock.close()
+
+
+class ConfigFileServer:
+    """Serve rendered configuration files to switches over HTTP or TFTP"""
+
+    def __init__(self, protocol="http", host="0.0.0.0", port=None):
+        self.protocol = protocol.lower()
+        if self.protocol not in DEFAULT_PORTS:
+            raise ValueError(f"Unsupported transfer protocol: {protocol}")
+
+        self.host = host
+        self.port = DEFAULT_PORTS[self.protocol] if port is None else port
+        self.files = {}
+        self._server = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def start(self):
+        """Start serving in a background thread"""
+        if self._server:
+            return
+
+        if self.protocol == "http":
+            self._server = http.server.ThreadingHTTPServer((self.host, self.port), _HTTPFileHandler)
+            self._server.files = self.files
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+        else:
+            self._server = _TFTPServer(self.files, self.host, self.port)
+            self._server.start()
+
+        # Pick up the real port when an ephemeral one was requested
+        self.port = self._server.server_address[1]
+
+    def stop(self):
+        """Stop serving and forget the published files"""
+        if not self._server:
+            return
+
+        self._server.shutdown()
+        if self.protocol == "http":
+            self._server.server_close()
+        self._server = None
+        self._thread = None
+        self.files.clear()
+
+    def publish(self, name, text):
+        """Publish configuration text under a file name"""
+        # Switches read the file as plain text, one command per line
+        self.files[name] = (text.rstrip("\n") + "\n").encode("utf-8")
+        return name
+
+    def url_for(self, name, address):
+        """Build the URL the switch should copy the file from"""
+        if self.protocol == "http":
+            return f"http://{address}:{self.port}/{name}"
+        # IOS always fetches TFTP files from port 69
+        if self.port != DEFAULT_PORTS["tftp"]:
+            raise ValueError(f"Switches can only fetch TFTP files from port {DEFAULT_PORTS['tftp']}")
+        return f"tftp://{address}/{name}"
+
+
+def render_config_file(commands):
+    """Render a flat command list as a configuration file for copy/replace"""
+    lines = []
+    password_next = False
+    for command in commands:
+        # Some catalog commands hold several lines in one string
+        for line in command.split("\n"):
+            stripped = line.strip()
+            kind = classify(stripped)
+
+            # The line after a bare "enable" is its password, not configuration
+            if password_next:
+                password_next = False
+                continue
+            password_next = kind == ENABLE
+
+            # Mode changes and EXEC commands have no place in a config file
+            if not stripped or kind in (ENTER_CONFIG, LEAVE_CONFIG) or is_exec_command(stripped):
+                continue
+
+            lines.append(stripped)
+
+    lines.append("end")
+    return "\n".join(lines)
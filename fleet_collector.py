@@ -0,0 +1,287 @@
+"""
+Fleet-wide collection of show commands.
+
+A collector runs a set of show commands on many switches at once, at most
+`concurrency` sessions at a time on the shared transport loop. Each switch
+gets a single session for all of its commands, so the login is only paid once
+per switch. Known commands are parsed into a few columns (model, version,
+licenses, environment and transceiver alarms) and each switch becomes one row
+of a table, which can be written as CSV. Commands without a parser keep their
+raw output.
+
+    python fleet_collector.py audit.csv --site DC1 -c "show version" -c "show env"
+"""
+
+import argparse
+import asyncio
+import csv
+import getpass
+import re
+import sys
+import time
+
+from command_errors import find_error
+from inventory import DEFAULT_DB_PATH, FACT_COLUMNS, Inventory
+from transport import TransportError, get_transport_loop, transport_from_settings, wait_for_prompt
+
+DEFAULT_CONCURRENCY = 10
+
+# Seconds to wait for the output of one command
+COMMAND_TIMEOUT = 60.0
+
+# Columns every row has, before the ones the commands add
+BASE_COLUMNS = ("switch", "site", "host", "status", "errors", "seconds")
+
+MODEL_RE = re.compile(r"^Model [Nn]umber\s*:\s*(\S+)|^cisco\s+(\S+)\s+\(.*\)\s+processor", re.MULTILINE)
+VERSION_RE = re.compile(r"\bVersion\s+([^\s,]+)")
+SERIAL_RE = re.compile(r"^System [Ss]erial [Nn]umber\s*:\s*(\S+)|Processor board ID\s+(\S+)", re.MULTILINE)
+UPTIME_RE = re.compile(r"uptime is (.+)$", re.MULTILINE)
+
+# Classic "Index 1 Feature: ipservices" and Smart Licensing "network-advantage (...):" headers
+LICENSE_FEATURE_RE = re.compile(r"^Index\s+\d+\s+Feature:\s*(\S+)|^(\S+)\s+\([^)]*\):\s*$")
+LICENSE_STATE_RE = re.compile(r"^\s*(?:License State|Status):\s*(.+?)\s*$")
+
+# Alarm states as IOS prints them, in capitals or, in tables, capitalised. Case matters:
+# "Red" alone is the "Red Threshold" heading of a healthy Catalyst 9000
+ENVIRONMENT_ALARM_RE = re.compile(
+    r"(?<![\w-])(?:FAULTY|Faulty|FAIL(?:ED|URE)?|Fail(?:ed|ure)?|BAD|Bad|NOT OK|Not OK|RED|"
+    r"CRITICAL|Critical|SHUTDOWN|Shutdown)(?![\w-])")
+
+# Threshold settings and table headings, never states
+ENVIRONMENT_HEADER_RE = re.compile(r"Threshold|^\s*(?:SW|Sensor)\s+\S")
+
+# Only show commands are run across the fleet, and only ones that don't write files
+SHOW_COMMAND_RE = re.compile(r"^\s*sh(?:ow?)?\s+\S", re.IGNORECASE)
+FILE_OUTPUT_RE = re.compile(r"\|\s*(?:redirect|tee|append)\b", re.IGNORECASE)
+
+# A transceiver table row, with the alarm flag IOS prints after an out of range value
+TRANSCEIVER_ROW_RE = re.compile(
+    r"^\s*((?:Gi|Te|Tw|Fo|Hu|Fa|Twe)\S*\d)\s+(?:N/A|-?\d+(?:\.\d+)?)\s*(\+\+|--|\+|-)?(?=\s)")
+
+
+def _first_group(match):
+    return next((group for group in match.groups() if group), "") if match else ""
+
+
+def parse_version(output):
+    uptime = UPTIME_RE.search(output)
+    return {
+        "model": _first_group(MODEL_RE.search(output)),
+        "software_version": _first_group(VERSION_RE.search(output)),
+        "serial_number": _first_group(SERIAL_RE.search(output)),
+        "uptime": uptime.group(1).strip() if uptime else "",
+    }
+
+
+def parse_license(output):
+    licenses = {}
+    feature = None
+    for line in output.splitlines():
+        header = LICENSE_FEATURE_RE.match(line)
+        if header:
+            feature = _first_group(header)
+            continue
+        state = LICENSE_STATE_RE.match(line)
+        if state and feature and feature not in licenses:
+            licenses[feature] = state.group(1)
+    return {"licenses": "; ".join(f"{name}: {state}" for name, state in licenses.items())}
+
+
+def parse_environment(output):
+    alarms = [line.strip() for line in output.splitlines()
+              if ENVIRONMENT_ALARM_RE.search(line) and not ENVIRONMENT_HEADER_RE.search(line)]
+    return {"environment": "; ".join(alarms) if alarms else "OK"}
+
+
+def parse_transceivers(output):
+    interfaces = set()
+    alarms = set()
+    for line in output.splitlines():
+        row = TRANSCEIVER_ROW_RE.match(line)
+        if row:
+            interfaces.add(row.group(1))
+            if row.group(2):
+                alarms.add(row.group(1))
+    return {"transceivers": len(interfaces), "transceiver_alarms": ", ".join(sorted(alarms))}
+
+
+# Parsers by command, abbreviations included
+PARSERS = (
+    (re.compile(r"^sh(?:ow?)?\s+ver(?:s(?:i(?:on?)?)?)?$", re.IGNORECASE), parse_version),
+    (re.compile(r"^sh(?:ow?)?\s+lic(?:e(?:n(?:se?)?)?)?(?:\s+(?:all|summary))?$", re.IGNORECASE), parse_license),
+    (re.compile(r"^sh(?:ow?)?\s+env(?:ironment)?(?:\s+all)?$", re.IGNORECASE), parse_environment),
+    (re.compile(r"^sh(?:ow?)?\s+int(?:erfaces?)?\s+transceiver(?:\s+detail)?$", re.IGNORECASE), parse_transceivers),
+)
+
+
+def parse_output(command, output):
+    """Return the columns for a command's output
+
+    Commands without a parser get their raw output in a column named after them.
+    """
+    command = " ".join(command.split())
+    for pattern, parser in PARSERS:
+        if pattern.match(command):
+            return parser(output)
+    return {command: output.strip()}
+
+
+def is_show_command(command):
+    """Tell whether a command only shows state, so it is safe to run on every switch"""
+    return bool(SHOW_COMMAND_RE.match(command)) and not FILE_OUTPUT_RE.search(command)
+
+
+def inventory_facts(row):
+    """Return the inventory facts found in a row"""
+    return {column: row[column] for column in FACT_COLUMNS if row.get(column)}
+
+
+def table_columns(rows):
+    """Return the columns of a set of rows, the base columns first"""
+    columns = list(BASE_COLUMNS)
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    return columns
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=table_columns(rows), restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class FleetCollector:
+    """Run show commands on many switches and collect one row per switch
+
+    switches are inventory records or dicts with the same connection settings.
+    on_row(row) is called from the transport loop as each switch finishes.
+    Raises ValueError for commands that aren't show commands.
+    """
+
+    def __init__(self, switches, commands, concurrency=DEFAULT_CONCURRENCY, password=None, on_row=None):
+        rejected = [command for command in commands if not is_show_command(command)]
+        if rejected:
+            raise ValueError(f"Only show commands can be collected: {', '.join(rejected)}")
+        self.switches = list(switches)
+        self.commands = list(commands)
+        self.concurrency = max(1, int(concurrency))
+        self.password = password
+        self.on_row = on_row
+        self._cancelled = False
+
+    def cancel(self):
+        """Skip the switches that haven't started yet"""
+        self._cancelled = True
+
+    def start(self):
+        """Run on the transport loop, returning a future for the rows"""
+        return get_transport_loop().submit(self.run())
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def collect(switch):
+            async with semaphore:
+                if self._cancelled:
+                    row = self._new_row(switch)
+                    row['status'] = "cancelled"
+                else:
+                    row = await self._collect(switch)
+            if self.on_row:
+                self.on_row(row)
+            return row
+
+        return await asyncio.gather(*(collect(switch) for switch in self.switches))
+
+    @staticmethod
+    def _new_row(switch):
+        return {"switch": switch['name'], "site": switch.get('site') or "",
+                "host": switch.get('host') or switch.get('com_port') or "", "status": "", "errors": "",
+                "seconds": ""}
+
+    async def _collect(self, switch):
+        row = self._new_row(switch)
+        started = time.monotonic()
+        transport = None
+        errors = []
+
+        try:
+            transport = transport_from_settings(switch, self.password)
+            await transport.open()
+
+            prompt = await wait_for_prompt(transport, timeout=5.0)
+            if not prompt:
+                raise TransportError("no prompt from the switch")
+            prompt_pattern = re.compile(re.escape(prompt) + r"\s*$")
+            await transport.send_and_expect("terminal length 0", prompt_pattern, 10.0)
+
+            for command in self.commands:
+                result = await transport.send_and_expect(command, prompt_pattern, COMMAND_TIMEOUT)
+                # Leave out the echoed command
+                output = result.before.replace("\r", "").partition("\n")[2]
+                error = find_error(output)
+                if error:
+                    errors.append(f"{command}: {error}")
+                else:
+                    row.update(parse_output(command, output))
+            row['status'] = "ok"
+
+        except Exception as e:
+            row['status'] = str(e) or e.__class__.__name__
+        finally:
+            if transport:
+                await transport.close()
+
+        row['errors'] = "; ".join(errors)
+        row['seconds'] = round(time.monotonic() - started, 1)
+        return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run show commands on inventory switches and write a CSV")
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("-c", "--command", action="append", dest="commands",
+                        help="Show command to run, may be repeated (default: show version)")
+    parser.add_argument("--site", help="Only switches of this site")
+    parser.add_argument("--search", default="", help="Only switches matching these words, as in the inventory")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Switches at a time")
+    parser.add_argument("--inventory", default=DEFAULT_DB_PATH, help="Inventory database")
+    args = parser.parse_args(argv)
+
+    commands = args.commands or ["show version"]
+    rejected = [command for command in commands if not is_show_command(command)]
+    if rejected:
+        parser.error(f"only show commands can be collected: {', '.join(rejected)}")
+
+    inventory = Inventory(args.inventory)
+    switches = inventory.search(args.search, limit=100000)
+    if args.site:
+        switches = [switch for switch in switches if switch['site'].lower() == args.site.lower()]
+    if not switches:
+        print("No matching switches in the inventory", file=sys.stderr)
+        return 1
+
+    password = None
+    if any(switch['connection_type'] == "SSH" for switch in switches):
+        password = getpass.getpass("SSH password: ")
+
+    def on_row(row):
+        print(f"{row['switch']}: {row['status']} ({row['seconds']}s)", file=sys.stderr)
+
+    started = time.perf_counter()
+    collector = FleetCollector(switches, commands, args.concurrency, password, on_row)
+    rows = collector.start().result()
+    write_csv(args.output, rows)
+
+    for row in rows:
+        if row['status'] == "ok" and inventory_facts(row):
+            inventory.update_facts(row['switch'], **inventory_facts(row))
+
+    ok = sum(row['status'] == "ok" for row in rows)
+    print(f"Collected {ok} of {len(rows)} switches in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0 if ok == len(rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
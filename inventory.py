@@ -0,0 +1,163 @@
+"""
+Persistent switch inventory.
+
+Switch names, connection parameters, sites, tags and the facts seen on the
+last visit are kept in a small SQLite database, indexed for quick lookups by
+name, site and IP address. Passwords are never stored.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.path.join("inventory", "inventory.db")
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS switches (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    site TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    connection_type TEXT NOT NULL DEFAULT 'COM',
+    host TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    ssh_port INTEGER NOT NULL DEFAULT 22,
+    username TEXT NOT NULL DEFAULT '',
+    com_port TEXT NOT NULL DEFAULT '',
+    baudrate INTEGER NOT NULL DEFAULT 9600,
+    tags TEXT NOT NULL DEFAULT '',
+    model TEXT,
+    software_version TEXT,
+    serial_number TEXT,
+    last_seen REAL
+);
+CREATE INDEX IF NOT EXISTS idx_switches_site ON switches (site);
+CREATE INDEX IF NOT EXISTS idx_switches_host ON switches (host);
+CREATE INDEX IF NOT EXISTS idx_switches_last_seen ON switches (last_seen);
+"""
+
+# Facts collected from the switch itself
+FACT_COLUMNS = ("model", "software_version", "serial_number")
+
+
+def normalize_tags(tags):
+    """Turn a comma separated string or a list of tags into a canonical string"""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return ", ".join(sorted({tag.strip() for tag in tags if tag.strip()}, key=str.lower))
+
+
+class Inventory:
+    """SQLite backed store of known switches"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # The connection is shared with worker threads, so serialize access
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params)]
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._db:
+            return self._db.execute(sql, params).rowcount
+
+    def remember(self, name, connection_type, host="", username="", ssh_port=22,
+                 com_port="", baudrate=9600, site=None, tags=None):
+        """Add or update a switch and mark it as seen now
+
+        Site and tags are left unchanged when not given.
+        """
+        self._execute(
+            """
+            INSERT INTO switches (name, connection_type, host, username, ssh_port, com_port,
+                                  baudrate, site, tags, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, ''), COALESCE(?, ''), ?)
+            ON CONFLICT (name) DO UPDATE SET
+                connection_type = excluded.connection_type,
+                host = excluded.host,
+                username = excluded.username,
+                ssh_port = excluded.ssh_port,
+                com_port = excluded.com_port,
+                baudrate = excluded.baudrate,
+                site = COALESCE(?, site),
+                tags = COALESCE(?, tags),
+                last_seen = excluded.last_seen
+            """,
+            (name, connection_type, host, username, ssh_port, com_port, baudrate,
+             site, None if tags is None else normalize_tags(tags), time.time(),
+             site, None if tags is None else normalize_tags(tags)),
+        )
+
+    def update_facts(self, name, **facts):
+        """Store facts read from the switch, e.g. model or software_version"""
+        unknown = set(facts) - set(FACT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown switch facts: {', '.join(sorted(unknown))}")
+        if not facts:
+            return
+
+        assignments = ", ".join(f"{column} = ?" for column in facts)
+        self._execute(f"UPDATE switches SET {assignments}, last_seen = ? WHERE name = ?",
+                      (*facts.values(), time.time(), name))
+
+    def set_site_and_tags(self, name, site, tags):
+        """Replace the site and tags of a switch"""
+        self._execute("UPDATE switches SET site = ?, tags = ? WHERE name = ?",
+                      (site.strip(), normalize_tags(tags), name))
+
+    def forget(self, name):
+        """Remove a switch from the inventory"""
+        self._execute("DELETE FROM switches WHERE name = ?", (name,))
+
+    def get(self, name):
+        rows = self._query("SELECT * FROM switches WHERE name = ?", (name,))
+        return rows[0] if rows else None
+
+    def recent(self, limit=20):
+        """Return the most recently used switches"""
+        return self._query(
+            "SELECT * FROM switches WHERE last_seen IS NOT NULL ORDER BY last_seen DESC LIMIT ?", (limit,))
+
+    def search(self, text, limit=50):
+        """Return switches matching every word of text
+
+        A word matches the start of the name, site or host, or any tag.
+        Recently used switches come first.
+        """
+        words = text.split()
+        if not words:
+            return self.recent(limit)
+
+        conditions = []
+        params = []
+        for word in words:
+            # Escape LIKE wildcards so "Gi1_0" matches literally
+            escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(
+                "(name LIKE ? ESCAPE '\\' OR site LIKE ? ESCAPE '\\' OR host LIKE ? ESCAPE '\\'"
+                " OR tags LIKE ? ESCAPE '\\')"
+            )
+            params.extend([escaped + "%"] * 3 + ["%" + escaped + "%"])
+
+        return self._query(
+            f"SELECT * FROM switches WHERE {' AND '.join(conditions)} "
+            "ORDER BY last_seen IS NULL, last_seen DESC, name LIMIT ?",
+            (*params, limit),
+        )
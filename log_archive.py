@@ -0,0 +1,345 @@
+"""
+Indexed archive of the session logs in logging/.
+
+Every log file is indexed once by switch, time span and the words it contains.
+A query first narrows the files down with the index and then only reads the
+few files that can match, so finding "which switch printed err-disabled last
+week" doesn't mean grepping the whole directory. Indexing runs in the
+background and only picks up new or changed files, compressed segments
+included.
+
+    python log_archive.py search err-disabled --since 7d --switch core
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from log_rotation import open_log
+
+LOG_DIR = "logging"
+INDEX_FILENAME = "archive.db"
+
+# Log segments are named {switch}_{YYYYmmdd_HHMMSS}[-N].log, compressed ones end in .gz or .zst
+LOG_FILENAME_RE = re.compile(r"^(?P<switch>.+)_(?P<stamp>\d{8}_\d{6})(?:-\d+)?\.log(?:\.gz|\.zst)?$")
+
+# Each record starts with the logging timestamp, continuation lines don't
+RECORD_TIME_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) - ")
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Seconds between background index updates
+INDEX_INTERVAL = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    switch TEXT NOT NULL COLLATE NOCASE,
+    start_time REAL,
+    end_time REAL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_switch ON files (switch, start_time);
+CREATE INDEX IF NOT EXISTS idx_files_time ON files (start_time, end_time);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (token, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_file ON postings (file_id);
+"""
+
+
+def tokenize(text):
+    return set(TOKEN_RE.findall(text.lower()))
+
+
+def term_tokens(term):
+    """Return (exact tokens, prefix token or None) that a line holding a search term must have
+
+    A term's words match from their start, so its last word may be the start
+    of a longer token, e.g. "disab" of "disabled" or "0" of "Gi1/0/1".
+    """
+    term = term.lower()
+    matches = list(TOKEN_RE.finditer(term))
+    if matches and matches[-1].end() == len(term):
+        return {match.group(0) for match in matches[:-1]}, matches[-1].group(0)
+    return {match.group(0) for match in matches}, None
+
+
+def term_pattern(term):
+    """Return a regex finding a search term in a lowercased line, its first word matched from its start"""
+    term = term.lower()
+    boundary = r"(?<![a-z0-9])" if TOKEN_RE.match(term) else ""
+    return re.compile(boundary + re.escape(term))
+
+
+def parse_record_time(line):
+    """Return the epoch time of a log record line, or None for continuation lines"""
+    match = RECORD_TIME_RE.match(line)
+    if not match:
+        return None
+    moment = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
+    return moment.timestamp() + int(match.group(2)) / 1000
+
+
+def parse_time(text, now=None):
+    """Parse a time such as '7d', '12h', '30m', '2024-05-01' or '2024-05-01 13:00' to epoch seconds"""
+    text = text.strip()
+    match = re.fullmatch(r"(\d+)\s*([mhdw])", text)
+    if match:
+        units = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+        now = now or datetime.now()
+        return (now - timedelta(**{units[match.group(2)]: int(match.group(1))})).timestamp()
+
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {text}")
+
+
+def iter_records(path):
+    """Yield (timestamp, line) for each line of a log file
+
+    Continuation lines of multi-line records carry the time of their record.
+    """
+    current_time = None
+    with open_log(path) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            record_time = parse_record_time(line)
+            if record_time is not None:
+                current_time = record_time
+            yield current_time, line
+
+
+class LogArchive:
+    """Index of the log files in a directory"""
+
+    def __init__(self, log_dir=LOG_DIR, index_path=None):
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(index_path or os.path.join(log_dir, INDEX_FILENAME), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def update(self):
+        """Index new and changed log files and forget deleted ones
+
+        Returns the number of files (re)indexed.
+        """
+        with self._lock:
+            known = {row["path"]: (row["size"], row["mtime"])
+                     for row in self._db.execute("SELECT path, size, mtime FROM files")}
+
+        indexed = 0
+        present = set()
+        with os.scandir(self.log_dir) as entries:
+            for entry in entries:
+                match = LOG_FILENAME_RE.match(entry.name)
+                if not match or not entry.is_file():
+                    continue
+
+                present.add(entry.path)
+                stat = entry.stat()
+                if known.get(entry.path) == (stat.st_size, stat.st_mtime):
+                    continue
+
+                try:
+                    self._index_file(entry.path, match.group("switch"), stat)
+                    indexed += 1
+                except OSError:
+                    # The file may have been removed while we were reading it
+                    continue
+
+        removed = set(known) - present
+        if removed:
+            with self._lock, self._db:
+                for path in removed:
+                    self._delete_file(path)
+
+        return indexed
+
+    def _index_file(self, path, switch, stat):
+        tokens = set()
+        start_time = end_time = None
+        for record_time, line in iter_records(path):
+            tokens |= tokenize(line)
+            if record_time is not None:
+                start_time = record_time if start_time is None else start_time
+                end_time = record_time
+
+        with self._lock, self._db:
+            self._delete_file(path)
+            file_id = self._db.execute(
+                "INSERT INTO files (path, switch, start_time, end_time, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, switch, start_time, end_time, stat.st_size, stat.st_mtime),
+            ).lastrowid
+            self._db.executemany("INSERT INTO postings (token, file_id) VALUES (?, ?)",
+                                 ((token, file_id) for token in tokens))
+
+    def _delete_file(self, path):
+        row = self._db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM postings WHERE file_id = ?", (row["id"],))
+            self._db.execute("DELETE FROM files WHERE id = ?", (row["id"],))
+
+    def candidate_files(self, text="", switch=None, since=None, until=None):
+        """Return the indexed files that may hold matching lines, newest first"""
+        conditions = []
+        params = []
+
+        exact = set()
+        prefixes = set()
+        for term in text.split():
+            term_exact, term_prefix = term_tokens(term)
+            exact |= term_exact
+            if term_prefix:
+                prefixes.add(term_prefix)
+
+        for token in exact:
+            conditions.append("id IN (SELECT file_id FROM postings WHERE token = ?)")
+            params.append(token)
+        # Tokens are [a-z0-9] only, so they need no GLOB escaping and the prefix scan uses the index
+        for prefix in prefixes - exact:
+            conditions.append("id IN (SELECT file_id FROM postings WHERE token GLOB ?)")
+            params.append(prefix + "*")
+        if switch:
+            # Escape LIKE wildcards so "core_1" matches literally
+            escaped = switch.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("switch LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if since is not None:
+            conditions.append("end_time >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("start_time <= ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            return [dict(row) for row in self._db.execute(
+                f"SELECT * FROM files {where} ORDER BY start_time DESC", params)]
+
+    def search(self, text="", switch=None, since=None, until=None, limit=200):
+        """Return up to limit (timestamp, switch, path, line) matches, newest files first
+
+        Every whitespace separated term of text must appear in the line (case
+        insensitive), its first word matching from the start of a word, so
+        "disab" finds "disabled" and "Gi1/0" finds "Gi1/0/1" but "abled" finds
+        neither. since and until are epoch seconds.
+        """
+        patterns = [term_pattern(term) for term in text.split()]
+        results = []
+
+        for file_info in self.candidate_files(text, switch, since, until):
+            try:
+                for record_time, line in iter_records(file_info["path"]):
+                    if record_time is not None:
+                        if since is not None and record_time < since:
+                            continue
+                        if until is not None and record_time > until:
+                            continue
+
+                    lower = line.lower()
+                    if all(pattern.search(lower) for pattern in patterns):
+                        results.append((record_time, file_info["switch"], file_info["path"], line))
+                        if len(results) >= limit:
+                            return results
+            except OSError:
+                continue
+
+        return results
+
+
+class ArchiveIndexer(threading.Thread):
+    """Keep a log archive's index up to date in the background"""
+
+    def __init__(self, archive, interval=INDEX_INTERVAL, on_error=None):
+        super().__init__(daemon=True)
+        self.archive = archive
+        self.interval = interval
+        self.on_error = on_error
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def run(self):
+        while not self._stopped:
+            try:
+                self.archive.update()
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Index new files now instead of at the next interval"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else "-"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the switch session log archive")
+    parser.add_argument("--log-dir", default=LOG_DIR, help="Directory holding the logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("index", help="Index new and changed log files")
+
+    search_parser = commands.add_parser("search", help="Search the logs")
+    search_parser.add_argument("text", nargs="?", default="", help="Words that must appear in the line")
+    search_parser.add_argument("--switch", help="Only logs of switches whose name contains this")
+    search_parser.add_argument("--since", help="Start time, e.g. 7d, 12h or 2024-05-01")
+    search_parser.add_argument("--until", help="End time, e.g. 1d or 2024-05-08 18:00")
+    search_parser.add_argument("--limit", type=int, default=200, help="Maximum number of lines")
+    args = parser.parse_args(argv)
+
+    archive = LogArchive(args.log_dir)
+    started = time.perf_counter()
+    indexed = archive.update()
+
+    if args.command == "index":
+        print(f"Indexed {indexed} files in {time.perf_counter() - started:.2f}s")
+        return 0
+
+    try:
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until) if args.until else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    results = archive.search(args.text, args.switch, since, until, args.limit)
+    for record_time, switch, path, line in results:
+        print(f"{format_time(record_time)}  {switch}  {line}")
+    print(f"{len(results)} lines in {(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Rotation, compression and retention of the log files.
+
+Logs are written in segments named <prefix>_<YYYYmmdd_HHMMSS>.log. A segment is
+closed once it gets too big or too old and compressed in the background (zstd
+when the zstandard package is installed, gzip otherwise). Old segments are
+deleted by age and by the total size of the log directory, so it stays small
+enough to browse on machines that run the configurator for months.
+
+open_log() reads plain and compressed segments alike.
+"""
+
+import glob
+import gzip
+import io
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+LOG_DIR = "logging"
+
+# Start a new segment when the current one reaches this size or age
+MAX_SEGMENT_BYTES = 10 * 1024 * 1024
+MAX_SEGMENT_AGE = 24 * 60 * 60
+
+# Delete segments older than this, then the oldest ones until the directory fits
+RETENTION_DAYS = 90
+MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
+# Logs nobody has written to for this long are compressed even if never rotated,
+# e.g. sessions from a run that ended without closing its handlers
+STALE_AFTER = 10 * 60
+
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+
+# Paths currently written by a handler, never compressed or deleted
+_active_paths = set()
+_active_lock = threading.Lock()
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def compressed_suffix():
+    """Return the suffix of newly compressed segments"""
+    return ".zst" if _zstandard() else ".gz"
+
+
+def open_log(path):
+    """Open a plain, gzip or zstd compressed log segment for reading as text"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".zst"):
+        zstandard = _zstandard()
+        if not zstandard:
+            raise OSError(f"Reading {os.path.basename(path)} needs the zstandard package")
+        raw = open(path, "rb")
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def compress_file(path):
+    """Compress a log segment next to itself and remove the original
+
+    The compressed file only appears once complete. Returns its path.
+    """
+    target = path + compressed_suffix()
+    temp_path = target + ".tmp"
+    try:
+        with open(path, "rb") as source, open(temp_path, "wb") as raw:
+            zstandard = _zstandard()
+            if zstandard:
+                with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as writer:
+                    shutil.copyfileobj(source, writer)
+            else:
+                with gzip.GzipFile(filename=os.path.basename(path), mode="wb", fileobj=raw) as writer:
+                    shutil.copyfileobj(source, writer)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp_path, target)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    os.remove(path)
+    return target
+
+
+def _is_active(path):
+    with _active_lock:
+        return os.path.abspath(path) in _active_paths
+
+
+def compress_stale_logs(log_dir=LOG_DIR, stale_after=STALE_AFTER, now=None):
+    """Compress plain log files that nothing is writing to any more"""
+    now = now or time.time()
+    compressed = 0
+    for path in glob.glob(os.path.join(log_dir, "*.log")):
+        try:
+            if _is_active(path) or now - os.path.getmtime(path) < stale_after:
+                continue
+            compress_file(path)
+            compressed += 1
+        except OSError:
+            continue
+    return compressed
+
+
+def apply_retention(log_dir=LOG_DIR, retention_days=RETENTION_DAYS, max_total_bytes=MAX_TOTAL_BYTES, now=None):
+    """Delete old segments, then the oldest ones until the directory fits in max_total_bytes
+
+    Returns the number of files deleted.
+    """
+    now = now or time.time()
+    segments = []
+    for pattern in ("*.log", "*.log.gz", "*.log.zst", "*.tmp"):
+        for path in glob.glob(os.path.join(log_dir, pattern)):
+            if _is_active(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            segments.append((stat.st_mtime, stat.st_size, path))
+
+    deleted = 0
+    segments.sort()
+    total = sum(size for _, size, _ in segments)
+    for mtime, size, path in segments:
+        # Leftovers of an interrupted compression go once they're an hour old
+        too_old = now - mtime > retention_days * 86400 or (path.endswith(".tmp") and now - mtime > 3600)
+        if not too_old and total <= max_total_bytes:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        deleted += 1
+    return deleted
+
+
+class LogMaintainer(threading.Thread):
+    """Background worker compressing closed segments and applying retention
+
+    on_error(exception) is called from the worker thread when a pass fails.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, retention_days=RETENTION_DAYS, max_total_bytes=MAX_TOTAL_BYTES,
+                 on_error=None):
+        super().__init__(daemon=True)
+        self.on_error = on_error
+        self.log_dir = log_dir
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self._queue = queue.Queue()
+        self._started_lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._started_lock:
+            if not self.is_alive():
+                self.start()
+
+    def compress(self, path):
+        """Queue a closed segment for compression"""
+        self._queue.put(path)
+        self.ensure_started()
+
+    def sweep(self):
+        """Queue compression of stale logs and a retention pass"""
+        self._queue.put(None)
+        self.ensure_started()
+
+    def run(self):
+        while True:
+            path = self._queue.get()
+            try:
+                if path is None:
+                    compress_stale_logs(self.log_dir)
+                elif os.path.exists(path) and not _is_active(path):
+                    compress_file(path)
+                apply_retention(self.log_dir, self.retention_days, self.max_total_bytes)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+
+
+_log_maintainer = None
+_log_maintainer_lock = threading.Lock()
+
+
+def get_log_maintainer():
+    """Return the shared log maintainer"""
+    global _log_maintainer
+    with _log_maintainer_lock:
+        if _log_maintainer is None:
+            _log_maintainer = LogMaintainer()
+        return _log_maintainer
+
+
+class RotatingLogHandler(logging.FileHandler):
+    """File handler writing <prefix>_<timestamp>.log segments
+
+    A new segment is started when the current one reaches max_bytes or is
+    max_age seconds old. Finished segments, including the last one when the
+    handler is closed, are compressed in the background.
+    """
+
+    def __init__(self, prefix, max_bytes=MAX_SEGMENT_BYTES, max_age=MAX_SEGMENT_AGE, maintainer=None):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.maintainer = maintainer or get_log_maintainer()
+        self.opened_at = time.time()
+        super().__init__(self._segment_path(), encoding="utf-8")
+        self._set_active(None, self.baseFilename)
+
+    def _segment_path(self):
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = f"{self.prefix}_{stamp}.log"
+        counter = 1
+        # Segments rotated within the same second get a counter
+        while any(os.path.exists(path + suffix) for suffix in ("",) + COMPRESSED_SUFFIXES):
+            path = f"{self.prefix}_{stamp}-{counter}.log"
+            counter += 1
+        return os.path.abspath(path)
+
+    @staticmethod
+    def _set_active(old_path, new_path):
+        with _active_lock:
+            _active_paths.discard(old_path)
+            if new_path:
+                _active_paths.add(new_path)
+
+    def should_rotate(self):
+        if self.stream is None:
+            return False
+        return self.stream.tell() >= self.max_bytes or time.time() - self.opened_at >= self.max_age
+
+    def rotate(self):
+        """Close the current segment, queue it for compression and start a new one"""
+        old_path = self.baseFilename
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.baseFilename = self._segment_path()
+        self.opened_at = time.time()
+        self.stream = self._open()
+        self._set_active(old_path, self.baseFilename)
+        self.maintainer.compress(old_path)
+
+    def emit(self, record):
+        # handle() holds the handler lock, so rotating here is safe
+        try:
+            if self.should_rotate():
+                self.rotate()
+        except Exception:
+            self.handleError(record)
+            return
+        super().emit(record)
+
+    def close(self):
+        path = self.baseFilename
+        was_open = self.stream is not None
+        super().close()
+        self._set_active(path, None)
+        if was_open:
+            self.maintainer.compress(path)
@@ -0,0 +1,364 @@
+"""
+Runtime metrics.
+
+A registry of counters, gauges and histograms, each with optional labels,
+shared by the transport, execution and UI code. Modules define their metrics
+where they use them and keep the labelled child for hot paths, so recording
+a value is a lock and an addition.
+
+The registry is exported two ways:
+
+- a Prometheus text endpoint on localhost (http://127.0.0.1:9464/metrics)
+- JSON snapshots appended once a minute to metrics/metrics_<date>.jsonl
+
+    python metrics.py metrics/metrics_20240501.jsonl --last
+"""
+
+import argparse
+import bisect
+import glob
+import json
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+
+METRICS_DIR = "metrics"
+SNAPSHOT_INTERVAL = 60.0
+SNAPSHOT_RETENTION_DAYS = 14
+
+# Seconds, from a fast command round trip to a slow config download
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        # Observations per bucket, not cumulative; the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the seconds its block takes"""
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Metric:
+    """A named metric with a child per combination of label values"""
+
+    def __init__(self, kind, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the child for the given label values, creating it if needed"""
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        """Forget a child, e.g. for a session that was closed"""
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def _new_child(self):
+        if self.kind == COUNTER:
+            return _CounterChild()
+        if self.kind == GAUGE:
+            return _GaugeChild()
+        return _HistogramChild(self.buckets)
+
+    # Unlabelled metrics are used directly
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Registry:
+    """Collection of metrics, each registered once by name"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, kind, name, documentation, labels, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(kind, name, documentation, labels, buckets)
+            elif metric.kind != kind or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(COUNTER, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(GAUGE, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(HISTOGRAM, name, documentation, labels, buckets)
+
+    def metrics(self):
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, child in metric.children():
+                if metric.kind != HISTOGRAM:
+                    lines.append(f"{metric.name}{_label_text(metric.label_names, values)} "
+                                 f"{_format_value(child.value)}")
+                    continue
+
+                with child._lock:
+                    counts, total, count = list(child.counts), child.sum, child.count
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    labels = _label_text(metric.label_names, values, [("le", _format_value(bound))])
+                    lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+                labels = _label_text(metric.label_names, values)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{labels} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Return the metrics as a JSON-ready dict"""
+        metrics = {}
+        for metric in self.metrics():
+            samples = []
+            for values, child in metric.children():
+                sample = {"labels": dict(zip(metric.label_names, values))}
+                if metric.kind == HISTOGRAM:
+                    with child._lock:
+                        sample.update(count=child.count, sum=child.sum,
+                                      buckets=dict(zip([_format_value(b) for b in metric.buckets + (math.inf,)],
+                                                       child.counts)))
+                else:
+                    sample["value"] = child.value
+                samples.append(sample)
+            metrics[metric.name] = {"type": metric.kind, "help": metric.documentation, "samples": samples}
+        return {"time": time.time(), "metrics": metrics}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the shared metrics registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = Registry()
+        return _registry
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.to_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Serve the registry on localhost for Prometheus to scrape"""
+
+    def __init__(self, registry=None, host=METRICS_HOST, port=METRICS_PORT):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.registry = registry or get_registry()
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class SnapshotWriter(threading.Thread):
+    """Append a JSON snapshot of the registry to a daily file every interval"""
+
+    def __init__(self, registry=None, directory=METRICS_DIR, interval=SNAPSHOT_INTERVAL,
+                 retention_days=SNAPSHOT_RETENTION_DAYS, on_error=None):
+        super().__init__(daemon=True)
+        self.registry = registry or get_registry()
+        self.directory = directory
+        self.interval = interval
+        self.retention_days = retention_days
+        self.on_error = on_error
+        self._stopped = threading.Event()
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"metrics_{datetime.now().strftime('%Y%m%d')}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.registry.snapshot(), separators=(",", ":")) + "\n")
+
+        cutoff = time.time() - self.retention_days * 86400
+        for old_path in glob.glob(os.path.join(self.directory, "metrics_*.jsonl")):
+            if os.path.getmtime(old_path) < cutoff:
+                os.remove(old_path)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise metric snapshots")
+    parser.add_argument("path", help="Snapshot file, metrics/metrics_<date>.jsonl")
+    parser.add_argument("--last", action="store_true", help="Only show the last snapshot")
+    parser.add_argument("--metric", help="Only show metrics whose name contains this")
+    args = parser.parse_args(argv)
+
+    with open(args.path, "r", encoding="utf-8") as f:
+        snapshots = [json.loads(line) for line in f if line.strip()]
+    if args.last:
+        snapshots = snapshots[-1:]
+
+    for snapshot in snapshots:
+        print(datetime.fromtimestamp(snapshot["time"]).strftime('%Y-%m-%d %H:%M:%S'))
+        for name, metric in snapshot["metrics"].items():
+            if args.metric and args.metric not in name:
+                continue
+            for sample in metric["samples"]:
+                labels = ",".join(f"{key}={value}" for key, value in sample["labels"].items())
+                if metric["type"] == HISTOGRAM:
+                    mean = sample["sum"] / sample["count"] if sample["count"] else 0
+                    print(f"  {name}{{{labels}}} count={sample['count']} mean={mean:.4f}")
+                else:
+                    print(f"  {name}{{{labels}}} {sample['value']:g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""
+Unattended, windowed execution of plans across many switches.
+
+A job is a compiled plan for one switch with a start time and a window end.
+Jobs are kept in a SQLite database together with how far each one got, so
+after a restart the scheduler carries on where it stopped. Due jobs run on
+the shared transport loop, at most `concurrency` at a time. A job whose
+window closes stops between commands, leaves configuration mode and is
+marked aborted. SSH passwords are only ever held in memory, so SSH jobs
+resumed after a restart wait until the password is entered again.
+
+Jobs scheduled with snapshot set save a rollback point before their first
+command and complete it once they stop, so a rollout can be reverted.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from command_errors import HALT, SKIP, describe_failure, error_action, find_error
+from execution_journal import mode_context
+from metrics import get_registry
+from rollback import (ROLLBACK_DIR, capture_running_config, complete_rollback_point, new_rollback_point,
+                      read_rollback_point, rollback_path, write_rollback_point)
+from session_recording import SessionRecorder, recording_path
+from transport import (DEFAULT_RESPONSES, PASSWORD_PROMPT, PROMPT_PATTERN, get_transport_loop,
+                       transport_from_settings, wait_for_prompt)
+
+DEFAULT_DB_PATH = os.path.join("schedules", "schedules.db")
+
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    switch TEXT NOT NULL,
+    connection TEXT NOT NULL,
+    commands TEXT NOT NULL,
+    start_at REAL NOT NULL,
+    window_end REAL NOT NULL,
+    state TEXT NOT NULL,
+    next_command INTEGER NOT NULL DEFAULT 0,
+    on_error TEXT NOT NULL DEFAULT 'halt',
+    sources TEXT NOT NULL DEFAULT '[]',
+    snapshot INTEGER NOT NULL DEFAULT 0,
+    rollback_point TEXT NOT NULL DEFAULT '',
+    error TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, start_at);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ABORTED = "aborted"
+EXPIRED = "expired"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, ABORTED, EXPIRED, CANCELLED)
+
+DEFAULT_CONCURRENCY = 10
+
+# Seconds between looks for due jobs
+POLL_INTERVAL = 1.0
+
+# Seconds to wait for the prompt after each command
+COMMAND_TIMEOUT = 30.0
+
+_metrics = get_registry()
+RUNNING_JOBS = _metrics.gauge("scheduler_running_jobs", "Scheduled jobs running now")
+FINISHED_JOBS = _metrics.counter("scheduler_finished_jobs_total", "Scheduled jobs finished, by final state", ("state",))
+
+# Columns added after the first version, with their definitions
+ADDED_COLUMNS = {
+    "on_error": "TEXT NOT NULL DEFAULT 'halt'",
+    "sources": "TEXT NOT NULL DEFAULT '[]'",
+    "snapshot": "INTEGER NOT NULL DEFAULT 0",
+    "rollback_point": "TEXT NOT NULL DEFAULT ''",
+}
+
+
+def _job(row):
+    job = dict(row)
+    job['connection'] = json.loads(job['connection'])
+    job['commands'] = json.loads(job['commands'])
+    job['sources'] = json.loads(job['sources'])
+    return job
+
+
+class PlanScheduler:
+    """Persistent queue of scheduled plans, run on the transport loop"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, on_update=None, record_sessions=True, rollback_dir=ROLLBACK_DIR):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # on_update(job) is called from the transport loop whenever a job changes
+        self.on_update = on_update
+        self.record_sessions = record_sessions
+        self.rollback_dir = rollback_dir
+
+        # Job id -> SSH password, never written to disk
+        self._passwords = {}
+        # Job id -> running asyncio task
+        self._running = {}
+        self._stopped = False
+        self._loop_future = None
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+            # Version 2 added the error policy and where each command came from, version 3 rollback points
+            columns = {row['name'] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            # Jobs that were running when the app stopped carry on from their last acknowledged command
+            self._db.execute("UPDATE jobs SET state = ? WHERE state = ?", (PENDING, RUNNING))
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [_job(row) for row in self._db.execute(sql, params)]
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._db:
+            return self._db.execute(sql, params)
+
+    @property
+    def concurrency(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM settings WHERE key = 'concurrency'").fetchone()
+        return int(row['value']) if row else DEFAULT_CONCURRENCY
+
+    @concurrency.setter
+    def concurrency(self, value):
+        self._execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('concurrency', ?)",
+                      (str(max(1, int(value))),))
+
+    def schedule(self, switch, connection, commands, start_at, window_end, password=None,
+                 on_error=HALT, sources=None, snapshot=False):
+        """Queue a plan for a switch and return the job id
+
+        connection holds the inventory style settings (connection_type, host,
+        username, ssh_port, com_port, baudrate). password is kept in memory only.
+        on_error is the command_errors policy for rejected commands and sources
+        optionally gives the (item name, line) each command came from. With
+        snapshot set the job saves a rollback point before it changes anything.
+        """
+        if window_end <= start_at:
+            raise ValueError("The window must end after it starts")
+        if not commands:
+            raise ValueError("The plan has no commands")
+
+        job_id = self._execute(
+            "INSERT INTO jobs (switch, connection, commands, start_at, window_end, state, on_error, sources, "
+            "snapshot, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (switch, json.dumps(connection), json.dumps(commands), start_at, window_end, PENDING, on_error,
+             json.dumps(sources or []), int(snapshot), time.time()),
+        ).lastrowid
+        if password:
+            self._passwords[job_id] = password
+        return job_id
+
+    def set_password(self, job_id, password):
+        """Provide the SSH password for a job, e.g. after a restart"""
+        self._passwords[job_id] = password
+
+    def needs_password(self, job):
+        return job['connection'].get('connection_type') == "SSH" and job['id'] not in self._passwords
+
+    def cancel(self, job_id):
+        """Cancel a job, stopping it between commands if it is running"""
+        self._execute("UPDATE jobs SET state = ?, finished = ? WHERE id = ? AND state = ?",
+                      (CANCELLED, time.time(), job_id, PENDING))
+        task = self._running.get(job_id)
+        if task:
+            get_transport_loop().loop.call_soon_threadsafe(task.cancel)
+
+    def remove_finished(self):
+        """Forget finished jobs"""
+        placeholders = ", ".join("?" * len(FINISHED_STATES))
+        self._execute(f"DELETE FROM jobs WHERE state IN ({placeholders})", FINISHED_STATES)
+
+    def get(self, job_id):
+        jobs = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def jobs(self):
+        """Return all jobs, unfinished ones first"""
+        return self._query("SELECT * FROM jobs ORDER BY finished IS NOT NULL, start_at, id")
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        if fields.get('state') in FINISHED_STATES:
+            FINISHED_JOBS.labels(fields['state']).inc()
+        if self.on_update:
+            self.on_update(self.get(job_id))
+
+    def start(self):
+        """Start running due jobs on the transport loop"""
+        if self._loop_future is None:
+            self._stopped = False
+            self._loop_future = get_transport_loop().submit(self._run())
+
+    def stop(self):
+        self._stopped = True
+
+    async def _run(self):
+        while not self._stopped:
+            now = time.time()
+            due = self._query("SELECT * FROM jobs WHERE state = ? AND start_at <= ? ORDER BY start_at, id",
+                              (PENDING, now))
+            budget = self.concurrency - len(self._running)
+
+            for job in due:
+                if job['window_end'] <= now:
+                    self._update(job['id'], state=EXPIRED, error="The window closed before the job could start",
+                                 finished=now)
+                elif budget > 0 and job['id'] not in self._running and not self.needs_password(job):
+                    self._running[job['id']] = asyncio.ensure_future(self._run_job(job))
+                    budget -= 1
+
+            RUNNING_JOBS.set(len(self._running))
+
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _make_transport(self, job):
+        return transport_from_settings(job['connection'], self._passwords.get(job['id']))
+
+    async def _run_job(self, job):
+        job_id = job['id']
+        transport = None
+        prompt = ""
+        point_path = job['rollback_point']
+        self._update(job_id, state=RUNNING, error="")
+
+        try:
+            transport = self._make_transport(job)
+            if self.record_sessions:
+                transport.recorder = SessionRecorder(recording_path(job['switch']), switch=job['switch'],
+                                                     transport=transport.description, job=job_id)
+            await transport.open()
+
+            prompt = await wait_for_prompt(transport, timeout=5.0)
+            if not prompt:
+                raise TimeoutError("no prompt from the switch")
+
+            if job['snapshot'] and not point_path and job['next_command'] == 0:
+                point_path = await self._save_rollback_point(job, transport)
+
+            commands = job['commands']
+            if job['next_command']:
+                prompt = await self._restore_mode(transport, commands[:job['next_command']]) or prompt
+
+            skipped = []
+            for index in range(job['next_command'], len(commands)):
+                attempts = 0
+                while True:
+                    if time.time() >= job['window_end']:
+                        await self._leave_config_mode(transport, prompt)
+                        self._update(job_id, state=ABORTED, finished=time.time(),
+                                     error=f"The window closed after {index} of {len(commands)} commands")
+                        return
+
+                    result = await transport.send_and_expect(commands[index], [PROMPT_PATTERN, PASSWORD_PROMPT],
+                                                             COMMAND_TIMEOUT, DEFAULT_RESPONSES)
+                    prompt = result.match.group(0).strip()
+                    attempts += 1
+
+                    error = find_error(result.output)
+                    if not error:
+                        break
+
+                    source = job['sources'][index] if index < len(job['sources']) else None
+                    description = describe_failure(commands[index], error, *(source or (None, index + 1)))
+                    action = error_action(job['on_error'], attempts)
+                    if action == SKIP:
+                        skipped.append(description)
+                        break
+                    if action == HALT:
+                        await self._leave_config_mode(transport, prompt)
+                        self._update(job_id, state=FAILED, error=description, finished=time.time())
+                        return
+                    # RETRY sends the same command again
+
+                self._update(job_id, next_command=index + 1, error="; ".join(skipped))
+
+            self._update(job_id, state=DONE, finished=time.time())
+
+        except asyncio.CancelledError:
+            if transport and not transport.closed:
+                await self._leave_config_mode(transport, prompt)
+            self._update(job_id, state=CANCELLED, finished=time.time())
+        except Exception as e:
+            self._update(job_id, state=FAILED, error=str(e) or e.__class__.__name__, finished=time.time())
+        finally:
+            self._running.pop(job_id, None)
+            if transport:
+                if point_path and not transport.closed:
+                    await self._complete_rollback_point(point_path, transport)
+                await transport.close()
+
+    @staticmethod
+    async def _restore_mode(transport, done_commands):
+        """Re-enter the configuration mode a resumed job stopped in, returning the last prompt
+
+        A resumed job starts on a fresh session at the EXEC prompt, while its
+        next command may belong to an interface or another submode.
+        """
+        prompt = None
+        for command in mode_context(done_commands):
+            result = await transport.send_and_expect(command, PROMPT_PATTERN, COMMAND_TIMEOUT)
+            error = find_error(result.output)
+            if error:
+                raise RuntimeError(f"Could not re-enter '{command}' to resume: {error}")
+            prompt = result.match.group(0).strip()
+        return prompt
+
+    async def _save_rollback_point(self, job, transport):
+        """Save the running-config before a job changes it and return the rollback point's path"""
+        config, archive = await capture_running_config(transport, archive=True)
+        items = list(dict.fromkeys(source[0] for source in job['sources'] if source))
+        point = new_rollback_point(job['switch'], config, archive, job['connection'], items, job['commands'])
+        path = rollback_path(job['switch'], self.rollback_dir)
+        await asyncio.get_running_loop().run_in_executor(None, write_rollback_point, path, point)
+        self._update(job['id'], rollback_point=path)
+        return path
+
+    @staticmethod
+    async def _complete_rollback_point(path, transport):
+        """Add the config after a job and its inverse plan to the job's rollback point"""
+        loop = asyncio.get_running_loop()
+        try:
+            config, _ = await capture_running_config(transport)
+            point = await loop.run_in_executor(None, read_rollback_point, path)
+            await loop.run_in_executor(None, write_rollback_point, path, complete_rollback_point(point, config))
+        except Exception:
+            # The point can still be reverted from its archive copy, if any
+            pass
+
+    @staticmethod
+    async def _leave_config_mode(transport, prompt):
+        """Return to privileged EXEC mode if the last prompt was a configuration one"""
+        if prompt.endswith(")#"):
+            try:
+                await transport.send_and_expect("end", PROMPT_PATTERN, COMMAND_TIMEOUT)
+            except Exception:
+                pass
+
@@ -0,0 +1,274 @@
+"""
+Interface range and list expansion for batch configuration inputs.
+
+Lets a single preview item cover many ports or VLANs, e.g. an interface input of
+"Gi1/0/1-48, Gi2/0/1-24" or a VLAN input of "10,20-25". Identical per-port
+blocks are coalesced into "interface range" commands where IOS allows it.
+
+What a list means depends on the commands that use the input. Inputs of
+commands that take a range or list themselves, such as "interface range {x}"
+or "switchport trunk allowed vlan {x}", are passed through as typed. Number
+lists are only expanded for commands that create one object per value, such
+as "vlan {x}"; a list for a command that holds a single value, such as
+"switchport access vlan {x}", is rejected since each block would overwrite
+the one before it.
+"""
+
+import itertools
+import re
+import sys
+
+# IOS accepts at most five ranges in one "interface range" command
+MAX_RANGES_PER_COMMAND = 5
+
+# One interface or interface range, e.g. "Gi1/0/1", "Gi1/0/1-48" or "GigabitEthernet1/0/1 - 48"
+INTERFACE_RANGE_RE = re.compile(r"^(?P<prefix>[A-Za-z][A-Za-z\-]*\s*(?:\d+/)*)(?P<start>\d+)(?:\s*-\s*(?P<end>\d+))?$")
+
+# One number or number range, e.g. "10" or "20-25"
+NUMBER_RANGE_RE = re.compile(r"^(?P<start>\d+)(?:\s*-\s*(?P<end>\d+))?$")
+
+# Commands that take a range or list of their own, {} standing for the input
+NATIVE_LIST_COMMANDS = (
+    r"interface range {}",
+    r"switchport trunk allowed vlan(?: add| remove| except)? {}",
+    r"spanning-tree(?: mst \d+)? vlan {}(?: .*)?",
+    r"instance \d+ vlan {}",
+    r"no vlan {}",
+)
+
+# Commands that create one object per number, so a list makes one block per value
+PER_VALUE_COMMANDS = (
+    r"vlan {}",
+)
+
+# How a range or list input is rendered
+NATIVE = "native"
+RANGE = "range"
+EXPAND = "expand"
+
+
+def is_interface_input(input_name):
+    """Tell whether an input holds an interface name"""
+    return "interface" in input_name
+
+
+def is_batch_value(input_field, value):
+    """Tell whether an input value is a range or list rather than a single value"""
+    value = str(value)
+    if is_interface_input(input_field["name"]):
+        return "," in value or bool(re.search(r"\d\s*-\s*\d+\s*$", value))
+    if input_field["type"] == "int":
+        return bool(re.fullmatch(r"[\d\s,\-]+", value)) and ("," in value or "-" in value)
+    return False
+
+
+def _uses(commands, input_name):
+    placeholder = "{" + input_name + "}"
+    return [cmd.strip() for cmd in commands if placeholder in cmd]
+
+
+def _all_match(uses, patterns, input_name):
+    placeholder = re.escape("{" + input_name + "}")
+    regexes = [re.compile(pattern.replace("{}", placeholder) + "$") for pattern in patterns]
+    return bool(uses) and all(any(regex.match(use) for regex in regexes) for use in uses)
+
+
+def batch_mode(commands, input_field):
+    """Return how the commands render a range or list in an input
+
+    NATIVE passes the value through, RANGE turns it into "interface range"
+    commands, EXPAND repeats the commands once per value and None means the
+    commands only take a single value.
+    """
+    name = input_field["name"]
+    uses = _uses(commands, name)
+    if _all_match(uses, NATIVE_LIST_COMMANDS, name):
+        return NATIVE
+    if is_interface_input(name):
+        return RANGE if _coalesces_interface(commands, name) else EXPAND
+    if _all_match(uses, PER_VALUE_COMMANDS, name):
+        return EXPAND
+    return None
+
+
+def _parse_ranges(text, regex, what):
+    """Yield (prefix, start, end) for each comma separated range"""
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+
+        match = regex.match(part)
+        if not match:
+            raise ValueError(f"'{part}' is not a valid {what}")
+
+        start = int(match.group("start"))
+        end = int(match.group("end") or start)
+        if end < start:
+            raise ValueError(f"'{part}' ends before it starts")
+
+        yield match.groupdict().get("prefix", ""), start, end
+
+
+def expand_interfaces(text):
+    """Yield each interface in a list of interfaces and ranges"""
+    for prefix, start, end in _parse_ranges(text, INTERFACE_RANGE_RE, "interface or interface range"):
+        prefix = prefix.replace(" ", "")
+        for port in range(start, end + 1):
+            yield f"{prefix}{port}"
+
+
+def expand_numbers(text):
+    """Yield each number in a list of numbers and ranges such as a VLAN list"""
+    for _, start, end in _parse_ranges(text, NUMBER_RANGE_RE, "number or number range"):
+        yield from range(start, end + 1)
+
+
+def compress_interfaces(interfaces):
+    """Collapse consecutive interfaces into IOS range syntax, e.g. "Gi1/0/1 - 48" """
+    ranges = []
+    current = None
+
+    for interface in interfaces:
+        match = INTERFACE_RANGE_RE.match(interface)
+        prefix, port = match.group("prefix"), int(match.group("start"))
+
+        if current and current[0] == prefix and port == current[2] + 1:
+            current[2] = port
+            continue
+
+        if current:
+            ranges.append(current)
+        current = [prefix, port, port]
+
+    if current:
+        ranges.append(current)
+
+    return [f"{prefix}{start}" if start == end else f"{prefix}{start} - {end}" for prefix, start, end in ranges]
+
+
+def validate_batch_value(input_field, value, commands):
+    """Raise ValueError if a range or list value can't be used by the commands"""
+    mode = batch_mode(commands, input_field)
+    if mode == NATIVE:
+        # The switch checks what it is given
+        return
+    if mode is None:
+        raise ValueError("these commands take a single value, not a range or list")
+
+    values = expand_interfaces(value) if is_interface_input(input_field["name"]) else expand_numbers(value)
+    if next(values, None) is None:
+        raise ValueError("the list is empty")
+    for _ in values:
+        pass
+
+
+def find_batch_inputs(input_fields, values, commands):
+    """Return the names of the inputs whose ranges or lists are expanded when rendering
+
+    Inputs whose commands take the range or list as it is are left out.
+    """
+    return [field["name"] for field in input_fields
+            if field["name"] in values and is_batch_value(field, values[field["name"]])
+            and batch_mode(commands, field) != NATIVE]
+
+
+def _coalesces_interface(commands, input_name):
+    """Tell whether every use of an interface input is an "interface {x}" line"""
+    return _all_match(_uses(commands, input_name), [r"interface {}"], input_name)
+
+
+def render_commands(commands, values, batch_inputs=()):
+    """Yield the formatted commands, expanding range and list inputs lazily
+
+    batch_inputs come from find_batch_inputs. Each combination of list values
+    produces one block of commands. An interface range produces a single
+    "interface range" block per group of ranges when the interface is only used
+    to enter interface configuration, otherwise one block per port. Raises
+    KeyError if a command references a missing input.
+    """
+    if not batch_inputs:
+        for cmd in commands:
+            yield cmd.format(**values)
+        return
+
+    interface_inputs = [name for name in batch_inputs if is_interface_input(name)]
+    number_inputs = [name for name in batch_inputs if not is_interface_input(name)]
+
+    # Interfaces only used in "interface {x}" lines collapse into interface ranges
+    range_inputs = [name for name in interface_inputs if _coalesces_interface(commands, name)]
+    port_inputs = [name for name in interface_inputs if name not in range_inputs]
+
+    choices = []
+    for name in range_inputs:
+        ranges = compress_interfaces(expand_interfaces(values[name]))
+        choices.append([
+            "range " + ", ".join(ranges[i:i + MAX_RANGES_PER_COMMAND])
+            for i in range(0, len(ranges), MAX_RANGES_PER_COMMAND)
+        ])
+    for name in port_inputs:
+        choices.append(expand_interfaces(values[name]))
+    for name in number_inputs:
+        choices.append(expand_numbers(values[name]))
+
+    names = range_inputs + port_inputs + number_inputs
+    for combination in itertools.product(*choices):
+        block_values = dict(values, **dict(zip(names, combination)))
+        for cmd in commands:
+            yield cmd.format(**block_values)
+
+
+# Values used by check_catalog, single and as a range or list
+SAMPLE_INTERFACE = ("Gi1/0/1", "Gi1/0/1-4")
+SAMPLE_NUMBER = ("10", "10,20-21")
+
+
+def check_catalog(catalog):
+    """Return a description of each catalog item input that renders ranges or lists wrongly
+
+    A single value must render exactly as plain formatting does, and so must a
+    range or list passed through to a command that takes one. Any other range
+    or list must either be rejected or render without errors.
+    """
+    problems = []
+    for category, items in catalog.items():
+        for item in items:
+            commands = item["command"] if isinstance(item["command"], list) else [item["command"]]
+            fields = item.get("inputs", [])
+            singles = {field["name"]: (SAMPLE_INTERFACE[0] if is_interface_input(field["name"]) else
+                                       SAMPLE_NUMBER[0] if field["type"] == "int" else "x")
+                       for field in fields}
+
+            def render(values):
+                return list(render_commands(commands, values, find_batch_inputs(fields, values, commands)))
+
+            expected = [cmd.format(**singles) for cmd in commands]
+            if render(singles) != expected:
+                problems.append(f"{category} > {item['name']}: single values render differently")
+
+            for field in fields:
+                if not is_interface_input(field["name"]) and field["type"] != "int":
+                    continue
+                value = SAMPLE_INTERFACE[1] if is_interface_input(field["name"]) else SAMPLE_NUMBER[1]
+                values = dict(singles, **{field["name"]: value})
+                try:
+                    validate_batch_value(field, value, commands)
+                except ValueError:
+                    continue
+
+                rendered = render(values)
+                if batch_mode(commands, field) == NATIVE and rendered != [cmd.format(**values) for cmd in commands]:
+                    problems.append(f"{category} > {item['name']}: {field['name']} is not passed through")
+                elif not rendered:
+                    problems.append(f"{category} > {item['name']}: {field['name']} renders nothing")
+    return problems
+
+
+if __name__ == "__main__":
+    from config_data import CONFIG_DATA
+
+    found = check_catalog(CONFIG_DATA)
+    for problem in found:
+        print(problem)
+    print(f"{len(found)} problem(s) in the catalog")
+    sys.exit(1 if found else 0)
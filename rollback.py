@@ -0,0 +1,442 @@
+"""
+Rollback points for executed plans.
+
+Before a plan runs, the switch's running-config is saved as a rollback point.
+Once the plan has finished, or stopped, the running-config is read again and
+the two are compared section by section to build the inverse plan: "no" forms
+for the lines the plan added and the original lines for the ones it changed or
+removed, each under the mode it belongs to. Both configs are parsed in one
+pass into a tree keyed by line, so the comparison is linear in their size.
+
+When the switch has "archive" configured (see "Configuration Archiving") an
+archive copy is taken as well, and the point can instead be reverted with
+"configure replace" against that copy, which also covers what the inverse
+plan can't express.
+
+Points are JSON files in the rollback folder, written atomically.
+"""
+
+import asyncio
+import collections
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from command_errors import find_error
+from transport import Transport, TransportError, wait_for_prompt
+
+ROLLBACK_DIR = "rollback"
+
+ROLLBACK_VERSION = 1
+
+# Seconds to wait for the whole running-config to arrive
+CAPTURE_TIMEOUT = 120.0
+
+# Revert methods
+INVERSE = "inverse"
+REPLACE = "replace"
+
+# Seconds a scheduled revert has to start and finish
+REVERT_WINDOW = 60 * 60
+
+# Lines that change without anyone changing the configuration
+VOLATILE_RE = re.compile(r"^(?:Building configuration|Current configuration|ntp clock-period|end\s*$)")
+
+MOST_RECENT_ARCHIVE_RE = re.compile(r"^\s*\d+\s+(\S+)\s+<-\s*Most Recent", re.MULTILINE | re.IGNORECASE)
+
+BANNER_RE = re.compile(r"^banner\s+(\S+)\s+(\^C|\S)")
+
+# Lines removed by their key alone, so secrets never appear in a "no" command
+KEYED_NO_FORMS = (
+    re.compile(r"^username\s+\S+"),
+    re.compile(r"^enable\s+(?:secret|password)(?:\s+level\s+\d+)?"),
+    re.compile(r"^snmp-server\s+community\s+\S+"),
+)
+
+# Delimiters tried, in order, when a banner is sent back to the switch
+BANNER_DELIMITERS = "#%$@~"
+
+ConfigLine = collections.namedtuple("ConfigLine", ["text", "children"])
+
+
+def parse_config(text):
+    """Parse a running-config into a list of ConfigLine trees
+
+    Sections are found by indentation. Comments and lines that change on
+    their own are left out, and a multi-line banner becomes a single line.
+    """
+    root = []
+    # (indent, children) of the open sections
+    stack = [(-1, root)]
+    lines = text.replace("\r", "").split("\n")
+    position = 0
+
+    while position < len(lines):
+        raw = lines[position].rstrip()
+        position += 1
+        stripped = raw.lstrip()
+        if not stripped or stripped.startswith("!") or VOLATILE_RE.match(stripped):
+            continue
+
+        banner = BANNER_RE.match(stripped)
+        if banner:
+            # Everything up to the closing delimiter belongs to the banner
+            delimiter = banner.group(2)
+            body = [stripped]
+            if stripped.count(delimiter) < 2:
+                while position < len(lines):
+                    body.append(lines[position].rstrip())
+                    position += 1
+                    if delimiter in body[-1]:
+                        break
+            stripped = "\n".join(body)
+
+        indent = len(raw) - len(raw.lstrip())
+        while stack[-1][0] >= indent:
+            stack.pop()
+        node = ConfigLine(stripped, [])
+        stack[-1][1].append(node)
+        stack.append((indent, node.children))
+
+    return root
+
+
+class CaptureError(TransportError):
+    """Raised when a running-config can't be read completely"""
+
+
+def config_text(output):
+    """Return the configuration part of "show running-config" output
+
+    Raises CaptureError unless the output is a whole config, from its
+    "Current configuration" header to its final "end".
+    """
+    error = find_error(output)
+    if error:
+        raise CaptureError(f"show running-config failed: {error}")
+
+    lines = output.replace("\r", "").split("\n")
+    for index, line in enumerate(lines):
+        if line.startswith("Current configuration"):
+            config = lines[index + 1:]
+            if "end" not in (line.strip() for line in config):
+                raise CaptureError("The running-config was cut short")
+            return "\n".join(config)
+    raise CaptureError("The output of show running-config has no configuration")
+
+
+def negate(line):
+    """Return the command that undoes a configuration line"""
+    banner = BANNER_RE.match(line)
+    if banner:
+        return f"no banner {banner.group(1)}"
+    for keyed in KEYED_NO_FORMS:
+        key = keyed.match(line)
+        if key:
+            return "no " + key.group(0)
+    if line.startswith("no "):
+        return line[3:]
+    return "no " + line
+
+
+def restore(line):
+    """Return the command that puts a configuration line back"""
+    banner = BANNER_RE.match(line)
+    if not banner:
+        return line
+
+    # Send banners with a delimiter the switch reads as one character
+    first, _, rest = line.partition("\n")
+    text = first[banner.end():] + ("\n" + rest if rest else "")
+    text = text.replace(banner.group(2), "")
+    delimiter = next((c for c in BANNER_DELIMITERS if c not in text), BANNER_DELIMITERS[0])
+    return f"banner {banner.group(1)} {delimiter}{text}{delimiter}"
+
+
+def _restore_section(node):
+    commands = [restore(node.text)]
+    for child in node.children:
+        commands.extend(_restore_section(child))
+    if node.children:
+        commands.append("exit")
+    return commands
+
+
+def _inverse(before, after):
+    before_lines = {node.text: node for node in before}
+    after_lines = {node.text: node for node in after}
+    commands = []
+    sent = set()
+
+    # Keyed lines the plan changed are put back below, which replaces them without a "no"
+    replaced = {negate(node.text) for node in before if node.text not in after_lines}
+
+    # Take out what the plan added, latest first so dependent lines go before what they depend on
+    for node in reversed(after):
+        if node.text not in before_lines and negate(node.text) not in replaced:
+            command = negate(node.text)
+            commands.append(command)
+            sent.add(command)
+
+    for node in before:
+        if node.text not in after_lines:
+            # The plan changed or removed this line, put it back with its section
+            if node.text not in sent:
+                commands.extend(_restore_section(node))
+        elif node.children or after_lines[node.text].children:
+            section = _inverse(node.children, after_lines[node.text].children)
+            if section:
+                commands.extend([node.text] + section + ["exit"])
+
+    return commands
+
+
+def inverse_plan(before, after):
+    """Return the commands that take a switch from the after config back to the before config
+
+    before and after are running-config texts. An empty list means the
+    configs match.
+    """
+    commands = _inverse(parse_config(before), parse_config(after))
+    if not commands:
+        return []
+    return ["configure terminal"] + commands + ["end"]
+
+
+def replace_plan(archive):
+    """Return the commands that revert a switch to an archived config"""
+    return [f"configure replace {archive} force"]
+
+
+def has_archive(config):
+    """Tell whether a running-config has an archive path configured"""
+    return any(node.text == "archive" and any(child.text.startswith("path ") for child in node.children)
+               for node in parse_config(config))
+
+
+def most_recent_archive(output):
+    """Return the newest archive file listed by "show archive", or None"""
+    match = MOST_RECENT_ARCHIVE_RE.search(output)
+    return match.group(1) if match else None
+
+
+async def capture_running_config(transport, timeout=CAPTURE_TIMEOUT, archive=False):
+    """Read the running-config of a switch, returning (config, archive file or None)
+
+    With archive True and archiving configured on the switch, an archive copy
+    is taken as well and its file name returned with the config. Raises
+    CaptureError outside privileged mode or when the config can't be read
+    completely, since a partial config would make the inverse plan remove
+    everything missing from it.
+    """
+    prompt = await wait_for_prompt(transport, timeout=10.0)
+    if not prompt:
+        raise TransportError(f"No prompt from {transport.description}")
+    if not prompt.endswith("#"):
+        raise CaptureError(f"{transport.description} is not in privileged EXEC mode")
+    # EXEC commands need "do" in configuration mode
+    prefix = "do " if prompt.endswith(")#") else ""
+    prompt_pattern = re.compile(re.escape(prompt) + r"\s*$")
+
+    result = await transport.send_and_expect(prefix + "terminal length 0", prompt_pattern, 10.0)
+    error = find_error(result.output)
+    if error:
+        raise CaptureError(f"terminal length 0 failed: {error}")
+    result = await transport.send_and_expect(prefix + "show running-config", prompt_pattern, timeout)
+    config = config_text(result.before)
+
+    archive_file = None
+    if archive and has_archive(config):
+        await transport.send_and_expect(prefix + "archive config", prompt_pattern, timeout)
+        result = await transport.send_and_expect(prefix + "show archive", prompt_pattern, 10.0)
+        archive_file = most_recent_archive(result.before)
+
+    return config, archive_file
+
+
+def rollback_path(switch_name, directory=ROLLBACK_DIR):
+    """Return a new rollback point file name for a switch"""
+    safe_name = "".join(c for c in switch_name if c.isalnum() or c in (' ', '-', '_')).strip().replace(' ', '_')
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(directory, f"{safe_name or 'switch'}_{stamp}.json")
+    counter = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{safe_name or 'switch'}_{stamp}-{counter}.json")
+        counter += 1
+    return path
+
+
+def new_rollback_point(switch, before, archive=None, connection=None, items=None, commands=None):
+    """Return a rollback point for a plan about to run"""
+    return {
+        "version": ROLLBACK_VERSION,
+        "switch": switch,
+        "connection": connection,
+        "items": list(items or []),
+        "commands": list(commands or []),
+        "created": time.time(),
+        "before": before,
+        "archive": archive,
+        "after": None,
+        "inverse": None,
+        "reverted": None,
+    }
+
+
+def _check_config(config, which):
+    # Points saved from a failed capture would revert to an empty switch
+    if not config or find_error(config) or not parse_config(config):
+        raise CaptureError(f"The {which} config of the rollback point is not a usable running-config")
+
+
+def complete_rollback_point(point, after):
+    """Record the config after the plan and the inverse plan it leads to
+
+    Raises CaptureError if either config is not a usable running-config.
+    """
+    _check_config(point["before"], "before")
+    _check_config(after, "after")
+    point["after"] = after
+    point["inverse"] = inverse_plan(point["before"], after)
+    return point
+
+
+def revert_plan(point, method=None):
+    """Return (method, commands) to revert a rollback point, or (None, []) if it can't be reverted
+
+    The inverse plan is preferred unless method asks for REPLACE.
+    """
+    if method != REPLACE and point.get("inverse") is not None:
+        return INVERSE, point["inverse"]
+    if point.get("archive"):
+        return REPLACE, replace_plan(point["archive"])
+    if point.get("inverse") is not None:
+        return INVERSE, point["inverse"]
+    return None, []
+
+
+def write_rollback_point(path, point):
+    """Atomically write a rollback point"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(prefix=".rollback-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(point, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_rollback_point(path):
+    with open(path, "r", encoding="utf-8") as f:
+        point = json.load(f)
+    if not isinstance(point, dict) or point.get("version", 0) > ROLLBACK_VERSION:
+        raise ValueError(f"{os.path.basename(path)} is not a usable rollback point")
+    return point
+
+
+def list_rollback_points(directory=ROLLBACK_DIR):
+    """Return (path, point) for every readable rollback point, newest first"""
+    points = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            points.append((path, read_rollback_point(path)))
+        except (OSError, ValueError):
+            continue
+    points.sort(key=lambda entry: entry[1].get("created", 0), reverse=True)
+    return points
+
+
+class TranscriptTransport(Transport):
+    """Transport answering commands from a transcript, {command: output}, for checking captures
+
+    Every answer ends with the prompt, as a switch's would.
+    """
+
+    kind = "transcript"
+
+    def __init__(self, prompt, answers):
+        super().__init__("transcript")
+        self.prompt = prompt
+        self.answers = answers
+        self._pending = b""
+
+    async def _open(self):
+        pass
+
+    async def _close(self):
+        pass
+
+    def _read_available(self):
+        data, self._pending = self._pending, b""
+        return data
+
+    async def _write(self, data):
+        command = data.decode().strip()
+        output = self.answers.get(command, "")
+        self._pending += f"{command}\r\n{output}{self.prompt}".encode()
+
+
+# A user EXEC session, e.g. before "Enter Privileged EXEC Mode" or after an SSH login at level 1
+USER_EXEC_TRANSCRIPT = {
+    "terminal length 0": "",
+    "show running-config": "                     ^\r\n% Invalid input detected at '^' marker.\r\n\r\n",
+}
+
+PRIVILEGED_TRANSCRIPT = {
+    "terminal length 0": "",
+    "show running-config": ("Building configuration...\r\n\r\nCurrent configuration : 120 bytes\r\n!\r\n"
+                            "hostname sw1\r\n!\r\nusername admin privilege 15 secret 9 $9$abc\r\n!\r\n"
+                            "line vty 0 4\r\n login local\r\n!\r\nend\r\n\r\n"),
+}
+
+
+async def _capture_from(prompt, answers):
+    transport = TranscriptTransport(prompt, answers)
+    await transport.open()
+    try:
+        return await capture_running_config(transport, timeout=5.0)
+    finally:
+        await transport.close()
+
+
+def check_capture():
+    """Return the problems found capturing transcripts, an empty list if none"""
+    problems = []
+    for prompt, answers in (("sw1>", USER_EXEC_TRANSCRIPT), ("sw1#", USER_EXEC_TRANSCRIPT),
+                            ("sw1#", {"terminal length 0": ""})):
+        try:
+            asyncio.run(_capture_from(prompt, answers))
+            problems.append(f"A failed capture at {prompt} was accepted")
+        except CaptureError:
+            pass
+
+    config, _ = asyncio.run(_capture_from("sw1#", PRIVILEGED_TRANSCRIPT))
+    if [node.text for node in parse_config(config)] != ["hostname sw1", "username admin privilege 15 secret 9 $9$abc",
+                                                        "line vty 0 4"]:
+        problems.append("The privileged capture was not read completely")
+    if inverse_plan(config, config + "\nusername guest secret 9 $9$def\n") != [
+            "configure terminal", "no username guest", "end"]:
+        problems.append("The inverse plan of a new user is not its keyed no form")
+    return problems
+
+
+if __name__ == "__main__":
+    found = check_capture()
+    for problem in found:
+        print(problem)
+    print(f"{len(found)} problem(s) capturing rollback points")
+    sys.exit(1 if found else 0)
@@ -0,0 +1,245 @@
+"""
+Byte-exact recordings of switch sessions.
+
+A recording holds every chunk sent to and received from a switch with its
+offset from the start of the session, taken from the monotonic clock. The
+file starts with a magic number and a JSON header, followed by records of a
+13 byte header (direction, microseconds, length) and the raw bytes:
+
+    b"CSREC1\\n" | u32 header length | header JSON | records...
+
+Chunks are written through a buffered file on the transport thread, so
+recording costs a struct pack and a memory copy per chunk. A recording can be
+replayed at its original pace or as fast as possible, to the console or
+through ReplayTransport as if the switch were connected.
+
+    python session_recording.py replay recordings/core1_20240501_130000.rec --speed max
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+from transport import Transport
+
+MAGIC = b"CSREC1\n"
+RECORDINGS_DIR = "recordings"
+
+RECEIVED = 0
+SENT = 1
+# Sent data that was replaced before writing, e.g. a password
+SENT_REDACTED = 2
+
+REDACTED = b"********"
+
+_LENGTH = struct.Struct("<I")
+_RECORD = struct.Struct("<BQI")
+
+# Largest amount of output ReplayTransport hands over per read at full speed
+MAX_REPLAY_READ = 64 * 1024
+
+Chunk = collections.namedtuple("Chunk", ["direction", "offset", "data"])
+
+
+class SessionRecorder:
+    """Write a session recording
+
+    received() and sent() may be called from any thread.
+    """
+
+    def __init__(self, path, **metadata):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._file = open(path, "wb", buffering=256 * 1024)
+
+        header = dict(metadata, started=time.time())
+        header = json.dumps(header, separators=(",", ":")).encode()
+        self._file.write(MAGIC + _LENGTH.pack(len(header)) + header)
+
+    def _write(self, direction, data):
+        offset = int((time.monotonic() - self._started) * 1_000_000)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(_RECORD.pack(direction, offset, len(data)))
+            self._file.write(data)
+
+    def received(self, data):
+        self._write(RECEIVED, data)
+
+    def sent(self, data, secret=False):
+        if secret:
+            self._write(SENT_REDACTED, REDACTED)
+        else:
+            self._write(SENT, data)
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def recording_path(switch_name, directory=RECORDINGS_DIR):
+    """Return a new recording file name for a switch session"""
+    safe_name = "".join(c for c in switch_name if c.isalnum() or c in (' ', '-', '_')).strip().replace(' ', '_')
+    return os.path.join(directory, f"{safe_name or 'switch'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.rec")
+
+
+def read_recording(path):
+    """Return (header, chunks) of a recording
+
+    A recording cut short by a crash is read up to its last complete chunk.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session recording")
+
+    position = len(MAGIC)
+    (header_length,) = _LENGTH.unpack_from(data, position)
+    position += _LENGTH.size
+    header = json.loads(data[position:position + header_length])
+    position += header_length
+
+    chunks = []
+    end = len(data)
+    while position + _RECORD.size <= end:
+        direction, offset, length = _RECORD.unpack_from(data, position)
+        position += _RECORD.size
+        if position + length > end:
+            break
+        chunks.append(Chunk(direction, offset / 1_000_000, data[position:position + length]))
+        position += length
+
+    return header, chunks
+
+
+def replay(chunks, on_chunk, speed=1.0):
+    """Call on_chunk(chunk) for each chunk, at speed times the recorded pace
+
+    speed None replays as fast as possible.
+    """
+    started = time.monotonic()
+    for chunk in chunks:
+        if speed:
+            delay = chunk.offset / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        on_chunk(chunk)
+
+
+class ReplayTransport(Transport):
+    """Transport playing back the received side of a recording
+
+    Output arrives at speed times the recorded pace (None for as fast as
+    possible), starting once the first listener is added, and the transport
+    closes itself once the recording ends.
+    Anything sent to it is counted and dropped.
+    """
+
+    kind = "replay"
+
+    def __init__(self, path, speed=1.0):
+        super().__init__(f"replay of {os.path.basename(path)}")
+        self.path = path
+        self.speed = speed
+        self.header = {}
+        self._pending = collections.deque()
+        self._started = None
+        self._finished = False
+
+    async def _open(self):
+        loop = asyncio.get_running_loop()
+        self.header, chunks = await loop.run_in_executor(None, read_recording, self.path)
+        self._pending = collections.deque(chunk for chunk in chunks if chunk.direction == RECEIVED)
+
+    async def _close(self):
+        self._pending.clear()
+
+    def _read_available(self):
+        if not self._listeners and not self._queues:
+            return b""
+        if self._started is None:
+            self._started = time.monotonic()
+
+        if not self._pending:
+            if not self._finished:
+                # Close outside the pump, close() cancels it
+                self._finished = True
+                asyncio.ensure_future(self.close())
+            return b""
+
+        elapsed = time.monotonic() - self._started
+        data = bytearray()
+        while self._pending and len(data) < MAX_REPLAY_READ:
+            chunk = self._pending[0]
+            if self.speed and chunk.offset / self.speed > elapsed:
+                break
+            data += self._pending.popleft().data
+        return bytes(data)
+
+    async def _write(self, data):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay switch session recordings")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info_parser = commands.add_parser("info", help="Summarise a recording")
+    info_parser.add_argument("path")
+
+    replay_parser = commands.add_parser("replay", help="Print a recording as it happened")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", default="1",
+                               help="Playback speed factor, or 'max' for as fast as possible")
+    replay_parser.add_argument("--sent", action="store_true", help="Also show what was sent to the switch")
+    args = parser.parse_args(argv)
+
+    header, chunks = read_recording(args.path)
+
+    if args.command == "info":
+        received = sum(len(chunk.data) for chunk in chunks if chunk.direction == RECEIVED)
+        sent = sum(len(chunk.data) for chunk in chunks if chunk.direction != RECEIVED)
+        print(f"Switch:    {header.get('switch', '-')}")
+        print(f"Transport: {header.get('transport', '-')}")
+        print(f"Started:   {datetime.fromtimestamp(header['started']).strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Duration:  {chunks[-1].offset if chunks else 0:.1f}s")
+        print(f"Chunks:    {len(chunks)} ({received} bytes received, {sent} bytes sent)")
+        return 0
+
+    speed = None if args.speed == "max" else float(args.speed)
+    output = sys.stdout.buffer
+
+    def on_chunk(chunk):
+        if chunk.direction == RECEIVED:
+            output.write(chunk.data)
+        elif args.sent:
+            output.write(b"\n>>> " + chunk.data)
+        output.flush()
+
+    started = time.perf_counter()
+    replay(chunks, on_chunk, speed)
+    print(f"\nReplayed {len(chunks)} chunks in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,497 @@
+"""
+Asyncio transport layer shared by serial and SSH switch sessions.
+
+All sessions run on one background event loop instead of one reader thread per
+console tab. A transport exposes send(), expect() and a stream of received
+chunks, so the GUI and background jobs talk to serial and SSH switches the same
+way.
+"""
+
+import asyncio
+import codecs
+import collections
+import re
+import threading
+import time
+
+from metrics import get_registry
+
+# Reader polling interval bounds in seconds - busy sessions poll fast, idle ones back off
+MIN_POLL_INTERVAL = 0.01
+MAX_POLL_INTERVAL = 0.1
+
+_metrics = get_registry()
+BYTES_RECEIVED = _metrics.counter("switch_bytes_received_total", "Bytes received from a switch session", ("session",))
+BYTES_SENT = _metrics.counter("switch_bytes_sent_total", "Bytes sent to a switch session", ("session",))
+OPEN_SESSIONS = _metrics.gauge("transport_open_sessions", "Open switch sessions", ("kind",))
+READER_WAKEUPS = _metrics.counter("transport_reader_wakeups_total",
+                                  "Reader polls of a connection, by whether data was waiting", ("kind", "result"))
+COMMAND_RTT = _metrics.histogram("switch_command_rtt_seconds",
+                                 "Seconds from sending a command to its expected output", ("session",))
+
+# Received text kept for expect() so a long session can't grow without bound
+MAX_BUFFER_SIZE = 64 * 1024
+
+# A CLI prompt is a line ending in > (user EXEC) or # (privileged EXEC and config modes)
+PROMPT_PATTERN = re.compile(r"[\w.\-()/:]+[>#]\s*$")
+
+# Interactive questions IOS asks in the middle of a command
+CONFIRM_PROMPT = re.compile(r"\[confirm\]\s*$")
+DESTINATION_FILENAME_PROMPT = re.compile(r"Destination filename \[[^\]]*\]\?\s*$")
+
+# "enable" and logins answer with a password question instead of a prompt
+PASSWORD_PROMPT = re.compile(r"[Pp]assword:\s*$")
+
+# Accept the default answer for the usual copy/write questions
+DEFAULT_RESPONSES = [(DESTINATION_FILENAME_PROMPT, ""), (CONFIRM_PROMPT, "")]
+
+
+class TransportError(Exception):
+    """Raised when a transport can't be opened or used"""
+
+
+class ExpectTimeout(TransportError, asyncio.TimeoutError):
+    """Raised when expect() doesn't see any of its patterns in time"""
+
+    def __init__(self, message, output=""):
+        super().__init__(message)
+        self.output = output
+
+
+class ExpectResult(collections.namedtuple("ExpectResult", ["index", "match", "output"])):
+    """Outcome of expect(): which pattern matched, the match and the captured output"""
+
+    __slots__ = ()
+
+    @property
+    def before(self):
+        """Output received before the match"""
+        return self.output[:len(self.output) - len(self.match.group(0))]
+
+
+class TransportLoop:
+    """Background thread running the event loop that drives all transports"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="transport-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+_transport_loop = None
+_transport_loop_lock = threading.Lock()
+
+
+def get_transport_loop():
+    """Return the shared transport loop, starting it on first use"""
+    global _transport_loop
+    with _transport_loop_lock:
+        if _transport_loop is None:
+            _transport_loop = TransportLoop()
+        return _transport_loop
+
+
+class Transport:
+    """Base class for an asynchronous text stream to a switch"""
+
+    kind = "generic"
+    line_ending = "\r\n"
+
+    def __init__(self, description):
+        self.description = description
+        self.closed = True
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._buffer = ""
+        self._listeners = []
+        self._queues = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._data_event = None
+        self._write_lock = None
+        self._pump_task = None
+        # Optional session_recording.SessionRecorder capturing the raw bytes
+        self.recorder = None
+
+    async def open(self):
+        """Open the underlying connection and start reading from it"""
+        await self._open()
+        self.closed = False
+        OPEN_SESSIONS.labels(self.kind).inc()
+        self._received_metric = BYTES_RECEIVED.labels(self.description)
+        self._sent_metric = BYTES_SENT.labels(self.description)
+        self._data_event = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._pump_task = asyncio.ensure_future(self._pump())
+
+    async def close(self, error=None):
+        """Close the connection and notify listeners"""
+        if self.closed:
+            return
+
+        self.closed = True
+        OPEN_SESSIONS.labels(self.kind).dec()
+        if self._pump_task and self._pump_task is not asyncio.current_task():
+            self._pump_task.cancel()
+
+        try:
+            await self._close()
+        finally:
+            # Wake up anyone waiting for data so they see the transport is gone
+            self._data_event.set()
+            for queue in self._queues:
+                queue.put_nowait(None)
+            for _, on_close in list(self._listeners):
+                if on_close:
+                    on_close(error)
+            if self.recorder:
+                self.recorder.close()
+
+    def add_listener(self, on_data, on_close=None):
+        """Call on_data(text) for every received chunk and on_close(error) when the transport closes"""
+        self._listeners.append((on_data, on_close))
+
+    def remove_listener(self, on_data):
+        """Stop calling a listener added with add_listener()"""
+        self._listeners = [listener for listener in self._listeners if listener[0] != on_data]
+
+    async def send(self, text, newline=True, secret=False):
+        """Send text to the switch, followed by a line ending unless newline is False
+
+        Secret text such as passwords is left out of session recordings.
+        """
+        if self.closed:
+            raise TransportError(f"{self.description} is not connected")
+
+        data = (text + self.line_ending if newline else text).encode()
+        async with self._write_lock:
+            await self._write(data)
+        self.bytes_sent += len(data)
+        self._sent_metric.inc(len(data))
+        if self.recorder:
+            self.recorder.sent(data, secret)
+
+    def clear_buffer(self):
+        """Forget received output so the next expect() only sees new data"""
+        self._buffer = ""
+
+    async def expect(self, patterns, timeout=10.0, responses=None):
+        """Wait until one of the patterns appears in received output
+
+        Matching runs against the rolling receive buffer and consumes it up to the
+        end of the match. Returns an ExpectResult whose output is everything
+        captured up to the end of the match. responses is a list of
+        (pattern, reply) pairs answered automatically while waiting, such as
+        DEFAULT_RESPONSES for [confirm] questions. Raises ExpectTimeout with the
+        output captured so far if nothing matches in time.
+        """
+        compiled = _compile_patterns(patterns)
+        answers = [(_compile_patterns(pattern)[0], reply) for pattern, reply in responses or []]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        captured = ""
+
+        while True:
+            # Pick the earliest match among the patterns and the automatic answers
+            best = None
+            candidates = [(index, regex, None) for index, regex in enumerate(compiled)]
+            candidates += [(None, regex, reply) for regex, reply in answers]
+            for index, regex, reply in candidates:
+                match = regex.search(self._buffer)
+                if match and (best is None or match.start() < best[1].start()):
+                    best = (index, match, reply)
+
+            if best:
+                index, match, reply = best
+                captured += self._buffer[:match.end()]
+                self._buffer = self._buffer[match.end():]
+
+                if index is not None:
+                    return ExpectResult(index, match, captured)
+
+                # Answer the question and keep waiting for the real pattern
+                await self.send(reply)
+                continue
+
+            if self.closed:
+                raise TransportError(f"{self.description} closed while waiting for output")
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise ExpectTimeout(f"Timed out after {timeout:g}s waiting for output from {self.description}",
+                                    captured + self._buffer)
+
+            self._data_event.clear()
+            try:
+                await asyncio.wait_for(self._data_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def send_and_expect(self, command, patterns, timeout=10.0, responses=None):
+        """Send a command and wait for one of the patterns in its output"""
+        # Earlier output must not satisfy the patterns for this command
+        self.clear_buffer()
+        started = time.perf_counter()
+        await self.send(command)
+        result = await self.expect(patterns, timeout, responses)
+        COMMAND_RTT.labels(self.description).observe(time.perf_counter() - started)
+        return result
+
+    async def chunks(self):
+        """Iterate over received chunks until the transport closes"""
+        queue = asyncio.Queue()
+        self._queues.append(queue)
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self._queues.remove(queue)
+
+    async def _pump(self):
+        """Poll the connection and fan received text out to listeners"""
+        interval = MIN_POLL_INTERVAL
+        data_wakeups = READER_WAKEUPS.labels(self.kind, "data")
+        idle_wakeups = READER_WAKEUPS.labels(self.kind, "idle")
+        while not self.closed:
+            try:
+                data = self._read_available()
+            except Exception as e:
+                await self.close(error=e)
+                return
+
+            if data:
+                data_wakeups.inc()
+                self.bytes_received += len(data)
+                self._received_metric.inc(len(data))
+                if self.recorder:
+                    self.recorder.received(data)
+                text = self._decoder.decode(data)
+                if text:
+                    self._dispatch(text)
+                interval = MIN_POLL_INTERVAL
+            else:
+                idle_wakeups.inc()
+                interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+            await asyncio.sleep(interval)
+
+    def _dispatch(self, text):
+        """Hand a received chunk to expect(), chunk iterators and listeners"""
+        self._buffer = (self._buffer + text)[-MAX_BUFFER_SIZE:]
+        self._data_event.set()
+
+        for queue in self._queues:
+            queue.put_nowait(text)
+        for on_data, _ in list(self._listeners):
+            on_data(text)
+
+    # Subclass hooks
+
+    async def _open(self):
+        raise NotImplementedError
+
+    async def _close(self):
+        raise NotImplementedError
+
+    def _read_available(self):
+        """Return whatever bytes are available without blocking"""
+        raise NotImplementedError
+
+    async def _write(self, data):
+        raise NotImplementedError
+
+
+def _compile_patterns(patterns):
+    """Accept a single pattern or a list of strings and compiled expressions"""
+    if isinstance(patterns, (str, re.Pattern)):
+        patterns = [patterns]
+    return [re.compile(pattern) if isinstance(pattern, str) else pattern for pattern in patterns]
+
+
+class SerialTransport(Transport):
+    """Transport over a serial console port"""
+
+    kind = "serial"
+
+    def __init__(self, port, baudrate=9600):
+        super().__init__(f"{port} at {baudrate} baud")
+        self.port = port
+        self._baudrate = baudrate
+        self.serial = None
+
+    @property
+    def baudrate(self):
+        return self.serial.baudrate if self.serial else self._baudrate
+
+    async def set_baudrate(self, baudrate):
+        """Reconfigure the local port to a new speed"""
+        self.serial.baudrate = baudrate
+        self._baudrate = baudrate
+        self.description = f"{self.port} at {baudrate} baud"
+
+    async def reset_input(self):
+        """Drop anything waiting in the port and the expect buffer"""
+        self.serial.reset_input_buffer()
+        self.clear_buffer()
+
+    async def _open(self):
+        # Imported on first connect to keep application startup fast
+        import serial
+
+        loop = asyncio.get_running_loop()
+        # Non-blocking reads, the pump polls in_waiting instead. serial_for_url also
+        # accepts URLs such as socket://host:port for console servers.
+        self.serial = await loop.run_in_executor(
+            None, lambda: serial.serial_for_url(self.port, baudrate=self._baudrate, timeout=0, write_timeout=10)
+        )
+
+    async def _close(self):
+        if self.serial:
+            self.serial.close()
+
+    def _read_available(self):
+        waiting = self.serial.in_waiting
+        return self.serial.read(waiting) if waiting else b""
+
+    async def _write(self, data):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_blocking, data)
+
+    def _write_blocking(self, data):
+        self.serial.write(data)
+        self.serial.flush()
+
+
+class SSHTransport(Transport):
+    """Transport over an interactive SSH shell channel"""
+
+    kind = "SSH"
+    line_ending = "\n"
+
+    def __init__(self, host, username, password, port=22):
+        super().__init__(f"SSH ({host})")
+        self.host = host
+        self.username = username
+        self.password = password
+        self.ssh_port = port
+        self.client = None
+        self.channel = None
+
+    async def _open(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._connect_blocking)
+
+    def _connect_blocking(self):
+        # paramiko is slow to import, so only load it when an SSH session is opened
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=self.host,
+            port=self.ssh_port,
+            username=self.username,
+            password=self.password,
+            timeout=15
+        )
+        self.client = client
+        self.channel = client.invoke_shell()
+
+    async def _close(self):
+        if self.client:
+            self.client.close()
+
+    def _read_available(self):
+        if self.channel.recv_ready():
+            return self.channel.recv(65535)
+        if self.channel.closed or self.channel.exit_status_ready():
+            raise TransportError("SSH channel closed by the switch")
+        return b""
+
+    async def _write(self, data):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.channel.sendall, data)
+
+
+def transport_from_settings(connection, password=""):
+    """Create a transport from inventory style connection settings
+
+    connection holds connection_type, host, username, ssh_port, com_port and
+    baudrate, as stored in the inventory. The password is only used for SSH.
+    """
+    if connection.get('connection_type') == "SSH":
+        return SSHTransport(connection['host'], connection.get('username', ""), password or "",
+                            connection.get('ssh_port', 22))
+    return SerialTransport(connection['com_port'], connection.get('baudrate', 9600))
+
+
+async def wait_for_prompt(transport, timeout=2.0):
+    """Send a return and wait for a CLI prompt, returning it or None"""
+    transport.clear_buffer()
+    await transport.send("")
+    try:
+        result = await transport.expect(PROMPT_PATTERN, timeout)
+    except ExpectTimeout:
+        return None
+    return result.match.group(0).strip()
+
+
+async def negotiate_console_speed(transport, target_baudrate):
+    """Raise the console line speed on the switch and follow it with the local port
+
+    Returns (success, message). On failure the original rate is restored on both ends.
+    """
+    original_baudrate = transport.baudrate
+
+    # Only privileged EXEC can change the line settings
+    prompt = await wait_for_prompt(transport)
+    if not prompt or not prompt.endswith("#"):
+        return False, "log in and enter privileged EXEC mode first"
+
+    try:
+        return await _change_console_speed(transport, original_baudrate, target_baudrate)
+    except Exception:
+        # Always leave the local port at a rate we know the switch started with
+        await transport.set_baudrate(original_baudrate)
+        raise
+
+
+async def _change_console_speed(transport, original_baudrate, target_baudrate):
+    """Send the speed change and confirm it, falling back to the original rate"""
+    # The switch changes speed as soon as it accepts the speed command
+    for cmd in ["configure terminal", "line con 0", f"speed {target_baudrate}"]:
+        await transport.send(cmd)
+        await asyncio.sleep(0.3)
+
+    # Follow with the local port and confirm the prompt at the new rate
+    await transport.reset_input()
+    await transport.set_baudrate(target_baudrate)
+    await transport.send("end")
+    await asyncio.sleep(0.3)
+
+    if await wait_for_prompt(transport):
+        return True, f"console now runs at {target_baudrate} baud"
+
+    # No prompt at the new rate - see if the switch is still at the original rate
+    await transport.set_baudrate(original_baudrate)
+    if not await wait_for_prompt(transport):
+        # The switch changed speed but the line is unusable, so change it back blindly
+        await transport.set_baudrate(target_baudrate)
+        for cmd in ["configure terminal", "line con 0", f"speed {original_baudrate}"]:
+            await transport.send(cmd)
+            await asyncio.sleep(0.3)
+        await transport.set_baudrate(original_baudrate)
+
+    await transport.send("end")
+    return False, f"could not confirm {target_baudrate} baud, staying at {original_baudrate} baud"
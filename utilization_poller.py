@@ -0,0 +1,340 @@
+"""
+Continuous interface utilization polling.
+
+A poller keeps one session open per switch and, every `interval` seconds,
+runs "show controllers utilization" and the byte counters of
+"show interfaces". The counters are filtered on the switch with "| include",
+so only three lines per port cross the link. Output is parsed line by line as
+it arrives rather than once the command has finished. Each port keeps its
+samples in fixed-size ring buffers of 32-bit floats, so memory stays flat
+however long the poller runs.
+
+Switches are polled at staggered offsets within the interval, all on the
+shared transport loop, so dozens of switches cost a few small commands a
+second and never touch the console sessions.
+"""
+
+import array
+import asyncio
+import random
+import re
+import threading
+import time
+
+from command_errors import find_error
+from metrics import get_registry
+from transport import TransportError, get_transport_loop, transport_from_settings, wait_for_prompt
+
+DEFAULT_INTERVAL = 30.0
+
+# Samples kept per port, six hours at the default interval
+DEFAULT_SAMPLES = 720
+
+# Seconds to wait for a poll command to finish
+COMMAND_TIMEOUT = 60.0
+
+# Seconds between attempts to reconnect a switch, doubling up to the maximum
+RECONNECT_DELAY = 10.0
+MAX_RECONNECT_DELAY = 300.0
+
+UTILIZATION_COMMAND = "show controllers utilization"
+COUNTERS_COMMAND = "show interfaces | include line protocol|packets input|packets output"
+
+# Values stored per sample, percentages from the switch and rates from the counters
+FIELDS = ("rx_percent", "tx_percent", "rx_bps", "tx_bps")
+
+UTILIZATION_ROW_RE = re.compile(r"^\s*([A-Za-z][\w\-]*\d+(?:/\d+)*)\s+(\d+)\s+(\d+)\s*$")
+INTERFACE_RE = re.compile(r"^(\S+) is .*line protocol is")
+INPUT_BYTES_RE = re.compile(r"^\s*\d+ packets input, (\d+) bytes")
+OUTPUT_BYTES_RE = re.compile(r"^\s*\d+ packets output, (\d+) bytes")
+
+# Short interface names, as "show controllers utilization" prints them
+INTERFACE_ABBREVIATIONS = (
+    ("TwentyFiveGigE", "Twe"), ("HundredGigE", "Hu"), ("FortyGigabitEthernet", "Fo"),
+    ("TwoGigabitEthernet", "Tw"), ("TenGigabitEthernet", "Te"), ("GigabitEthernet", "Gi"),
+    ("FastEthernet", "Fa"), ("Port-channel", "Po"),
+)
+
+NAN = float("nan")
+
+POLL_SECONDS = get_registry().histogram("utilization_poll_seconds", "Seconds one utilization poll takes",
+                                        ("switch",))
+
+
+def short_interface_name(name):
+    for long_name, short_name in INTERFACE_ABBREVIATIONS:
+        if name.startswith(long_name):
+            return short_name + name[len(long_name):]
+    return name
+
+
+class RingBuffer:
+    """Fixed-size series of samples, the oldest overwritten first
+
+    Each sample has a time and a value for every field. Missing values are
+    stored as NaN.
+    """
+
+    def __init__(self, size=DEFAULT_SAMPLES, fields=FIELDS):
+        self.size = size
+        self.fields = fields
+        self.times = array.array("d", bytes(8 * size))
+        self.values = {field: array.array("f", bytes(4 * size)) for field in fields}
+        self.count = 0
+        self._next = 0
+
+    def append(self, timestamp, values):
+        position = self._next
+        self.times[position] = timestamp
+        for field in self.fields:
+            self.values[field][position] = values.get(field, NAN)
+        self._next = (position + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _ordered(self, data):
+        if self.count < self.size:
+            return list(data[:self.count])
+        return list(data[self._next:]) + list(data[:self._next])
+
+    def series(self, field):
+        """Return (times, values) of a field, oldest first"""
+        return self._ordered(self.times), self._ordered(self.values[field])
+
+    def last(self, field):
+        if not self.count:
+            return NAN
+        return self.values[field][(self._next - 1) % self.size]
+
+
+class LineParser:
+    """Split streamed output into lines and tell when the prompt comes back"""
+
+    def __init__(self, prompt_pattern, on_line):
+        self.prompt_pattern = prompt_pattern
+        self.on_line = on_line
+        self.partial = ""
+        self.done = asyncio.Event()
+
+    def feed(self, text):
+        lines = (self.partial + text.replace("\r", "")).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.on_line(line)
+        # The prompt is the only line without a newline after it
+        if self.prompt_pattern.search(self.partial):
+            self.done.set()
+
+
+async def stream_command(transport, command, prompt_pattern, on_line, timeout=COMMAND_TIMEOUT):
+    """Send a command and call on_line(line) for each line of its output as it arrives"""
+    parser = LineParser(prompt_pattern, on_line)
+    transport.add_listener(parser.feed)
+    try:
+        await transport.send(command)
+        await asyncio.wait_for(parser.done.wait(), timeout)
+    finally:
+        transport.remove_listener(parser.feed)
+        transport.clear_buffer()
+
+
+class SwitchPoller:
+    """Polling state of one switch"""
+
+    def __init__(self, name, connection, password=None, samples=DEFAULT_SAMPLES):
+        self.name = name
+        self.connection = connection
+        self.password = password
+        self.samples = samples
+        # Port -> RingBuffer
+        self.ports = {}
+        self.status = "starting"
+        self.last_poll = None
+        self.poll_seconds = None
+        self.task = None
+        # Cleared when the switch doesn't know "show controllers utilization"
+        self.has_utilization = True
+        self._counters = {}
+
+    def _record(self, timestamp, samples):
+        for port, values in samples.items():
+            ring = self.ports.get(port)
+            if ring is None:
+                ring = self.ports[port] = RingBuffer(self.samples)
+            ring.append(timestamp, values)
+
+    def _rates(self, timestamp, counters):
+        """Turn byte counters into bit rates since the previous poll"""
+        rates = {}
+        for port, (in_bytes, out_bytes) in counters.items():
+            previous = self._counters.get(port)
+            if previous:
+                elapsed = timestamp - previous[0]
+                # Counters that went backwards were cleared or wrapped
+                if elapsed > 0 and in_bytes >= previous[1] and out_bytes >= previous[2]:
+                    rates[port] = {"rx_bps": (in_bytes - previous[1]) * 8 / elapsed,
+                                   "tx_bps": (out_bytes - previous[2]) * 8 / elapsed}
+            self._counters[port] = (timestamp, in_bytes, out_bytes)
+        return rates
+
+    async def poll(self, transport, prompt_pattern):
+        """Run one poll and return its time and {port: {field: value}}"""
+        started = time.monotonic()
+        samples = {}
+        output = []
+
+        if self.has_utilization:
+            def on_utilization(line):
+                row = UTILIZATION_ROW_RE.match(line)
+                if row:
+                    samples.setdefault(row.group(1), {}).update(
+                        rx_percent=float(row.group(2)), tx_percent=float(row.group(3)))
+                elif len(output) < 5:
+                    output.append(line)
+
+            await stream_command(transport, UTILIZATION_COMMAND, prompt_pattern, on_utilization)
+            if find_error("\n".join(output)):
+                self.has_utilization = False
+
+        counters = {}
+        current = []
+
+        def on_counters(line):
+            interface = INTERFACE_RE.match(line)
+            if interface:
+                current[:] = [short_interface_name(interface.group(1)), None]
+                return
+            if not current:
+                return
+            input_bytes = INPUT_BYTES_RE.match(line)
+            if input_bytes:
+                current[1] = int(input_bytes.group(1))
+                return
+            output_bytes = OUTPUT_BYTES_RE.match(line)
+            if output_bytes and current[1] is not None:
+                counters[current[0]] = (current[1], int(output_bytes.group(1)))
+
+        await stream_command(transport, COUNTERS_COMMAND, prompt_pattern, on_counters)
+
+        timestamp = time.time()
+        for port, values in self._rates(timestamp, counters).items():
+            samples.setdefault(port, {}).update(values)
+        self.poll_seconds = time.monotonic() - started
+        POLL_SECONDS.labels(self.name).observe(self.poll_seconds)
+        return timestamp, samples
+
+
+class UtilizationPoller:
+    """Background poller of interface utilization on a set of switches
+
+    Series are written on the transport loop and read from the UI, so reads
+    go through latest() and series(), which copy under a lock.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, samples=DEFAULT_SAMPLES):
+        self.interval = interval
+        self.samples = samples
+        self._switches = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, connection, password=None):
+        """Start polling a switch, given its inventory style connection settings"""
+        with self._lock:
+            if name in self._switches:
+                return
+            switch = self._switches[name] = SwitchPoller(name, connection, password, self.samples)
+        get_transport_loop().submit(self._start(switch))
+
+    async def _start(self, switch):
+        switch.task = asyncio.ensure_future(self._run(switch))
+
+    def remove(self, name):
+        """Stop polling a switch and forget its series"""
+        with self._lock:
+            switch = self._switches.pop(name, None)
+        POLL_SECONDS.remove(name)
+        if switch and switch.task:
+            get_transport_loop().loop.call_soon_threadsafe(switch.task.cancel)
+
+    def stop(self):
+        for name in self.switch_names():
+            self.remove(name)
+
+    def switch_names(self):
+        with self._lock:
+            return sorted(self._switches)
+
+    def status(self, name):
+        """Return (status, last poll time, seconds the last poll took) of a switch"""
+        with self._lock:
+            switch = self._switches.get(name)
+            return (switch.status, switch.last_poll, switch.poll_seconds) if switch else (None, None, None)
+
+    def latest(self, name):
+        """Return {port: {field: last value}} of a switch"""
+        with self._lock:
+            switch = self._switches.get(name)
+            if not switch:
+                return {}
+            return {port: {field: ring.last(field) for field in FIELDS} for port, ring in switch.ports.items()}
+
+    def series(self, name, port, field):
+        """Return (times, values) for a port of a switch, oldest first"""
+        with self._lock:
+            switch = self._switches.get(name)
+            ring = switch.ports.get(port) if switch else None
+            return ring.series(field) if ring else ([], [])
+
+    def _polling(self, switch):
+        with self._lock:
+            return self._switches.get(switch.name) is switch
+
+    async def _run(self, switch):
+        # Spread the switches over the interval rather than polling them all at once
+        await asyncio.sleep(random.uniform(0, min(self.interval, 10.0)))
+        delay = RECONNECT_DELAY
+
+        # A switch removed before its task existed stops here
+        while self._polling(switch):
+            transport = None
+            try:
+                switch.status = "connecting"
+                transport = transport_from_settings(switch.connection, switch.password)
+                await transport.open()
+                prompt = await wait_for_prompt(transport, timeout=5.0)
+                if not prompt:
+                    raise TransportError("no prompt from the switch")
+                prompt_pattern = re.compile(re.escape(prompt) + r"\s*$")
+                await transport.send_and_expect("terminal length 0", prompt_pattern, 10.0)
+                delay = RECONNECT_DELAY
+
+                while self._polling(switch):
+                    started = time.monotonic()
+                    timestamp, samples = await switch.poll(transport, prompt_pattern)
+                    with self._lock:
+                        switch._record(timestamp, samples)
+                        switch.last_poll = timestamp
+                        switch.status = "polling"
+                    await asyncio.sleep(max(1.0, self.interval - (time.monotonic() - started)))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                switch.status = f"error: {str(e) or e.__class__.__name__}"
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            finally:
+                if transport:
+                    await transport.close()
+
+
+_utilization_poller = None
+_utilization_poller_lock = threading.Lock()
+
+
+def get_utilization_poller():
+    """Return the shared utilization poller"""
+    global _utilization_poller
+    with _utilization_poller_lock:
+        if _utilization_poller is None:
+            _utilization_poller = UtilizationPoller()
+        return _utilization_poller
@@ -0,0 +1,93 @@
+"""
+Workspace snapshots.
+
+A snapshot holds the input values typed into every category, the preview plan
+and the open switch tabs. It is written as compact JSON with a schema version,
+atomically, so a crash while saving never leaves a half written file behind.
+Catalog items are stored by category and name rather than copied.
+"""
+
+import json
+import os
+import tempfile
+
+WORKSPACE_VERSION = 1
+
+
+class WorkspaceError(ValueError):
+    """Raised when a workspace file can't be read"""
+
+
+def catalog_references(catalog):
+    """Map catalog items (by identity) to their compact references"""
+    return {id(item): {"category": category, "name": item["name"]}
+            for category, items in catalog.items() for item in items}
+
+
+def catalog_lookup(catalog):
+    """Map (category, item name) to catalog items"""
+    return {(category, item["name"]): item for category, items in catalog.items() for item in items}
+
+
+def item_reference(item, references):
+    """Return a compact reference to a catalog item, or the item itself if it's not in the catalog"""
+    return references.get(id(item)) or {"item": item}
+
+
+def resolve_item(reference, lookup):
+    """Return the item a reference points to, or None if the catalog no longer has it"""
+    if "item" in reference:
+        return reference["item"]
+    return lookup.get((reference["category"], reference["name"]))
+
+
+def write_workspace(path, inputs, preview, switches):
+    """Atomically write a workspace snapshot
+
+    inputs maps category -> item name -> input name -> value, preview is a list
+    of {"ref", "inputs", "selected", "executed"} entries and switches a list of
+    {"num", "name", "connection"} entries.
+    """
+    snapshot = {
+        "version": WORKSPACE_VERSION,
+        "inputs": inputs,
+        "preview": preview,
+        "switches": switches,
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    # Write next to the target and swap it in, so readers see the old or the new file
+    fd, temp_path = tempfile.mkstemp(prefix=".workspace-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_workspace(path):
+    """Read a workspace snapshot, raising WorkspaceError if it's not usable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except json.JSONDecodeError as e:
+        raise WorkspaceError(f"not a workspace file: {e}")
+
+    if not isinstance(snapshot, dict) or "version" not in snapshot:
+        raise WorkspaceError("not a workspace file")
+    if snapshot["version"] > WORKSPACE_VERSION:
+        raise WorkspaceError(f"the workspace was saved by a newer version (format {snapshot['version']})")
+
+    snapshot.setdefault("inputs", {})
+    snapshot.setdefault("preview", [])
+    snapshot.setdefault("switches", [])
+    return snapshot